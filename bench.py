@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import time
+import tracemalloc
+
+import parser as iostat_parser
+import testio
+import txg
+from hist import merge, percentile
+from output import HIST_SKIP, fio_hists, format_job, split_fio_output
+from sampler import DEV_METRICS, new_sampler, read_diskstats, sampler_averages, store_sample
+from timeline import read_fio_log
+
+# Harness benchmarks on synthetic fixtures, no fio/iostat/ZFS needed:
+# fio json+ outputs, fio interval logs, iostat dumps and diskstats for
+# hundreds of devices, txgs files. Each stage is timed (best of
+# --repeat) and its peak Python memory traced; --save keeps the numbers
+# as the baseline, later runs fail when a stage gets slower or bigger
+# than baseline * (1 + --tolerance).
+# python3 bench.py --jobs 64 --devices 256 --save
+
+# next to this file whatever the cwd, machine specific so not committed
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+PCTS = ("1.000000", "5.000000", "10.000000", "20.000000", "30.000000",
+        "40.000000", "50.000000", "60.000000", "70.000000", "80.000000",
+        "90.000000", "95.000000", "99.000000", "99.500000", "99.900000",
+        "99.950000", "99.990000")
+
+
+def _lat(rnd, mean, bins: int):
+    stat = {"min": int(mean / 4), "max": int(mean * 40), "mean": mean,
+            "stddev": mean / 3, "N": 100000}
+    if bins:
+        stat["percentile"] = {p: int(mean * (1 + float(p) / 25)) for p in PCTS}
+        # fio json+ style histogram, bucket value -> count
+        stat["bins"] = {str(int(mean / 4) + i * 64): rnd.randint(1, 5000)
+                        for i in range(bins)}
+    return stat
+
+
+def _dir(rnd, iops: float, bins: int):
+    return {
+        "io_bytes": int(iops * 4096 * 60), "io_kbytes": int(iops * 4 * 60),
+        "bw_bytes": int(iops * 4096), "bw": int(iops * 4), "iops": iops,
+        "runtime": 60000, "total_ios": int(iops * 60), "short_ios": 0,
+        "drop_ios": 0,
+        "slat_ns": _lat(rnd, 2000.0, 0),
+        "clat_ns": _lat(rnd, 250000.0, bins),
+        "lat_ns": _lat(rnd, 252000.0, 0),
+        "bw_min": 1000, "bw_max": 9000, "bw_agg": 100.0, "bw_mean": 4000.0,
+        "bw_dev": 300.0, "bw_samples": 120, "iops_min": 250,
+        "iops_max": 2250, "iops_mean": 1000.0, "iops_stddev": 75.0,
+        "iops_samples": 120,
+    }
+
+
+def fio_output(jobs: int = 64, bins: int = 1500, seed: int = 1):
+    # fio --output-format=normal,json stdout: json then the normal report
+    rnd = random.Random(seed)
+    doc = {
+        "fio version": "fio-3.36",
+        "timestamp": 1700000000,
+        "global options": {"runtime": "60", "time_based": ""},
+        "jobs": [],
+        "disk_util": [{"name": "sdb", "read_ios": 1, "write_ios": 1,
+                       "util": 99.5}],
+    }
+    for j in range(jobs):
+        doc["jobs"].append({
+            "jobname": f"bench_randrw_{j}", "groupid": 0, "error": 0,
+            "job options": {"name": f"bench_randrw_{j}", "rw": "randrw",
+                            "bs": "4k", "iodepth": "32"},
+            "read": _dir(rnd, 20000.0 + j, bins),
+            "write": _dir(rnd, 8000.0 + j, bins),
+            "trim": _dir(rnd, 0.0, 0),
+            "sync": {"total_ios": 0, "lat_ns": _lat(rnd, 0.0, 0)},
+            "job_runtime": 60000, "usr_cpu": 3.5, "sys_cpu": 12.25,
+            "ctx": 1000000, "majf": 0, "minf": 20,
+            "iodepth_level": {str(k): 0.1 for k in (1, 2, 4, 8, 16, 32, ">=64")},
+            "iodepth_submit": {str(k): 0.1 for k in (0, 4, 8, 16, 32, 64, ">=64")},
+            "iodepth_complete": {str(k): 0.1 for k in (0, 4, 8, 16, 32, 64, ">=64")},
+            "latency_ns": {str(k): 0.0 for k in (2, 4, 10, 20, 50, 100, 250, 500, 750, 1000)},
+            "latency_us": {str(k): 0.5 for k in (2, 4, 10, 20, 50, 100, 250, 500, 750, 1000)},
+            "latency_ms": {str(k): 0.01 for k in (2, 4, 10, 20, 50, 100, 250, 500, 750, 1000, 2000, ">=2000")},
+        })
+    report = "\n".join(
+        f"bench_randrw_{j}: (groupid=0, jobs=1): err= 0: pid={1000 + j}\n"
+        f"  read: IOPS=20.0k, BW=78.1MiB/s\n  write: IOPS=8000, BW=31.2MiB/s"
+        for j in range(jobs))
+    return (json.dumps(doc, indent=2) + "\n" + report +
+            "\n\nRun status group 0 (all jobs):\n   READ: bw=78.1MiB/s\n"
+            "Disk stats (read/write):\n  sdb: ios=1/1, util=99.50%, offset\n")
+
+
+def fio_logs(prefix: str, jobs: int, seconds: int, step_ms: int, seed: int = 1):
+    # <prefix>_<kind>.<job>.log as fio --write_*_log writes them
+    rnd = random.Random(seed)
+    for kind in ('bw', 'iops', 'clat'):
+        for j in range(1, jobs + 1):
+            with open(f"{prefix}_{kind}.{j}.log", 'w') as f:
+                f.writelines(f"{t}, {rnd.randint(1000, 90000)}, {t % 2}, 4096, 0\n"
+                             for t in range(step_ms, seconds * 1000 + 1, step_ms))
+
+
+def iostat_dump(devices: int, samples: int, seed: int = 1):
+    # iostat -c -d -x 1 text, every report lists every device
+    rnd = random.Random(seed)
+    cols = "r/s rkB/s rrqm/s %rrqm r_await rareq-sz w/s wkB/s wrqm/s %wrqm " \
+           "w_await wareq-sz d/s dkB/s drqm/s %drqm d_await dareq-sz aqu-sz %util"
+    out = []
+    for _ in range(samples):
+        out.append("avg-cpu:  %user   %nice %system %iowait  %steal   %idle")
+        out.append("          %.2f    0.00   %.2f   %.2f    0.00   %.2f" % (
+            rnd.uniform(0, 20), rnd.uniform(0, 30), rnd.uniform(0, 40), rnd.uniform(10, 90)))
+        out.append("")
+        out.append(f"Device            {cols}")
+        for d in range(devices):
+            vals = " ".join(f"{rnd.uniform(0, 5000):.2f}" for _ in cols.split())
+            out.append(f"sd{d:<15} {vals}")
+        out.append("")
+    return "\n".join(out)
+
+
+def diskstats(devices: int, tick: int):
+    # /proc/diskstats with every counter moving with tick
+    return "".join(
+        f"   8 {d * 16:>7} sd{d} {tick * 100} 0 {tick * 800} {tick * 50} {tick * 40} 0 "
+        f"{tick * 320} {tick * 30} 1 {tick * 900} {tick * 1000} 0 0 0 0\n"
+        for d in range(devices))
+
+
+def txgs_file(rows: int, seed: int = 1):
+    # /proc/spl/kstat/zfs/<pool>/txgs
+    rnd = random.Random(seed)
+    out = ["txg      birth            state ndirty       nread        nwritten     "
+           "reads    writes   otime        qtime        wtime        stime"]
+    birth = 10 ** 12
+    for i in range(rows):
+        birth += rnd.randint(4, 6) * 10 ** 9
+        state = 'C' if i < rows - 2 else 'O'
+        out.append(f"{1000 + i} {birth} {state} {rnd.randint(0, 2**30)} 0 "
+                   f"{rnd.randint(0, 2**31)} 0 {rnd.randint(0, 5000)} "
+                   f"{rnd.randint(10**9, 5 * 10**9)} {rnd.randint(0, 10**5)} "
+                   f"{rnd.randint(0, 10**5)} {rnd.randint(10**7, 2 * 10**9)}")
+    return "\n".join(out) + "\n"
+
+
+def tester_log(out_fio: str, seed: int = 1):
+    # tester.sh results file: fio output, then the mon.sh tables
+    rnd = random.Random(seed)
+    mon = ["", "=== CPU STATISTICS (Global) ===", "Metric          | Average",
+           "-------------------------------"]
+    mon += [f"{m:<15} | {rnd.uniform(0, 50):<10.2f}%" for m in ('%user', '%system', '%iowait', '%idle')]
+    mon += ["", "=== DEVICE STATISTICS (sdb) ===",
+            "Metric          | Average    | Min        | Max",
+            "---------------------------------------------------------"]
+    mon += [f"{m:<15} | {rnd.uniform(0, 99):<10.2f} | 0.00       | 100.00" for m in DEV_METRICS]
+    return out_fio + "\n".join(mon) + "\n"
+
+
+def regex_parse(out_fio: str):
+    # format_job before split_fio_output, kept as the reference point
+    m = re.search(r"({.*}).*set", out_fio, re.DOTALL)
+    fio_json = json.loads(m.group(1).strip())
+    m = re.search(r".*set(.*)", out_fio, re.DOTALL)
+    return fio_json, m.group(1).strip()
+
+
+def measure(fn, repeat: int = 3):
+    # best wall time of repeat calls, then the traced peak of one more
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        t = time.perf_counter() - t0
+        best = t if best is None else min(best, t)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def sampler_run(names: list, snaps: list, samples: int):
+    # hours of ticks without the sleeps: stored columns and the averages
+    state = new_sampler(names, 1.0, samples)
+    cpu0, cpu1 = [0] * 8, [10] * 8
+    for i in range(samples):
+        store_sample(state, float(i), cpu0, cpu1, snaps[i % 2], snaps[(i + 1) % 2], 1.0)
+    return sampler_averages(state)
+
+
+def txg_run(pool: str, window: int, kstat: str):
+    ring = txg.ring_new(window)
+    txg.ring_update(ring, pool, kstat)
+    stats = txg.ring_stats(ring)
+    return stats, txg.format_rows(txg.ring_rows(ring, window))
+
+
+def stages(args, tmp: str):
+    # (name, no argument callable), fixtures built here, outside the timings
+    out = fio_output(args.jobs, args.bins)
+    fio_json, fio_log = split_fio_output(out, HIST_SKIP)
+    hists = [fio_hists({'jobs': [j]}) for j in fio_json['jobs']]
+    prefix = os.path.join(tmp, "job")
+    fio_logs(prefix, args.jobs, args.seconds, args.log_ms)
+    dump = iostat_dump(args.devices, args.iostat_samples)
+    names = [f"sd{d}" for d in range(args.devices)]
+    stats_path = os.path.join(tmp, "diskstats")
+    with open(stats_path, 'w') as f:
+        f.write(diskstats(args.devices, 1))
+    snaps = [read_diskstats(names, stats_path)]
+    with open(stats_path, 'w') as f:
+        f.write(diskstats(args.devices, 2))
+    snaps.append(read_diskstats(names, stats_path))
+    os.makedirs(os.path.join(tmp, "bench"))
+    with open(os.path.join(tmp, "bench", "txgs"), 'w') as f:
+        f.write(txgs_file(args.txgs))
+    kstat = os.path.join(tmp, "{}", "txgs")
+    log = tester_log(out)
+    assert regex_parse(out)[1] == split_fio_output(out)[1]
+    print(f"fio output: {len(out) / 2**20:.1f} MiB, {args.jobs} jobs; iostat dump: "
+          f"{len(dump) / 2**20:.1f} MiB, {args.devices} devices x {args.iostat_samples}")
+    samples = int(args.hours * 3600)
+    return [
+        ("regex + json.loads", lambda: regex_parse(out)),
+        ("split_fio_output", lambda: split_fio_output(out)),
+        ("split_fio_output full", lambda: split_fio_output(out, frozenset())),
+        ("split_fio_output runner", lambda: split_fio_output(out, HIST_SKIP)),
+        ("format_job", lambda: format_job(fio_json, fio_log, None, "fio")),
+        ("fio_hists", lambda: fio_hists(fio_json)),
+        ("hist merge + p99", lambda: percentile(merge(*(h.get('clat_read', {}) for h in hists)), 99)),
+        ("read_fio_log", lambda: [read_fio_log(prefix, k, 0.0, args.log_ms / 1000) for k in ('bw', 'iops', 'clat')]),
+        ("testio parse_fio+iostat", lambda: testio.parse_iostat(testio.parse_fio(log, "x.json"), log)),
+        ("parser.parse_iostat", lambda: iostat_parser.parse_iostat(dump)),
+        ("read_diskstats", lambda: read_diskstats(names, stats_path)),
+        (f"sampler {args.hours}h", lambda: sampler_run(names, snaps, samples)),
+        ("txg ring + format_rows", lambda: txg_run("bench", args.txgs, kstat)),
+    ]
+
+
+def load_baseline(path: str):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="iotester harness benchmarks")
+    parser.add_argument("--jobs", type=int, default=64, help="fio jobs per output")
+    parser.add_argument("--bins", type=int, default=1500, help="clat bins per direction")
+    parser.add_argument("--seconds", type=int, default=600, help="fio interval log length")
+    parser.add_argument("--log-ms", type=int, default=1000, help="fio interval log step")
+    parser.add_argument("--devices", type=int, default=256, help="devices in iostat/diskstats")
+    parser.add_argument("--iostat-samples", type=int, default=300, help="iostat reports in the dump")
+    parser.add_argument("--hours", type=float, default=0.25, help="sampler ticks, at 1s")
+    parser.add_argument("--txgs", type=int, default=20000, help="rows in the txgs file")
+    parser.add_argument("--repeat", type=int, default=3, help="timing repeats, best kept")
+    parser.add_argument("--only", default=None, help="stages whose name contains this")
+    parser.add_argument("--baseline", default=BASELINE, help="stored stage numbers")
+    parser.add_argument("--save", action="store_true", help="write this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown/growth over the baseline (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+    # hundreds of made up devices, no sampler warnings for each
+    logging.disable(logging.WARNING)
+
+    base = {} if args.save else load_baseline(args.baseline)
+    results, failed = {}, []
+    with tempfile.TemporaryDirectory(prefix="iobench_") as tmp:
+        todo = stages(args, tmp)
+        print(f"{'stage':<26} {'time_ms':>10} {'peak_MiB':>10} {'base_ms':>10} {'base_MiB':>10}")
+        for name, fn in todo:
+            if args.only and args.only not in name:
+                continue
+            t, peak = measure(fn, args.repeat)
+            res = {'time_ms': round(t * 1000, 2), 'peak_MiB': round(peak / 2**20, 2)}
+            results[name] = res
+            ref = base.get(name)
+            status = ""
+            if ref:
+                # memory under 1 MiB is noise, so is sub-millisecond time
+                slow = res['time_ms'] > max(ref['time_ms'] * (1 + args.tolerance), ref['time_ms'] + 1)
+                big = res['peak_MiB'] > max(ref['peak_MiB'] * (1 + args.tolerance), ref['peak_MiB'] + 1)
+                if slow or big:
+                    status = "REGRESSED " + ",".join(k for k, v in (('time', slow), ('mem', big)) if v)
+                    failed.append(name)
+            print(f"{name:<26} {res['time_ms']:>10.1f} {res['peak_MiB']:>10.1f} "
+                  f"{ref['time_ms'] if ref else '-':>10} {ref['peak_MiB'] if ref else '-':>10} {status}")
+    if args.save:
+        # merged, --only saves just its stages
+        with open(args.baseline, 'w') as f:
+            json.dump({**load_baseline(args.baseline), **results}, f, indent=1, sort_keys=True)
+        print(f"baseline saved to {args.baseline}")
+    elif not base:
+        print(f"no baseline in {args.baseline}, run with --save first")
+    if failed:
+        print(f"{len(failed)} stage(s) regressed past {args.tolerance:.0%}: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
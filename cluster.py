@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+import tempfile
+import time
+
+from hist import to_array
+from output import HIST_SKIP, fio_hists, format_job, split_fio_output
+from params import FIO_PORT
+from store import save_result
+
+# Multi-host runs: the normalized fio argv becomes a job file sent to
+# fio --server on every host, one fio --client per host started together
+# from one asyncio loop, results collected concurrently.
+
+# fio client aggregate over hosts, we do our own from the host jobs
+ALL_CLIENTS = "All clients"
+# local only options, the client asks the servers for json+
+CLIENT_SKIP = ('name', 'output', 'output-format')
+
+
+def to_jobfile(cmd: list):
+    # ['fio', '--name=x', '--rw=read', '--time_based'] -> [x] section
+    opts = []
+    name = "job"
+    for arg in cmd[1:]:
+        k, sep, v = arg.lstrip('-').partition('=')
+        if k == 'name':
+            name = v
+        if k in CLIENT_SKIP:
+            continue
+        opts.append(f"{k}={v}" if sep else k)
+    return f"[{name}]\n" + "\n".join(opts) + "\n"
+
+
+async def _wait_port(host: str, port: int, timeout: float):
+    # fio --server accepts before it is handed a job, a connect is enough
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            await writer.wait_closed()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def run_client(host: str, port: int, jobfile: str, timeout: float,
+                     barrier: asyncio.Barrier):
+    # (rc, stdout, stderr) of one fio --client
+    try:
+        await _wait_port(host, port, 10)
+    finally:
+        # a dead host must not hold the others at the barrier
+        await barrier.wait()
+    proc = await asyncio.create_subprocess_exec(
+        "fio", f"--client={host},{port}", "--output-format=json+", jobfile,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        start_new_session=True)
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        os.killpg(proc.pid, signal.SIGKILL)
+        out, err = await proc.communicate()
+        err += f"\nTimeout after {timeout}s".encode()
+    return proc.returncode, out.decode(errors="replace"), err.decode(errors="replace")
+
+
+async def run_clients(hosts: list, jobfile: str, timeout: float):
+    barrier = asyncio.Barrier(len(hosts))
+    return await asyncio.gather(
+        *(run_client(host, port, jobfile, timeout, barrier) for host, port in hosts),
+        return_exceptions=True)
+
+
+def client_jobs(fio_json: dict):
+    # client mode lists the jobs under client_stats, with their hostname
+    jobs = fio_json.get('client_stats', fio_json.get('jobs', []))
+    return [j for j in jobs if j.get('jobname') != ALL_CLIENTS]
+
+
+def host_disks(fio_json: dict):
+    # disk_util fio sampled on the host side
+    disks = fio_json.get('disk_util', [])
+    return {
+        'host_disks': ",".join(d.get('name', '') for d in disks),
+        'host_util': round(sum(d.get('util', 0) for d in disks) / len(disks), 2) if disks else 0.0,
+    }
+
+
+def host_rows(cmd: list, hosts: list, results: list):
+    # per host rows and the aggregate over every host's jobs
+    rows, jobs = [], []
+    for (host, port), result in zip(hosts, results):
+        label = f"{host}:{port}"
+        if isinstance(result, Exception):
+            logging.error("fio client %s failed: %s", label, result)
+            continue
+        rc, out, err = result
+        try:
+            fio_json, fio_log = split_fio_output(out, HIST_SKIP)
+        except ValueError as e:
+            logging.error("fio client %s (rc %s): %s %s", label, rc, e, err.strip())
+            continue
+        host_json = {**fio_json, 'jobs': client_jobs(fio_json)}
+        if not host_json['jobs']:
+            logging.error("fio client %s (rc %s): no jobs in output", label, rc)
+            continue
+        jobs.extend(host_json['jobs'])
+        row = format_job(host_json, fio_log, None, cmd)
+        rows.append({'host': label, **row, **host_disks(fio_json)})
+    if not jobs:
+        return None, rows, {}
+    agg_json = {'jobs': jobs}
+    agg = {'host': 'all', 'hosts': len(rows), **format_job(agg_json, "", None, cmd)}
+    return agg, rows, fio_hists(agg_json)
+
+
+def start_servers(count: int, port: int = FIO_PORT):
+    # local stand-in for a fleet: fio --server on consecutive ports
+    procs = [subprocess.Popen(["fio", f"--server=,{port + i}"],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              start_new_session=True)
+             for i in range(count)]
+    return procs, [("localhost", port + i) for i in range(count)]
+
+
+def stop_servers(procs: list):
+    for proc in procs:
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            continue
+        proc.wait()
+
+
+def run_hosts(cmds: list, argv: object):
+    # one command at a time, every host at once
+    procs, hosts = [], list(argv.hosts or [])
+    if argv.local_servers:
+        procs, local = start_servers(argv.local_servers)
+        hosts += local
+    out = []
+    try:
+        for cmd in cmds:
+            with tempfile.NamedTemporaryFile('w', suffix=".fio", dir=argv.logdir) as f:
+                f.write(to_jobfile(cmd))
+                f.flush()
+                results = asyncio.run(run_clients(hosts, f.name, argv.runtime + 30))
+            agg, rows, hists = host_rows(cmd, hosts, results)
+            logging.info("Cmd: %s on %s hosts (%s ok)", cmd[1], len(hosts), len(rows))
+            if agg is None:
+                continue
+            if argv.db:
+                series = {'hist': {k: to_array(h) for k, h in hists.items()}}
+                save_result(argv.db, argv.setname, agg, series)
+                for row in rows:
+                    save_result(argv.db, argv.setname, row)
+            out.append(agg)
+            out.extend(rows)
+    finally:
+        stop_servers(procs)
+    return out
@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pytest
+
+import params
+import runner
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+# fio stand-in: normal,json+ report and the interval logs it was asked for.
+# STUB_FIO_SLEEP keeps it running (SIGINT ends it early, still reporting),
+# every run is 1% off the previous one in a cycle of 3
+FIO = f"""#!{sys.executable}
+import json, os, sys, time
+sys.path.insert(0, {REPO!r})
+from bench import fio_output
+opts = dict(a[2:].partition('=')[::2] for a in sys.argv[1:] if a.startswith('--'))
+try:
+    time.sleep(float(os.environ.get('STUB_FIO_SLEEP', 0)))
+except KeyboardInterrupt:
+    pass
+runs = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'runs')
+# one byte per run, appends do not race in fanout
+fd = os.open(runs, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+os.write(fd, b'.')
+n = os.fstat(fd).st_size - 1
+os.close(fd)
+for kind, key in (('bw', 'write_bw_log'), ('iops', 'write_iops_log'), ('clat', 'write_lat_log')):
+    if key in opts:
+        with open(f"{{opts[key]}}_{{kind}}.1.log", 'w') as f:
+            f.write("1000, 100, 0, 4096, 0\\n")
+out = fio_output(1, 10).replace('bench_randrw_0', opts['name'])
+cut = out.index('\\n' + opts['name'] + ':')
+doc = json.loads(out[:cut])
+for job in doc['jobs']:
+    for d in ('read', 'write'):
+        job[d]['iops'] *= 1 + n % 3 / 100
+sys.stdout.write(json.dumps(doc) + out[cut:])
+"""
+
+
+@pytest.fixture
+def stub_fio(tmp_path, monkeypatch):
+    # fio on PATH is the stand-in, no settling, any -d is a block device
+    fio = tmp_path / "bin" / "fio"
+    fio.parent.mkdir()
+    fio.write_text(FIO)
+    fio.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{fio.parent}:{os.environ['PATH']}")
+    monkeypatch.setattr(runner, "settle", lambda *a: 0.0)
+    monkeypatch.setattr(params, "is_block_device", lambda p: True)
+    return fio
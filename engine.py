@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+import json
+import mmap
+import os
+import random
+import signal
+import sys
+import threading
+import time
+
+from hist import PCTS, bucket, bucket_value, merge, percentile
+from numa import parse_cpulist
+from precondition import current_size, open_target, to_bytes
+
+# Built-in load engine for jobs with --ioengine=pyio: fio's argv in, fio's
+# normal,json+ stdout and interval logs out, so runner/output handle it as
+# any fio run. preadv/pwritev on O_DIRECT fds from iodepth threads per job
+# (the syscalls drop the GIL), page aligned mmap buffers. Runs where fio
+# is missing, and as a second opinion on fio's numbers.
+
+ENGINE = "pyio"
+# fio's default --percentile_list plus ours
+FIO_PCTS = sorted({1.0, 5.0, 10.0, 20.0, 30.0, 40.0, 50.0, 60.0, 70.0, 80.0, 90.0,
+                   95.0, 99.0, 99.5, 99.9, 99.95, 99.99, *PCTS})
+# options the engine reads, everything else is left to fio
+KNOWN = {'name', 'rw', 'readwrite', 'rwmixread', 'bs', 'iodepth', 'numjobs', 'size',
+         'filesize', 'filename', 'runtime', 'time_based', 'direct', 'ioengine',
+         'group_reporting', 'write_bw_log', 'write_iops_log', 'write_lat_log',
+         'log_avg_msec', 'output-format', 'cpus_allowed'}
+DIRS = ('read', 'write')
+# interval log file suffix -> the write_*_log option asking for it, like
+# fio: write_lat_log gives <prefix>_clat, _slat and _lat
+LOGS = {'bw': 'bw', 'iops': 'iops', 'clat': 'lat', 'slat': 'lat', 'lat': 'lat'}
+
+
+def is_pyio(cmd: list):
+    return f"--ioengine={ENGINE}" in cmd
+
+
+def command(cmd: list):
+    # fio argv -> the same job through this module
+    return [sys.executable, os.path.abspath(__file__), *cmd[1:]]
+
+
+def parse_opts(args: list):
+    # --key=value / --flag, last one wins like fio
+    opts = {}
+    for a in args:
+        k, sep, v = a.lstrip('-').partition('=')
+        opts[k] = v if sep else True
+    return opts
+
+
+def job_plan(opts: dict):
+    rw = opts.get('rw', opts.get('readwrite', 'read'))
+    mix = {'read': 100, 'randread': 100, 'write': 0, 'randwrite': 0}
+    return {
+        'name': opts.get('name', 'pyio'),
+        'filename': opts['filename'],
+        'rw': rw,
+        'random': rw.startswith('rand'),
+        'read_pct': mix.get(rw, int(opts.get('rwmixread', 50))),
+        'bs': to_bytes(opts.get('bs', '4k')),
+        'iodepth': int(opts.get('iodepth', 1)),
+        'numjobs': int(opts.get('numjobs', 1)),
+        'size': to_bytes(opts['size']) if 'size' in opts else
+                to_bytes(opts['filesize']) if 'filesize' in opts else 0,
+        'runtime': float(opts.get('runtime', 0)),
+        'time_based': 'time_based' in opts,
+        'direct': str(opts.get('direct', '0')) == '1',
+        'group': 'group_reporting' in opts,
+        'log_ms': int(opts.get('log_avg_msec', 500)),
+        'logs': {k: opts[f"write_{o}_log"] for k, o in LOGS.items()
+                 if f"write_{o}_log" in opts},
+        # as given, what fio echoes back under 'job options'
+        'options': {k: str(opts[k]) for k in ('name', 'rw', 'bs', 'iodepth', 'numjobs', 'size',
+                                              'ioengine') if k in opts},
+    }
+
+
+def new_counters():
+    # per direction: ios, bytes, latency sum (ns), histogram
+    return {d: {'ios': 0, 'bytes': 0, 'lat': 0, 'hist': {}, 'min': 0, 'max': 0} for d in DIRS}
+
+
+def _worker(fd: int, plan: dict, total: int, seq, stats: dict, stop: threading.Event,
+            seed: int):
+    # one queue slot: a sync io at a time, latency from the syscall. seq
+    # numbers the job's ios across its slots: the block for sequential
+    # jobs, and like fio any job that is not time_based stops after size
+    bs = plan['bs']
+    buf = mmap.mmap(-1, bs)
+    buf[:] = os.urandom(bs)
+    view = memoryview(buf)
+    rnd = random.Random(seed)
+    blocks = total // bs
+    clock = time.perf_counter_ns
+    while not stop.is_set():
+        n = next(seq)
+        if not plan['time_based'] and n >= blocks:
+            return
+        off = rnd.randrange(blocks) * bs if plan['random'] else n % blocks * bs
+        ddir = 'read' if rnd.random() * 100 < plan['read_pct'] else 'write'
+        t0 = clock()
+        if ddir == 'read':
+            done = os.preadv(fd, [view], off)
+        else:
+            done = os.pwritev(fd, [view], off)
+        lat = clock() - t0
+        s = stats[ddir]
+        s['ios'] += 1
+        s['bytes'] += done
+        s['lat'] += lat
+        idx = bucket(lat)
+        s['hist'][idx] = s['hist'].get(idx, 0) + 1
+        s['min'] = lat if not s['min'] else min(s['min'], lat)
+        s['max'] = max(s['max'], lat)
+
+
+def _lat_block(hist: dict, ios: int, lat_sum: int, lo: int, hi: int, bins: bool = True):
+    block = {'min': lo, 'max': hi, 'mean': lat_sum / ios if ios else 0.0, 'stddev': 0.0,
+             'N': ios}
+    if ios:
+        block['percentile'] = {f"{p:.6f}": percentile(hist, p) for p in FIO_PCTS}
+        if bins:
+            block['bins'] = {str(bucket_value(i)): c for i, c in sorted(hist.items())}
+    return block
+
+
+def dir_block(stats: list, ddir: str, runtime_s: float):
+    # fio json+ direction block out of every slot's counters
+    ios = sum(s[ddir]['ios'] for s in stats)
+    nbytes = sum(s[ddir]['bytes'] for s in stats)
+    hist = merge(*(s[ddir]['hist'] for s in stats))
+    lat = sum(s[ddir]['lat'] for s in stats)
+    lo = min((s[ddir]['min'] for s in stats if s[ddir]['ios']), default=0)
+    hi = max((s[ddir]['max'] for s in stats), default=0)
+    rt = runtime_s or 1e-9
+    return {
+        'io_bytes': nbytes, 'io_kbytes': nbytes // 1024, 'bw_bytes': int(nbytes / rt),
+        'bw': int(nbytes / 1024 / rt), 'iops': ios / rt, 'runtime': int(runtime_s * 1000),
+        'total_ios': ios, 'short_ios': 0, 'drop_ios': 0,
+        'slat_ns': _lat_block({}, 0, 0, 0, 0),
+        'clat_ns': _lat_block(hist, ios, lat, lo, hi),
+        'lat_ns': _lat_block(hist, ios, lat, lo, hi, False),
+    }
+
+
+def _logger(plan: dict, slots: list, stop: threading.Event, t0: float, job: int):
+    # fio interval logs: msec, value, ddir, bs, offset. Latencies in ns, a
+    # sync syscall has no submission part: slat 0, lat = clat
+    files = {k: open(f"{p}_{k}.{job + 1}.log", 'w') for k, p in plan['logs'].items()}
+    prev = {d: (0, 0, 0) for d in DIRS}
+    step = plan['log_ms'] / 1000
+    try:
+        while not stop.wait(step):
+            ms = int((time.monotonic() - t0) * 1000)
+            for i, d in enumerate(DIRS):
+                cur = tuple(sum(s[d][k] for s in slots) for k in ('ios', 'bytes', 'lat'))
+                ios, nbytes, lat = (c - p for c, p in zip(cur, prev[d]))
+                prev[d] = cur
+                if not ios:
+                    continue
+                vals = {'bw': int(nbytes / 1024 / step), 'iops': int(ios / step),
+                        'clat': int(lat / ios), 'slat': 0, 'lat': int(lat / ios)}
+                for k, f in files.items():
+                    f.write(f"{ms}, {vals[k]}, {i}, {plan['bs']}, 0\n")
+    finally:
+        for f in files.values():
+            f.close()
+
+
+def run(plan: dict, stop: threading.Event):
+    # every job and slot at once, the fio json document
+    path = plan['filename']
+    total = current_size(path)
+    # read only jobs still lay out a missing/short file
+    write = plan['read_pct'] < 100 or total < plan['size']
+    if plan['direct']:
+        fd, _ = open_target(path, write)
+    else:
+        fd = os.open(path, (os.O_RDWR | os.O_CREAT) if write else os.O_RDONLY, 0o644)
+    try:
+        if plan['size'] and total < plan['size']:
+            # fio lays the file out, a sparse one reads back as zeros
+            os.ftruncate(fd, plan['size'])
+            total = plan['size']
+        total = min(total, plan['size'] or total)
+        if total < plan['bs']:
+            raise ValueError(f"{path}: smaller than bs")
+        jobs, workers, loggers = [], [], []
+        cpu0, t0 = os.times(), time.monotonic()
+        for j in range(plan['numjobs']):
+            # jobs share nothing, each issues size bytes (sequential ones from 0)
+            seq = iter(range(sys.maxsize))
+            slots = [new_counters() for _ in range(plan['iodepth'])]
+            jobs.append(slots)
+            workers += [threading.Thread(target=_worker, daemon=True,
+                                          args=(fd, plan, total, seq, slots[q], stop,
+                                               j * plan['iodepth'] + q))
+                         for q in range(plan['iodepth'])]
+            if plan['logs']:
+                loggers.append(threading.Thread(target=_logger, daemon=True,
+                                                args=(plan, slots, stop, t0, j)))
+        threads = workers + loggers
+        for t in threads:
+            t.start()
+        deadline = t0 + plan['runtime'] if plan['runtime'] else None
+        while any(t.is_alive() for t in workers) and not stop.is_set():
+            if deadline and time.monotonic() >= deadline:
+                break
+            stop.wait(0.05)
+        stop.set()
+        for t in threads:
+            t.join()
+        runtime_s = time.monotonic() - t0
+        cpu1 = os.times()
+    finally:
+        os.close(fd)
+    # cpu of the whole engine split over the jobs, like fio per job (a
+    # group reports the same mean)
+    usr = (cpu1.user - cpu0.user) / runtime_s * 100 / len(jobs)
+    sys_ = (cpu1.system - cpu0.system) / runtime_s * 100 / len(jobs)
+    groups = [[s for slots in jobs for s in slots]] if plan['group'] else jobs
+    out = []
+    for slots in groups:
+        out.append({
+            'jobname': plan['name'], 'groupid': 0, 'error': 0,
+            'job options': plan['options'],
+            **{d: dir_block(slots, d, runtime_s) for d in DIRS},
+            'trim': dir_block([], 'trim', runtime_s),
+            'job_runtime': int(runtime_s * 1000),
+            'usr_cpu': usr,
+            'sys_cpu': sys_,
+        })
+    return {'fio version': ENGINE, 'timestamp': int(time.time()),
+            'global options': {}, 'jobs': out}
+
+
+def report(doc: dict):
+    # the normal output after the json, one line per job and direction
+    lines = []
+    for job in doc['jobs']:
+        lines.append(f"{job['jobname']}: (groupid=0, jobs=1): err= 0: engine={ENGINE}")
+        for d in DIRS:
+            b = job[d]
+            if b['total_ios']:
+                lines.append(f"  {d}: IOPS={b['iops']:.0f}, BW={b['bw'] / 1024:.1f}MiB/s")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    opts = parse_opts(sys.argv[1:] if argv is None else argv)
+    unknown = sorted(set(opts) - KNOWN)
+    if unknown:
+        print(f"{ENGINE}: ignoring {','.join(unknown)}", file=sys.stderr)
+    plan = job_plan(opts)
+    if 'cpus_allowed' in opts:
+        os.sched_setaffinity(0, parse_cpulist(opts['cpus_allowed']))
+    stop = threading.Event()
+    # SIGINT (timeout, steady state) ends the run and still reports, like fio
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    try:
+        doc = run(plan, stop)
+    except (OSError, ValueError) as e:
+        print(f"{ENGINE}: {e}", file=sys.stderr)
+        return 1
+    sys.stdout.write(json.dumps(doc) + "\n" + report(doc) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
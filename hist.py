@@ -0,0 +1,128 @@
+from array import array
+from functools import lru_cache
+
+# fio's own log-linear latency histogram (stat.h FIO_IO_U_PLAT_*): values
+# under 128 are exact, then 64 linear buckets per power of two, <1.6%
+# error. Kept sparse as {bucket index: count} in ns, merged by adding
+# counts, so percentiles over many jobs/devices come from the combined
+# samples instead of averaging p99s.
+
+PLAT_BITS = 6
+PLAT_VAL = 1 << PLAT_BITS
+PLAT_NR = 29 * PLAT_VAL
+
+# percentiles reported per direction
+PCTS = (99.0, 99.9, 99.99)
+
+UNIT_NS = {'ns': 1, 'us': 1000, 'ms': 1000 * 1000}
+
+
+def pct_key(name: str, p: float):
+    # clat, 99.9 -> clat_p99_9_us
+    return f"{name}_p{p:g}_us".replace('.', '_')
+
+
+def bucket(ns: int):
+    # plat_val_to_idx()
+    msb = max(ns.bit_length() - 1, 0)
+    if msb <= PLAT_BITS:
+        return ns
+    error_bits = msb - PLAT_BITS
+    idx = ((error_bits + 1) << PLAT_BITS) + ((ns >> error_bits) & (PLAT_VAL - 1))
+    return min(idx, PLAT_NR - 1)
+
+
+def bucket_value(idx: int):
+    # plat_idx_to_val(), bucket midpoint in ns
+    if idx < PLAT_VAL << 1:
+        return idx
+    error_bits = (idx >> PLAT_BITS) - 1
+    base = 1 << (error_bits + PLAT_BITS)
+    return int(base + (idx % PLAT_VAL + 0.5) * (1 << error_bits))
+
+
+@lru_cache(maxsize=None)
+def _bin_bucket(val: str, scale: int):
+    # json+ keys are fio bucket values, the same few hundred in every job
+    return bucket(int(val) * scale)
+
+
+def from_bins(bins: dict, unit: str = 'ns'):
+    # json+ "bins": {bucket value: count}
+    scale = UNIT_NS[unit]
+    hist = {}
+    for val, count in bins.items():
+        if count:
+            idx = _bin_bucket(val, scale)
+            hist[idx] = hist.get(idx, 0) + count
+    return hist
+
+
+def from_percentiles(pcts: dict, total: int, unit: str = 'ns'):
+    # plain json only has the percentile list: the mass between two
+    # listed percentiles goes to the upper one's bucket. Coarse, but it
+    # merges like the real thing
+    scale = UNIT_NS[unit]
+    hist = {}
+    prev = 0.0
+    for p, val in sorted((float(k), v) for k, v in pcts.items()):
+        count = round((p - prev) / 100 * total)
+        prev = p
+        if count:
+            idx = bucket(int(val) * scale)
+            hist[idx] = hist.get(idx, 0) + count
+    return hist
+
+
+def from_fio(stat: dict, unit: str = 'ns', total: int = 0):
+    # one clat/slat/lat block of a fio job direction
+    if stat.get('bins'):
+        return from_bins(stat['bins'], unit)
+    if stat.get('percentile') and total:
+        return from_percentiles(stat['percentile'], total, unit)
+    return {}
+
+
+def merge(*hists: dict):
+    out = {}
+    for hist in hists:
+        for idx, count in hist.items():
+            out[idx] = out.get(idx, 0) + count
+    return out
+
+
+def percentile(hist: dict, p: float):
+    # ns, fio's rule: first bucket whose cumulative count reaches p%
+    total = sum(hist.values())
+    if not total:
+        return 0
+    target = total * p / 100
+    seen = 0
+    for idx in sorted(hist):
+        seen += hist[idx]
+        if seen >= target:
+            return bucket_value(idx)
+    return bucket_value(max(hist))
+
+
+def to_array(hist: dict):
+    # idx, count pairs, what the result store keeps
+    a = array('q')
+    for idx in sorted(hist):
+        a.append(idx)
+        a.append(hist[idx])
+    return a
+
+
+def from_array(a: array):
+    return dict(zip(a[::2], a[1::2]))
+
+
+def summary(hists: dict):
+    # row columns: sample count and percentiles (us) per histogram
+    row = {}
+    for name, hist in sorted(hists.items()):
+        row[f"{name}_n"] = sum(hist.values())
+        for p in PCTS:
+            row[pct_key(name, p)] = round(percentile(hist, p) / 1000, 3)
+    return row
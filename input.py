@@ -1,103 +1,197 @@
-import datetime
+import configparser
+import hashlib
+import itertools
+import json
 import logging
-import sys
+import os
+import re
+import shlex
 
-def getjobs(argv):
-    # get the jobfile
-    path = argv.jobfile
-    
-    try:
-        with open(path) as f:
-            raw_data = f.readlines()
-    except Exception as e:
-        logging.error("jobfile not found: %s (%s)", path, e)
+# Job file -> fio argv lists. Line files (one fio command per line, \
+# continuations, # comments, also trailing ones: quote a # in a value)
+# or fio .fio/.ini job files. Option values
+# like bs={4k,16k} or iodepth={1..128:x2} expand into one job per
+# combination, lazily. Parsed plans are cached by file hash.
+
+# option=value, value as a whole in braces
+MATRIX_RE = re.compile(r"^\{([^{}]*)\}$")
+# 1..128, 1..128:x2, 0..100:+25
+RANGE_RE = re.compile(r"^(\d+)\.\.(\d+)(?::([x+])(\d+))?$")
+INI_SUFFIXES = ('.fio', '.ini')
+PLAN_DIR = ".plans"
+
+
+def _matrix_values(val: str):
+    # None when val is not a matrix
+    m = MATRIX_RE.match(val)
+    if not m:
+        return None
+    body = m.group(1)
+    r = RANGE_RE.match(body)
+    if not r:
+        vals = [v.strip() for v in body.split(',') if v.strip()]
+        if not vals:
+            raise ValueError(f"empty matrix {val}")
+        return vals
+    lo, hi, op, step = int(r.group(1)), int(r.group(2)), r.group(3) or '+', int(r.group(4) or 1)
+    if (op == 'x' and (step < 2 or lo < 1)) or step < 1:
+        raise ValueError(f"bad range {val}")
+    vals = []
+    v = lo
+    while v <= hi:
+        vals.append(str(v))
+        v = v * step if op == 'x' else v + step
+    if not vals:
+        raise ValueError(f"empty range {val}")
+    return vals
 
-    cmds = []
+
+def parse_lines(text: str):
+    # one token list per fio command line
+    specs = []
     buf = []
-    for line in raw_data:
+    for line in text.splitlines():
         s = line.strip()
         if not s or s.startswith('#'):
             continue
-
         if s.endswith('\\'):
             buf.append(s[:-1].rstrip())
             continue
-        if buf:
-            buf.append(s)
-            cmds.append(" ".join(buf))
-            buf = []
+        buf.append(s)
+        specs.append(shlex.split(" ".join(buf), comments=True))
+        buf = []
+    if buf:
+        specs.append(shlex.split(" ".join(buf), comments=True))
+    # a line that was only a trailing comment
+    return [tokens for tokens in specs if tokens]
+
+
+def parse_ini(text: str):
+    # fio job file: every section but [global] is a job, global options
+    # first so the job's own win
+    ini = configparser.ConfigParser(allow_no_value=True, delimiters=('=',),
+                                    comment_prefixes=('#', ';'), interpolation=None,
+                                    strict=False)
+    ini.optionxform = str
+    ini.read_string(text)
+    glob = dict(ini.items('global', raw=True)) if ini.has_section('global') else {}
+    specs = []
+    for section in ini.sections():
+        if section == 'global':
+            continue
+        opts = {**glob, **dict(ini.items(section, raw=True))}
+        tokens = ["fio", f"--name={section}"]
+        tokens += [f"--{k}" if v is None else f"--{k}={v}" for k, v in opts.items()]
+        specs.append(tokens)
+    return specs
+
+
+def expand(tokens: list):
+    # cartesian product of the matrix options, the job name gets
+    # _<option><value> per expanded option
+    axes = []
+    for i, tok in enumerate(tokens):
+        key, sep, val = tok.partition('=')
+        vals = _matrix_values(val) if sep else None
+        if vals:
+            axes.append((i, key.lstrip('-'), vals))
+    if not axes:
+        yield tokens
+        return
+    for combo in itertools.product(*(vals for _, _, vals in axes)):
+        out = list(tokens)
+        suffix = ""
+        for (i, key, _), v in zip(axes, combo):
+            out[i] = f"{tokens[i].partition('=')[0]}={v}"
+            suffix += f"_{key}{v}"
+        for j, tok in enumerate(out):
+            if tok.startswith("--name="):
+                out[j] = tok + suffix
+                break
         else:
-            cmds.appends(s)
+            out.insert(1, f"--name=job{suffix}")
+        yield out
 
-    if buf:
-        cmds.append(" ".join(buf))
-    return cmds
+
+def load_plan(path: str, cache_dir: str | None = None):
+    # parsed (not yet expanded) token lists, cached under the file sha1
+    # and the parser it went through (same text as .fio and as lines)
+    ini = path.endswith(INI_SUFFIXES)
+    with open(path, 'rb') as f:
+        raw = f.read()
+    digest = hashlib.sha1(raw).hexdigest()
+    mode = "ini" if ini else "lines"
+    cache = os.path.join(cache_dir, PLAN_DIR, f"{digest}.{mode}.json") if cache_dir else None
+    if cache:
+        try:
+            with open(cache) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    text = raw.decode()
+    specs = parse_ini(text) if ini else parse_lines(text)
+    if cache:
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        tmp = cache + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(specs, f)
+        os.replace(tmp, cache)
+    return specs
+
+
+def getjobs(argv):
+    # generator of fio token lists, matrices expanded as they are consumed
+    path = argv.jobfile
+    try:
+        specs = load_plan(path, getattr(argv, 'logdir', None))
+        # bad matrices fail here, not halfway through the run
+        for tokens in specs:
+            for tok in tokens:
+                key, sep, val = tok.partition('=')
+                if sep:
+                    _matrix_values(val)
+    except (OSError, ValueError, configparser.Error) as e:
+        logging.error("jobfile not usable: %s (%s)", path, e)
+        return
+    for tokens in specs:
+        yield from expand(tokens)
 
 
 def normalizecmds(cmds, argv):
-    # Namespace(setname=None, jobfile='jobs.txt', filename=None, filesize=None, runtime=None)
-    # recup param list
-    norms = []
-    for cmd in cmds:
+    # generator: fio argv lists with the run options forced in
+    # fio options that share a name with a cli option take its value
+    overrides = {k: v for k, v in vars(argv).items() if v}
+    setname = argv.setname.lower().strip()
+    for k, cmd in enumerate(cmds):
+        if isinstance(cmd, str):
+            cmd = shlex.split(cmd)
         norm = {}
-        parts = cmd.split()
-        for part in parts[1:]:      # 1st key is fio
-            # replace prefix - or --
-            part = part.replace("-", "")
-            if "=" in part:
-                k = part.split("=")[0]
-                v = part.split("=")[1]
-                norm[k] = v
-            else:
-                k = part
-                norm[k] = True
-
-        norms.append(norm)
-
-    # Overwrite cli params with argv parameters
-    for k, v in vars(argv).items():
-        # look for match in commands
-        for cmdidx, cmd in enumerate(norms):
-            for u, w in cmd.items():
-                if v and k == u:
-                    # job name fixing
-                    print("Found match", k, "=", v, " with ", u, "=", w)
-                    # print("Before: ", u, "=", norms[cmdidx][u])
-                    norms[cmdidx][u] = v
-                    # print("After: ", u ,"=", norms[cmdidx][u])
-
-    # outfile
-    stamp = datetime.datetime.now().strftime("%d%m%y_%H%M%S")
-    # Prefix jobname with setname
-    for k, cmd in enumerate(norms):
-        #norms.pop('outputformat')
-        name = cmd.get('name') or f"00{str(k)}"
-        norms[k]['name'] = argv.setname.lower().strip() + "_" + name.replace('"', '')
-        # unset output, output-format keys if any
-        if cmd.get('output'):
-            norms[k].pop('output')
-        if cmd.get('outputformat'):
-            norms[k].pop('outputformat')
+        for part in cmd[1:]:      # 1st key is fio
+            key, sep, val = part.partition("=")
+            # only the leading dashes, values keep theirs
+            norm[key.lstrip("-")] = val if sep else True
+
+        for key in overrides.keys() & norm.keys():
+            logging.debug("Found match %s=%s with %s=%s", key, overrides[key], key, norm[key])
+            norm[key] = overrides[key]
 
-        # norms[k]['output'] = f"{stamp}_{argv.setname}_00{str(k)}"
-        norms[k]['output-format'] = "normal,json"
+        # Prefix jobname with setname
+        name = norm.get('name') or f"00{k}"
+        norm['name'] = setname + "_" + str(name).replace('"', '')
+        # unset output, output-format keys if any
+        for key in ('output', 'output-format', 'output_format', 'outputformat'):
+            norm.pop(key, None)
+        norm['output-format'] = "normal,json+"
         # add runtime
-        norms[k]['runtime'] = int(argv.runtime)
+        norm['runtime'] = int(argv.runtime)
         if argv.raw:
-            norms[k]['filename'] = argv.devices[0].strip()
+            norm['filename'] = argv.devices[0].strip()
         else:
-            norms[k]['filename'] = argv.filename.strip()
-            norms[k]['filesize'] = argv.filesize.strip()
+            norm['filename'] = argv.filename.strip()
+            norm['filesize'] = argv.filesize.strip()
 
-    # create list suitable for subprocess
-    res = []
-    for norm in norms:
+        # list suitable for subprocess
         args = ["fio"]
-        for k, v in norm.items():
-            key = f"--{k}"
-            if v is True or v == "True":
-                args.append(f"{key}")
-            else:
-                args.append(f"{key}={v}")
-        res.append(args)
-    return res
+        for key, v in norm.items():
+            args.append(f"--{key}" if v is True or v == "True" else f"--{key}={v}")
+        yield args
@@ -1,11 +1,17 @@
 #!/usr/bin/env python3
 
 import logging
-from params import parse_args
+from params import parse_args, parse_sweep_args, parse_export_args, parse_tune_args, parse_compare_args
 from input import getjobs
 from input import normalizecmds
-from runner import run_jobs
+from runner import run_jobs, check_logdir
 from output import tocsv
+from sweep import run_sweep
+from tune import run_tune
+from precondition import precondition
+from store import query, load_series
+from hist import from_array, merge, summary
+from stats import mean, welch
 import sys
 
 # GLOBALS
@@ -17,8 +23,168 @@ logging.basicConfig(
 )
 
 
+def prepare(args):
+    # targets laid out and verified before any measured run
+    if args.precondition and not precondition(args):
+        logging.error("preconditioning failed, nothing measured")
+        return False
+    return True
+
+
+def sweep(argv=None):
+    args = parse_sweep_args(argv)
+    # logdir made and checked once here, run_job does not
+    check_logdir(args)
+    if not prepare(args):
+        return 1
+    output = run_sweep(args)
+    tocsv(output)
+
+
+def tune(argv=None):
+    args = parse_tune_args(argv)
+    # every config runs the whole subset, not a one-shot generator
+    cmds = list(normalizecmds(getjobs(args), args))
+    if args.only:
+        names = {f"--name={args.setname.lower().strip()}_{n}" for n in args.only}
+        cmds = [cmd for cmd in cmds if names & set(cmd)]
+    if not cmds:
+        logging.error("no jobs left to run")
+        return 1
+    check_logdir(args)
+    if not prepare(args):
+        return 1
+    tocsv(run_tune(cmds, args))
+
+
+def export(argv=None):
+    args = parse_export_args(argv)
+    rows = query(args.db, args.setname, args.jobname, args.bs, args.qd)
+    if not rows:
+        logging.error("no results in %s", args.db)
+        return 1
+    # per fio job rows next to their aggregate only when asked for
+    if not args.threads:
+        rows = [(rid, row) for rid, row in rows if 'thread' not in row]
+    if args.merge:
+        rows = merge_rows(args.db, rows)
+    tocsv([row for _, row in rows])
+
+
+def merge_rows(db, rows):
+    # one row per job name, percentiles over the combined latency
+    # histograms of all its runs/devices (not an average of p99s)
+    groups = {}
+    for rid, row in rows:
+        if 'thread' in row:
+            continue
+        groups.setdefault(row.get('jobname'), []).append((rid, row))
+    out = []
+    for jobname, group in groups.items():
+        hists = {}
+        for rid, _ in group:
+            for name, arr in load_series(db, rid).get('hist', {}).items():
+                hists[name] = merge(hists.get(name, {}), from_array(arr))
+        devices = sorted({r.get('device') for _, r in group if r.get('device')})
+        merged = {'jobname': jobname, 'runs': len(group),
+                  'device': ",".join(devices), **summary(hists)}
+        out.append((None, merged))
+    return out
+
+
+def _job_key(setname, row):
+    # same job across sets: set prefix dropped from the job name
+    prefix = setname.lower().strip() + "_"
+    name = row.get('jobname', '')
+    name = name[len(prefix):] if name.startswith(prefix) else name
+    return (name, row.get('device', ''), row.get('numa_placement', ''), row.get('host', ''))
+
+
+def _samples(db, setname):
+    # every stored run (repeats included) of each job, no per thread rows
+    groups = {}
+    for _, row in query(db, setname):
+        if 'thread' not in row:
+            groups.setdefault(_job_key(setname, row), []).append(row)
+    return groups
+
+
+# latency/time columns: clat_p99_us, slat_avg_us, sync_p95_ms, clat_ratio
+LOWER_UNITS = ('_ns', '_us', '_ms')
+LOWER_WORDS = {'lat', 'clat', 'slat'}
+
+
+def _lower_better(metric):
+    # whole words only, iops_mslat (iops per ms of p99) is higher better
+    return metric.endswith(LOWER_UNITS) or bool(LOWER_WORDS & set(metric.split('_')))
+
+
+def compare(argv=None):
+    args = parse_compare_args(argv)
+    base, new = _samples(args.db, args.base), _samples(args.db, args.new)
+    if not base or not new:
+        logging.error("no results for %s in %s", args.base if not base else args.new, args.db)
+        return 1
+    out = []
+    regressions = 0
+    for key in sorted(base.keys() | new.keys()):
+        job, device, place, host = key
+        ident = {'job': job, 'device': device}
+        if place:
+            ident['numa_placement'] = place
+        if host:
+            ident['host'] = host
+        if key not in base or key not in new:
+            out.append({**ident, 'verdict': f"only in {args.base if key in base else args.new}"})
+            continue
+        for metric in args.metrics:
+            a = [float(r[metric]) for r in base[key] if r.get(metric) not in (None, "")]
+            b = [float(r[metric]) for r in new[key] if r.get(metric) not in (None, "")]
+            if not a or not b:
+                continue
+            ma, mb = mean(a), mean(b)
+            delta = (mb - ma) / ma if ma else 0.0
+            t, df, p = welch(a, b)
+            worse = -delta if not _lower_better(metric) else delta
+            if p is None:
+                # a single run on either side, nothing to test
+                verdict = "untested"
+            elif p >= args.alpha or abs(delta) < args.threshold:
+                verdict = "same"
+            else:
+                verdict = "regression" if worse > 0 else "improvement"
+            regressions += verdict == "regression"
+            out.append({**ident, 'metric': metric,
+                        'base_n': len(a), 'base_mean': round(ma, 3),
+                        'new_n': len(b), 'new_mean': round(mb, 3),
+                        'delta_pct': round(delta * 100, 2),
+                        't': round(t, 3) if t is not None else "",
+                        'df': round(df, 1) if df is not None else "",
+                        'p': round(p, 4) if p is not None else "",
+                        'verdict': verdict})
+    tocsv(out)
+    if regressions:
+        logging.warning("%s regression(s) in %s vs %s", regressions, args.new, args.base)
+        return 2
+    return 0
+
+
+# iotester.py <command> ...; no command runs the job file
+COMMANDS = {
+    'sweep': sweep,
+    'export': export,
+    'tune': tune,
+    'compare': compare,
+}
+
+
 def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
     args = parse_args(argv)
+    if not prepare(args):
+        return 1
     cmds = getjobs(args)
     cmds = normalizecmds(cmds, args)
     output = run_jobs(cmds, args)
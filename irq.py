@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+import argparse
+import logging
+import re
+import sys
+import time
+from array import array
+
+from numa import cpu_nodes, dev_node
+from sampler import clock
+from txg import CLEAR
+
+# Interrupt distribution around each job, what irqmon.sh showed by hand:
+# /proc/interrupts and /proc/softirqs as per-core count matrices, diffed
+# into per-vector, per-core rates.
+
+INTERRUPTS = "/proc/interrupts"
+SOFTIRQS = "/proc/softirqs"
+PROCSTAT = "/proc/stat"
+
+# a core spending this much of its time in hardirq + softirq is hot
+HOT_PCT = 30.0
+
+
+def read_counts(path: str):
+    # header CPU0 CPU1 ... (online cpus only), then
+    # name: one count per cpu [chip hwirq-type vector name]
+    with open(path) as f:
+        cpus = [int(c[3:]) for c in f.readline().split()]
+        rows = {}
+        for line in f:
+            name, _, rest = line.partition(':')
+            parts = rest.split()
+            counts = []
+            for p in parts[:len(cpus)]:
+                if not p.isdigit():
+                    break
+                counts.append(int(p))
+            if not counts:
+                continue
+            # ERR/MIS have a single count
+            counts += [0] * (len(cpus) - len(counts))
+            rows[name.strip()] = (counts, " ".join(parts[len(counts):]))
+    return cpus, rows
+
+
+def read_cpu_irq(path: str = PROCSTAT):
+    # {cpu: (irq + softirq jiffies, total jiffies)}
+    res = {}
+    with open(path) as f:
+        for line in f:
+            if not line.startswith('cpu'):
+                break
+            parts = line.split()
+            if parts[0] == 'cpu':
+                continue
+            v = [int(x) for x in parts[1:9]]
+            res[int(parts[0][3:])] = (v[5] + v[6], sum(v))
+    return res
+
+
+def irq_snapshot():
+    return {'t': clock(), 'irq': read_counts(INTERRUPTS),
+            'soft': read_counts(SOFTIRQS), 'stat': read_cpu_irq()}
+
+
+def vector_rates(before: dict, after: dict, match: str | None = None):
+    # numbered vectors (desc matching match) that fired, as
+    # {"irq:name": array of per-core rates}, plus the online cpus
+    dt = after['t'] - before['t']
+    cpus, rows1 = after['irq']
+    rows0 = before['irq'][1]
+    pattern = re.compile(match) if match else None
+    rates = {}
+    if dt <= 0:
+        return cpus, rates
+    for name, (c1, desc) in rows1.items():
+        if not name.isdigit() or name not in rows0:
+            continue
+        if pattern and not pattern.search(desc):
+            continue
+        d = array('d', ((b - a) / dt for a, b in zip(rows0[name][0], c1)))
+        if any(d):
+            label = desc.split()[-1] if desc else name
+            rates[f"{name}:{label}"] = d
+    return cpus, rates
+
+
+def softirq_rates(before: dict, after: dict):
+    dt = after['t'] - before['t']
+    rows0 = before['soft'][1]
+    return {name: array('d', ((b - a) / dt for a, b in zip(rows0[name][0], c1)))
+            for name, (c1, _) in after['soft'][1].items() if name in rows0 and dt > 0}
+
+
+def core_irq_pct(before: dict, after: dict):
+    # {cpu: % of time in hardirq + softirq}
+    pct = {}
+    for cpu, (irq1, tot1) in after['stat'].items():
+        irq0, tot0 = before['stat'].get(cpu, (irq1, tot1))
+        pct[cpu] = 100.0 * (irq1 - irq0) / (tot1 - tot0) if tot1 > tot0 else 0.0
+    return pct
+
+
+def cross_numa(rates: dict, cpus: list, nodes: dict, dev_nodes: set):
+    # vectors served by cores off the device node(s); node unknown: by
+    # cores on more than one node
+    flagged = []
+    if not nodes:
+        return flagged
+    for vec, d in rates.items():
+        served = {nodes.get(cpus[i], -1) for i, v in enumerate(d) if v}
+        if dev_nodes:
+            if served - dev_nodes:
+                flagged.append(vec)
+        elif len(served) > 1:
+            flagged.append(vec)
+    return flagged
+
+
+def job_irq(before: dict, after: dict, match: str | None = None,
+            devices: list | None = None):
+    # row columns and {'irq': ..., 'softirq': ...} series for the store
+    cpus, rates = vector_rates(before, after, match)
+    soft = softirq_rates(before, after)
+    pct = core_irq_pct(before, after)
+
+    per_core = [sum(col) for col in zip(*rates.values())] if rates else []
+    active = [v for v in per_core if v]
+    hot = sorted(cpu for cpu, p in pct.items() if p >= HOT_PCT)
+    nodes = cpu_nodes()
+    dev_nodes = {n for n in (dev_node(d) for d in devices or []) if n >= 0}
+    flagged = cross_numa(rates, cpus, nodes, dev_nodes)
+    if flagged:
+        logging.warning("IRQ vectors served off the device NUMA node: %s",
+                        ", ".join(flagged))
+
+    row = {
+        'irq_rate': round(sum(active), 1),
+        'irq_cores': len(active),
+        # busiest core over the mean of the cores taking interrupts,
+        # 1.0 is an even spread
+        'irq_imbalance': round(max(active) / (sum(active) / len(active)), 2) if active else 0.0,
+        'irq_hot_cores': ",".join(str(c) for c in hot),
+        'irq_max_core_pct': round(max(pct.values()), 1) if pct else 0.0,
+        'irq_cross_numa': len(flagged),
+        'softirq_block_rate': round(sum(soft.get('BLOCK', ())), 1),
+    }
+    return row, {'irq': rates, 'softirq': soft}
+
+
+# monitor, replaces irqmon.sh
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="per-core interrupt rates")
+    parser.add_argument(
+        "match",
+        nargs="?",
+        default=None,
+        help="regex on the vector description, e.g. 'mpt3sas|nvme' (default: all)",
+    )
+    parser.add_argument(
+        "-t",
+        type=float,
+        default=2.0,
+        help="refresh delay in seconds",
+    )
+    return parser.parse_args(argv)
+
+
+def format_frame(before: dict, after: dict, match: str | None):
+    cpus, rates = vector_rates(before, after, match)
+    pct = core_irq_pct(before, after)
+    nodes = cpu_nodes()
+    lines = [f"{'IRQ':<6}{'vector':<20}{'total/s':>10}  cores (cpu:rate/s)"]
+    for vec, d in sorted(rates.items(), key=lambda kv: -sum(kv[1])):
+        irq, _, name = vec.partition(':')
+        cores = " ".join(f"{cpus[i]}:{v:.0f}" for i, v in enumerate(d) if v)
+        lines.append(f"{irq:<6}{name:<20}{sum(d):>10.0f}  {cores}")
+    lines.append("")
+    lines.append(f"{'cpu':<6}{'node':<6}{'irq/s':>10}{'irq+soft%':>11}")
+    per_core = [sum(col) for col in zip(*rates.values())] if rates else [0.0] * len(cpus)
+    for i, cpu in enumerate(cpus):
+        p = pct.get(cpu, 0.0)
+        if not per_core[i] and p < 1:
+            continue
+        flag = "  HOT" if p >= HOT_PCT else ""
+        lines.append(f"{cpu:<6}{nodes.get(cpu, '-'):<6}{per_core[i]:>10.0f}{p:>11.1f}{flag}")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        prev = irq_snapshot()
+        while True:
+            time.sleep(args.t)
+            cur = irq_snapshot()
+            sys.stdout.write(CLEAR + format_frame(prev, cur, args.match))
+            sys.stdout.flush()
+            prev = cur
+    except KeyboardInterrupt:
+        print("Interrupted by user")
+        return 0
+    except Exception as e:
+        print(f"\nError: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
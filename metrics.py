@@ -0,0 +1,186 @@
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from irq import core_irq_pct, irq_snapshot, softirq_rates, vector_rates
+from sampler import clock
+from stats import mean
+from txg import TXG_COLS
+
+# Live run metrics over local HTTP, Prometheus text format. A scrape
+# reads what the running jobs' samplers and txg watches already hold,
+# nothing polls /proc/diskstats or txgs a second time (replaces watching
+# mon.sh, irqmon.sh and txg.py side by side). IRQ rates are the
+# /proc/interrupts delta since the previous scrape.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# sampler columns -> (metric, labels)
+DEV_GAUGES = {
+    'r/s': ('iotester_device_iops', {'dir': 'read'}),
+    'w/s': ('iotester_device_iops', {'dir': 'write'}),
+    'rkB/s': ('iotester_device_kbytes_per_second', {'dir': 'read'}),
+    'wkB/s': ('iotester_device_kbytes_per_second', {'dir': 'write'}),
+    'r_await': ('iotester_device_await_ms', {'dir': 'read'}),
+    'w_await': ('iotester_device_await_ms', {'dir': 'write'}),
+    'aqu-sz': ('iotester_device_queue_size', {}),
+    '%util': ('iotester_device_util_percent', {}),
+}
+HELP = {
+    'iotester_jobs_planned': "job runs planned for this set",
+    'iotester_jobs_done': "job runs finished",
+    'iotester_jobs_running': "job runs in progress",
+    'iotester_elapsed_seconds': "seconds since the run started",
+    'iotester_eta_seconds': "estimated seconds left, mean job run time x runs left",
+    'iotester_job_elapsed_seconds': "seconds into the running job",
+    'iotester_device_iops': "last sampler interval, ios per second",
+    'iotester_device_kbytes_per_second': "last sampler interval, kB per second",
+    'iotester_device_await_ms': "last sampler interval, mean io wait",
+    'iotester_device_queue_size': "last sampler interval, mean in flight ios",
+    'iotester_device_util_percent': "last sampler interval, busy time",
+    'iotester_cpu_percent': "last sampler interval, host cpu time",
+    'iotester_irq_rate': "interrupts per second since the last scrape, all cores",
+    'iotester_irq_core_percent': "core time in hardirq + softirq since the last scrape",
+    'iotester_softirq_rate': "softirqs per second since the last scrape, all cores",
+    'iotester_txg_synced': "txgs committed since the (first running) job started",
+    'iotester_txg_last_sync_ms': "sync time of the last committed txg",
+    'iotester_txg_last_written_bytes': "bytes written by the last committed txg",
+}
+
+
+def new_live(setname: str, planned: int, match: str | None = None):
+    return {'set': setname, 'planned': planned, 'done': 0, 'job_s': [],
+            't0': clock(), 'running': {}, 'match': match, 'irq_prev': None,
+            'lock': threading.Lock()}
+
+
+def job_started(live: dict, key: str, job: str, sampler: dict, txg_state: dict | None):
+    with live['lock']:
+        live['running'][key] = {'job': job, 'device': ",".join(sampler['names']),
+                                't0': clock(), 'sampler': sampler, 'txg': txg_state}
+
+
+def job_done(live: dict, key: str):
+    with live['lock']:
+        run = live['running'].pop(key, None)
+        live['done'] += 1
+        if run:
+            live['job_s'].append(clock() - run['t0'])
+
+
+def _labels(labels: dict):
+    if not labels:
+        return ""
+    esc = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+           for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, esc)) + "}"
+
+
+def _progress(live: dict, now: float, add):
+    running = live['running']
+    planned = max(live['planned'], live['done'] + len(running))
+    add('iotester_jobs_planned', {}, planned)
+    add('iotester_jobs_done', {}, live['done'])
+    add('iotester_jobs_running', {}, len(running))
+    add('iotester_elapsed_seconds', {}, round(now - live['t0'], 3))
+    if live['job_s']:
+        # parallel/fanout: as many runs at once as are running now
+        left = planned - live['done']
+        add('iotester_eta_seconds', {}, round(mean(live['job_s']) * left / max(1, len(running)), 1))
+    for run in running.values():
+        add('iotester_job_elapsed_seconds', {'job': run['job'], 'device': run['device']},
+            round(now - run['t0'], 3))
+
+
+def _samplers(live: dict, add):
+    cpu_done = txg_done = False
+    for run in live['running'].values():
+        s = run['sampler']
+        i = s['count'] - 1
+        if i < 0:
+            continue
+        for name, cols in s['dev'].items():
+            for col, (metric, labels) in DEV_GAUGES.items():
+                add(metric, {'device': name, 'job': run['job'], **labels}, round(cols[col][i], 3))
+        # cpu and txgs are host wide, the same in every running job
+        if not cpu_done:
+            cpu_done = True
+            for col, vals in s['cpu'].items():
+                add('iotester_cpu_percent', {'mode': col.lstrip('%')}, round(vals[i], 2))
+        txg = run['txg']
+        if not txg or txg_done:
+            continue
+        txg_done = True
+        for pool, rows in txg['rows'].items():
+            add('iotester_txg_synced', {'pool': pool}, len(rows))
+            if rows:
+                last = dict(zip(TXG_COLS, rows[-1]))
+                add('iotester_txg_last_sync_ms', {'pool': pool}, round(last['stime'] / 1e6, 3))
+                add('iotester_txg_last_written_bytes', {'pool': pool}, last['nwritten'])
+
+
+def _irqs(live: dict, add):
+    try:
+        snap = irq_snapshot()
+    except OSError:
+        return
+    prev, live['irq_prev'] = live['irq_prev'], snap
+    if not prev:
+        return
+    _, rates = vector_rates(prev, snap, live['match'])
+    for vec, d in rates.items():
+        add('iotester_irq_rate', {'vector': vec}, round(sum(d), 1))
+    for name, d in softirq_rates(prev, snap).items():
+        add('iotester_softirq_rate', {'type': name}, round(sum(d), 1))
+    for cpu, pct in core_irq_pct(prev, snap).items():
+        add('iotester_irq_core_percent', {'cpu': cpu}, round(pct, 2))
+
+
+def render(live: dict):
+    # exposition text, samples of one metric grouped under its HELP/TYPE
+    samples = {}
+
+    def add(metric, labels, value):
+        samples.setdefault(metric, []).append(({'set': live['set'], **labels}, value))
+
+    with live['lock']:
+        _progress(live, clock(), add)
+        _samplers(live, add)
+        _irqs(live, add)
+    out = []
+    for metric, rows in samples.items():
+        out.append(f"# HELP {metric} {HELP[metric]}")
+        out.append(f"# TYPE {metric} gauge")
+        out.extend(f"{metric}{_labels(labels)} {value}" for labels, value in rows)
+    return "\n".join(out) + "\n"
+
+
+def _handler(live: dict):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = render(live).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            logging.debug("metrics: " + fmt, *args)
+    return Handler
+
+
+def start_metrics(live: dict, addr: str = "127.0.0.1", port: int = 9464):
+    # daemon thread, scrapes never hold up the run
+    server = ThreadingHTTPServer((addr, port), _handler(live))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info("Metrics on http://%s:%s/metrics", addr, server.server_address[1])
+    return server
+
+
+def stop_metrics(server):
+    server.shutdown()
+    server.server_close()
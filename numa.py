@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+
+import argparse
+import glob
+import logging
+import os
+import re
+import sys
+
+from sampler import dev_name
+
+# Topology and placement: which cores are local to the device under
+# test, fio --cpus_allowed and an IRQ affinity plan with rollback, what
+# irqpin.sh did with a hardcoded START_CORE.
+
+NODES = "/sys/devices/system/node"
+INTERRUPTS = "/proc/interrupts"
+IRQ_AFFINITY = "/proc/irq/{}/smp_affinity_list"
+
+
+def parse_cpulist(val: str):
+    # 0-3,8,10-11
+    cpus = []
+    for part in val.strip().split(','):
+        if not part:
+            continue
+        a, _, b = part.partition('-')
+        cpus.extend(range(int(a), int(b or a) + 1))
+    return cpus
+
+
+def format_cpulist(cpus):
+    # [0, 1, 2, 3, 8] -> 0-3,8
+    out = []
+    for cpu in sorted(cpus):
+        if out and cpu == out[-1][1] + 1:
+            out[-1][1] = cpu
+        else:
+            out.append([cpu, cpu])
+    return ",".join(f"{a}-{b}" if a != b else f"{a}" for a, b in out)
+
+
+def topology(root: str = NODES):
+    # {node: [cpus]}, memory-only nodes left out, empty without NUMA sysfs
+    topo = {}
+    for path in glob.glob(os.path.join(root, "node[0-9]*", "cpulist")):
+        node = int(os.path.basename(os.path.dirname(path))[4:])
+        with open(path) as f:
+            cpus = parse_cpulist(f.read())
+        if cpus:
+            topo[node] = cpus
+    return dict(sorted(topo.items()))
+
+
+def cpu_nodes(root: str = NODES):
+    # {cpu: node}
+    return {cpu: node for node, cpus in topology(root).items() for cpu in cpus}
+
+
+def dev_node(name: str):
+    # numa_node of the controller behind a block device, -1 if unknown
+    path = os.path.realpath(f"/sys/class/block/{dev_name(name)}")
+    if os.path.exists(os.path.join(path, "partition")):
+        path = os.path.dirname(path)
+    # sd*: device/ is the scsi device, nvme*n*: device/ is the controller
+    for rel in ("device/numa_node", "device/device/numa_node"):
+        try:
+            with open(os.path.join(path, rel)) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            continue
+    return -1
+
+
+def placement(devices: list, where: str, topo: dict | None = None):
+    # cores for fio: local = the device node(s), remote = the first other
+    # node. {} when there is nothing to pin (off, unknown node, one node)
+    if where == 'off':
+        return {}
+    topo = topology() if topo is None else topo
+    nodes = sorted({n for n in (dev_node(d) for d in devices) if n in topo})
+    if not nodes:
+        logging.warning("NUMA node of %s unknown, fio not pinned", ",".join(devices))
+        return {}
+    if where == 'local':
+        cpus = [c for n in nodes for c in topo[n]]
+    else:
+        others = [n for n in topo if n not in nodes]
+        if not others:
+            logging.warning("No remote NUMA node for %s, fio not pinned", ",".join(devices))
+            return {}
+        cpus = topo[others[0]]
+    return {'numa_placement': where,
+            'numa_dev_node': ",".join(str(n) for n in nodes),
+            'numa_cpus': format_cpulist(cpus)}
+
+
+def pin_harness(cpus: list):
+    # calling thread only, threads started after this inherit it
+    try:
+        os.sched_setaffinity(0, cpus)
+    except OSError as e:
+        logging.warning("Harness not pinned to %s: %s", format_cpulist(cpus), e)
+
+
+def irq_plan(match: str, cpus: list, path: str = INTERRUPTS):
+    # matched vectors round robin over cpus: {irq: cpu}
+    pattern = re.compile(match)
+    irqs = []
+    with open(path) as f:
+        next(f)
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name.strip().isdigit() and pattern.search(rest):
+                irqs.append(name.strip())
+    return {irq: cpus[i % len(cpus)] for i, irq in enumerate(irqs)}
+
+
+def apply_irq_plan(plan: dict):
+    # returns the original affinities for restore_irqs, nothing is left
+    # half applied on failure
+    saved = {}
+    try:
+        for irq, cpu in plan.items():
+            path = IRQ_AFFINITY.format(irq)
+            with open(path) as f:
+                old = f.read().strip()
+            with open(path, 'w') as f:
+                f.write(f"{cpu}\n")
+            saved[irq] = old
+    except OSError as e:
+        logging.warning("IRQ affinity plan not applied: %s", e)
+        restore_irqs(saved)
+        return {}
+    logging.info("IRQ affinity: %s", " ".join(f"{i}->{c}" for i, c in plan.items()))
+    return saved
+
+
+def restore_irqs(saved: dict):
+    for irq, old in saved.items():
+        try:
+            with open(IRQ_AFFINITY.format(irq), 'w') as f:
+                f.write(f"{old}\n")
+        except OSError as e:
+            logging.warning("IRQ %s affinity not restored to %s: %s", irq, old, e)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="NUMA topology and IRQ affinity plan")
+    parser.add_argument(
+        "-d",
+        "--devices",
+        action="append",
+        default=[],
+        help="device to place, repeat for more: -d /dev/sdb -d /dev/sdc",
+    )
+    parser.add_argument(
+        "match",
+        nargs="?",
+        default=None,
+        help="regex on /proc/interrupts vector names to plan, e.g. 'mpt3sas'",
+    )
+    parser.add_argument(
+        "--apply",
+        action="store_true",
+        help="write the plan (kept, no rollback)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    topo = topology()
+    for node, cpus in topo.items():
+        print(f"node{node}: {format_cpulist(cpus)}")
+    for dev in args.devices:
+        print(f"{dev}: node {dev_node(dev)}")
+    if args.match:
+        local = placement(args.devices, 'local', topo)
+        if not local:
+            print("No local node to plan for", file=sys.stderr)
+            return 1
+        plan = irq_plan(args.match, parse_cpulist(local['numa_cpus']))
+        for irq, cpu in plan.items():
+            print(f"IRQ {irq} -> {cpu}")
+        if args.apply and not apply_irq_plan(plan):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
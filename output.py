@@ -1,56 +1,202 @@
 import sys
-import re
 import json
 import csv
 
-def format_job(out_fio, out_iostat, averages, cmd):
+from hist import PCTS, UNIT_NS, from_bins, from_fio, merge, pct_key, percentile
+
+# fio json sections format_job never reads, dropped right after decoding
+FIO_SKIP = frozenset(('iodepth_level', 'iodepth_submit', 'iodepth_complete',
+                      'latency_ns', 'latency_us', 'latency_ms', 'bins'))
+# same, but the json+ histogram bins are kept for hist.py
+HIST_SKIP = FIO_SKIP - {'bins'}
+# the C decoder, an object hook would run Python code for every object
+_decoder = json.JSONDecoder()
+
+
+def _prune(fio_json: dict, skip: frozenset):
+    # job level sections, bins sit in the direction blocks' lat stats
+    for job in fio_json.get('jobs', []) + fio_json.get('client_stats', []):
+        for k in skip.intersection(job):
+            del job[k]
+        if 'bins' not in skip:
+            continue
+        for d in ('read', 'write', 'trim', 'sync'):
+            for stat in (job.get(d) or {}).values():
+                if isinstance(stat, dict):
+                    stat.pop('bins', None)
+
+
+def split_fio_output(out_fio: str, skip: frozenset = FIO_SKIP):
+    # fio json starts at the first line beginning with '{', raw_decode
+    # walks it once and tells us where it ends, no regex backtracking
+    if out_fio.startswith('{'):
+        start = 0
+    else:
+        start = out_fio.find('\n{') + 1
+        if not start:
+            raise ValueError("no fio json found in output")
+    fio_json, end = _decoder.raw_decode(out_fio, start)
+    if skip:
+        _prune(fio_json, skip)
+    # normal output after the json, from the last 'set' as before
+    tail = out_fio[end:]
+    idx = tail.rfind('set')
+    fio_log = tail[idx + 3:] if idx >= 0 else tail
+    return fio_json, fio_log.strip()
+
+
+def _unit(block: dict, kind: str):
+    return next((k for k in ('ns', 'ms') if f"{kind}_{k}" in block), 'us')
+
+
+def _pct(stat: dict, p: float, unit: str):
+    # fio percentile list, in the block unit; rebuilt from the histogram
+    # when p is not in --percentile_list
+    pcts = stat.get('percentile') or {}
+    key = f"{p:.6f}"
+    if key in pcts:
+        return float(pcts[key])
+    hist = from_fio(stat, unit, stat.get('N', 0))
+    return percentile(hist, p) / UNIT_NS[unit]
+
+
+DIRS = ('read', 'write', 'trim')
+
+
+def fio_hists(fio_json: dict):
+    # {'clat_read': hist, ...} merged over every job of the output
+    hists = {}
+    for job in fio_json['jobs']:
+        for ddir in DIRS:
+            block = job.get(ddir)
+            if not block or not block.get('total_ios'):
+                continue
+            for kind in ('clat', 'slat', 'lat'):
+                unit = _unit(block, kind)
+                stat = block.get(f"{kind}_{unit}")
+                if not stat:
+                    continue
+                hist = from_fio(stat, unit, stat.get('N', block['total_ios']))
+                if hist:
+                    key = f"{kind}_{ddir}"
+                    hists[key] = merge(hists.get(key, {}), hist)
+    return hists
+
+
+def active_dirs(jobs: list):
+    # directions that did any io in any job, read when fio did nothing
+    dirs = [d for d in DIRS
+            if any(j.get(d, {}).get('total_ios') or j.get(d, {}).get('bw') for j in jobs)]
+    return dirs or ['read']
+
+
+def clat_hist(blocks: list):
+    # merged clat histogram of direction blocks: json+ bins are summed
+    # by bucket value first so each distinct value is bucketed once
+    unit = _unit(blocks[0], 'clat')
+    bins, hists = {}, []
+    for b in blocks:
+        stat = b.get(f"clat_{unit}") or {}
+        if stat.get('bins'):
+            for val, count in stat['bins'].items():
+                bins[val] = bins.get(val, 0) + count
+        else:
+            hists.append(from_fio(stat, unit, stat.get('N', b.get('total_ios', 0))))
+    return merge(from_bins(bins, unit), *hists)
+
+
+def dir_stats(blocks: list, hist: dict | None = None):
+    # direction blocks of any number of jobs (and directions) as one:
+    # summed iops/bw, io weighted means, percentiles from the merged
+    # clat histogram (fio's own list when there is a single block)
+    ios = [b.get('total_ios', 0) for b in blocks]
+    n = sum(ios) or 1
+    res = {'iops': round(sum(float(b['iops']) for b in blocks), 2),
+           'BW_MBs': round(sum(float(b['bw']) for b in blocks) / 1024, 2)}
+    lat = {}
+    for kind in ('clat', 'slat', 'lat'):
+        unit = _unit(blocks[0], kind)
+        stats = [b.get(f"{kind}_{unit}") or {} for b in blocks]
+        lat[kind] = tous(sum(s.get('mean', 0) * w for s, w in zip(stats, ios)) / n, unit)
+        if kind == 'clat':
+            cu, clats = unit, stats
+    res['clat_avg_us'] = lat['clat']
+    if len(clats) == 1:
+        pcts = {p: _pct(clats[0], p, cu) for p in PCTS}
+    else:
+        hist = clat_hist(blocks) if hist is None else hist
+        pcts = {p: percentile(hist, p) / UNIT_NS[cu] for p in PCTS}
+    # clat_p99_us, clat_p99_9_us, clat_p99_99_us
+    for p in PCTS:
+        res[pct_key('clat', p)] = tous(pcts[p], cu)
+    p99 = res['clat_p99_us']
+    res['clat_ratio'] = round(p99 / res['clat_avg_us'], 2) if res['clat_avg_us'] else 0.0
+    res['slat_avg_us'] = lat['slat']
+    res['lat_avg_us'] = lat['lat']
+    res['iops_mslat'] = round(res['iops'] / (p99 / 1000), 2) if p99 else 0.0
+    return res
+
+
+def job_stats(jobs: list):
+    # all jobs and directions together, mixed workloads also get
+    # read_*/write_* columns per direction
+    dirs = active_dirs(jobs)
+    if len(dirs) == 1:
+        return dir_stats([j[dirs[0]] for j in jobs])
+    # each direction histogram is built once, the total merges them
+    blocks = {d: [j[d] for j in jobs] for d in dirs}
+    hists = {d: clat_hist(b) for d, b in blocks.items()}
+    res = dir_stats([b for d in dirs for b in blocks[d]], merge(*hists.values()))
+    for d in dirs:
+        res.update({f"{d}_{k}": v for k, v in dir_stats(blocks[d], hists[d]).items()})
+    return res
+
+
+def job_cpu(jobs: list, key: str):
+    # fio's % of one core per job, weighted by each job's runtime: the
+    # total cpu time over the total runtime, what group_reporting prints
+    rts = [j.get('job_runtime', 0) for j in jobs]
+    total = sum(rts)
+    if not total:
+        return round(sum(j.get(key, 0) for j in jobs) / len(jobs), 2)
+    return round(sum(j.get(key, 0) * rt for j, rt in zip(jobs, rts)) / total, 2)
+
+
+def thread_rows(fio_json: dict):
+    # one row per fio job (numjobs without group_reporting, several
+    # sections), empty when the output holds a single job
+    jobs = fio_json['jobs']
+    if len(jobs) < 2:
+        return []
+    return [{'thread': i, 'fio_jobname': j['jobname'],
+             'fio_sys_cpu': round(j['sys_cpu'], 2), 'fio_usr_cpu': round(j['usr_cpu'], 2),
+             **job_stats([j])} for i, j in enumerate(jobs)]
+
+
+def format_job(fio_json, fio_log, averages, cmd):
+    # fio_json, fio_log: split_fio_output()
     # header
     output = {}
     # body
-    # grab the json from fio
-    m = re.search(r"({.*}).*set", out_fio, re.DOTALL)
-    # m = re.search(r"(\{.*\})", out_fio, re.DOTALL)
-    fio_json = json.loads(m.group(1).strip())
-    fio_json = fio_json['jobs'][0]
-    # get our vals
-    m = re.search(r".*set(.*)", out_fio, re.DOTALL)
-    fio_log = m.group(1).strip()
+    jobs = fio_json['jobs']
+    first = jobs[0]
+    opts = {**fio_json.get('global options', {}), **first.get('job options', {})}
 
     if isinstance(cmd, list):
         cmd = " ".join(cmd)
 
     fio_cmd = f"{cmd}\n"
 
-    # determine if read or write or both
-    if int(fio_json['read']['bw']) != 0 and int(fio_json['write']['bw']) == 0:
-        tt = ['read']
-    elif int(fio_json['read']['bw']) == 0 and int(fio_json['write']['bw']) != 0:
-        tt = ['write']
-    else:
-        tt = ['read', 'write']
-        # R and W test
     # globals
-    output['jobname'] = fio_json['jobname']
-    output['bs'] = fio_json['job options']['bs']
-    output['qd'] = fio_json['job options']['iodepth']
-    output['fio_sys_cpu'] = round(fio_json['sys_cpu'], 2)
-    output['fio_usr_cpu'] = round(fio_json['usr_cpu'], 2)
-
-    # find units
-    # Note: separated READ from WRITE but not R and W
-    # for bidir tests, Im only testing read latency
-    su = next((k for k in ('ns','ms') if f"slat_{k}" in fio_json[tt[0]]), 'us')
-    cu = next((k for k in ('ns','ms') if f"clat_{k}" in fio_json[tt[0]]), 'us')
-    lu = next((k for k in ('ns','ms') if f"lat_{k}" in fio_json[tt[0]]), 'us')
-    # test type dependent
-    output['iops'] = round(float(fio_json[tt[0]]['iops']), 2)
-    output['BW_MBs'] = round(float(fio_json[tt[0]]['bw'])/1024, 2)
-    output["clat_avg_us"] = tous(float(fio_json[tt[0]][f"clat_{cu}"]['mean']), cu)
-    output["clat_p99_us"] = tous(float(fio_json[tt[0]][f"clat_ns"]['percentile']['99.000000']), cu)
-    output["clat_ratio"] = round(output[f"clat_p99_us"]/output[f"clat_avg_us"],2)
-    output["slat_avg_us"] = tous(float(fio_json[tt[0]][f"slat_{su}"]['mean']), su)
-    output["lat_avg_us"] = tous(float(fio_json[tt[0]][f"lat_{lu}"]['mean']), lu)
-    output["iops_mslat"] = round(output['iops'] / (output["clat_p99_us"]/1000), 2)
+    output['jobname'] = first['jobname']
+    output['bs'] = opts.get('bs', '4k')
+    output['qd'] = opts.get('iodepth', '1')
+    output['fio_jobs'] = len(jobs)
+    output['fio_sys_cpu'] = job_cpu(jobs, 'sys_cpu')
+    output['fio_usr_cpu'] = job_cpu(jobs, 'usr_cpu')
+
+    # every job, every direction
+    output.update(job_stats(jobs))
 
     if averages:
         output['iostat_user'] = averages['iostat_user']
@@ -86,18 +232,14 @@ def to_sheet(output: list):
     # return output
 
 def tocsv(output: list):
-    # dynamic headers
-    headers = []
-    for k, v in output[0].items():
-        headers.append(k.strip())
+    # dynamic headers, union of all rows (mixed or per-thread rows add
+    # columns) in first seen order
+    headers = list(dict.fromkeys(k for result in output for k in result))
     print("========== CUT =========")
     writer = csv.writer(sys.stdout, lineterminator="\n")
     writer.writerow(headers)
 
     for result in output:
-        row = []
-        for k, v in result.items():
-            row.append(str(v))
-        # print(",".join(row))
+        row = [str(result.get(k, "")) for k in headers]
         writer.writerow(row)
     print("========== CUT =========")
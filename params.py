@@ -3,6 +3,11 @@ import re
 import os
 import stat
 
+DEFAULT_LOGDIR = "logs"
+# result store file, under --logdir unless --db says otherwise
+DB_NAME = "results.db"
+# fio --server default port
+FIO_PORT = 8765
 
 def is_block_device(path: str) -> bool:
     try:
@@ -46,22 +51,279 @@ def _parse_runtime(val: str):
         raise argparse.ArgumentTypeError("runtime must be >= 10")
     return v
 
+
+def _parse_interval(val: str):
+    try:
+        v = float(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError("interval must be a number of seconds")
+    if v < 0.1:
+        raise argparse.ArgumentTypeError("interval must be >= 0.1")
+    return v
+
+def _parse_hosts(val: str):
+    # host[:port],host[:port]
+    hosts = []
+    for part in _parse_list(val):
+        host, _, port = part.rpartition(":") if ":" in part else (part, "", "")
+        if port and not port.isdigit():
+            raise argparse.ArgumentTypeError(f"invalid port in {part!r}")
+        hosts.append((host, int(port) if port else FIO_PORT))
+    return hosts
+
+
+def _parse_list(val: str):
+    parts = [p.strip() for p in val.split(",") if p.strip()]
+    if not parts:
+        raise argparse.ArgumentTypeError("empty list")
+    return parts
+
+
+def _parse_bs_list(val: str):
+    parts = _parse_list(val)
+    bad = [p for p in parts if not re.fullmatch(r"\d+[KkMm]?", p)]
+    if bad:
+        raise argparse.ArgumentTypeError(f"invalid block sizes: {', '.join(bad)}")
+    return parts
+
+def _parse_sector_size(val: str):
+    # 4k multiples, every 4k sector gets stamped
+    m = re.fullmatch(r"(\d+)([KkMm])?", val)
+    if not m:
+        raise argparse.ArgumentTypeError("size must look like 4k, 1M")
+    n = int(m.group(1)) * {'': 1, 'k': 1 << 10, 'm': 1 << 20}[(m.group(2) or '').lower()]
+    if not n or n % 4096:
+        raise argparse.ArgumentTypeError("size must be a multiple of 4k")
+    return val
+
 # basic functions
 # TODO add jobfile exists tests
 def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="iotester CLI wrapper")
     parser.add_argument(
-        "-n",
-        "--setname",
+        "-j",
+        "--jobfile",
         required=True,
-        help="unique set name",
+        help="file containing fio commands",
+    )
+    _add_run_args(parser)
+    args = parser.parse_args(argv)
+    _check_run_args(parser, args)
+    return args
+
+
+def parse_sweep_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="iotester.py sweep",
+        description="adaptive iodepth sweep, finds the knee per block size")
+    parser.add_argument(
+        "--rw",
+        dest="sweep_rw",
+        metavar="RW",
+        default="randread",
+        help="fio rw pattern for every point"
+    )
+    parser.add_argument(
+        "--bs",
+        dest="sweep_bs",
+        metavar="BS",
+        type=_parse_bs_list,
+        default=["4k", "16k", "64k", "1M"],
+        help="block sizes to sweep --bs=4k,16k"
     )
+    parser.add_argument(
+        "--qd-max",
+        type=int,
+        default=256,
+        help="highest iodepth tried"
+    )
+    parser.add_argument(
+        "--gain",
+        type=float,
+        default=0.05,
+        help="stop doubling iodepth when iops improve less than this (0.05 = 5%%)"
+    )
+    parser.add_argument(
+        "--lat-budget",
+        type=float,
+        default=None,
+        help="stop doubling iodepth when clat_p99_us exceeds this"
+    )
+    parser.add_argument(
+        "--fio-opts",
+        default="--ioengine=libaio --direct=1 --time_based --group_reporting",
+        help="extra fio options for every point, --fio-opts=\"--direct=1 ...\""
+    )
+    _add_run_args(parser)
+    args = parser.parse_args(argv)
+    _check_run_args(parser, args)
+    return args
+
+
+def _parse_grid(val: str):
+    # name=v1,v2,v3
+    name, sep, vals = val.partition("=")
+    if not sep or not re.fullmatch(r"[a-z0-9_]+", name):
+        raise argparse.ArgumentTypeError("grid must look like zfs_txg_timeout=5,10")
+    return name, _parse_list(vals)
+
+
+def parse_tune_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="iotester.py tune",
+        description="sweep ZFS tunables over a job subset and rank them")
     parser.add_argument(
         "-j",
         "--jobfile",
         required=True,
         help="file containing fio commands",
     )
+    parser.add_argument(
+        "--only",
+        type=_parse_list,
+        default=None,
+        help="job names from the job file to run per config --only=max_iops,min_lat"
+    )
+    parser.add_argument(
+        "-g",
+        "--grid",
+        type=_parse_grid,
+        action="append",
+        required=True,
+        help="tunable and values, repeatable -g zfs_txg_timeout=5,10 -g zfs_dirty_data_max=1G,4G"
+    )
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=None,
+        help="random subset of the grid instead of every combination"
+    )
+    parser.add_argument(
+        "--metric",
+        default="iops_mslat",
+        help="result column to rank by (mean over the job subset)"
+    )
+    parser.add_argument(
+        "--p99-max",
+        type=float,
+        default=None,
+        help="configs with any job over this clat_p99_us rank last"
+    )
+    _add_run_args(parser)
+    args = parser.parse_args(argv)
+    _check_run_args(parser, args)
+    args.grid = dict(args.grid)
+    return args
+
+
+def parse_export_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="iotester.py export",
+        description="print stored results as the run CSV")
+    parser.add_argument("-n", "--setname", help="only this set")
+    parser.add_argument("--jobname", help="only this job name")
+    parser.add_argument("--bs", help="only this block size")
+    parser.add_argument("--qd", help="only this iodepth")
+    parser.add_argument(
+        "--threads",
+        action="store_true",
+        help="also print the per fio job rows of multi-job outputs"
+    )
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="one row per job name, percentiles from the merged latency histograms"
+    )
+    parser.add_argument(
+        "-l",
+        "--logdir",
+        default=DEFAULT_LOGDIR,
+        help="directory of the runs, where the result store is by default"
+    )
+    parser.add_argument(
+        "--db",
+        default=None,
+        help=f"result store (sqlite, default: <logdir>/{DB_NAME})"
+    )
+    return _default_db(parser.parse_args(argv))
+
+
+def parse_compare_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="iotester.py compare",
+        description="diff two stored sets job by job, Welch t-test per metric")
+    parser.add_argument("base", help="reference set name")
+    parser.add_argument("new", help="set name compared against it")
+    parser.add_argument(
+        "--metrics",
+        type=_parse_list,
+        default=["iops", "clat_p99_us"],
+        help="result columns compared --metrics=iops,clat_p99_us (latencies: lower is better)"
+    )
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=0.05,
+        help="significance level of the t-test"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.05,
+        help="smallest change flagged, relative to the base mean (0.05 = 5%%)"
+    )
+    parser.add_argument(
+        "-l",
+        "--logdir",
+        default=DEFAULT_LOGDIR,
+        help="directory of the runs, where the result store is by default"
+    )
+    parser.add_argument(
+        "--db",
+        default=None,
+        help=f"result store (sqlite, default: <logdir>/{DB_NAME})"
+    )
+    return _default_db(parser.parse_args(argv))
+
+
+def _default_db(args):
+    # the store lives with the rest of the harness writes
+    if args.db is None:
+        args.db = os.path.join(args.logdir, DB_NAME)
+    return args
+
+
+def _check_run_args(parser, args):
+    _default_db(args)
+    remote = args.hosts or args.local_servers
+    if not args.devices and not remote:
+        parser.error("-d/--devices is required")
+    if remote and args.raw:
+        parser.error("--hosts runs on -f, give the device path there instead of --raw")
+    if args.mode != "serial" and not args.raw:
+        parser.error(f"--mode={args.mode} needs --raw (one target per device)")
+    if args.irq_pin and not args.irq_match:
+        parser.error("--irq-pin needs --irq-match (the vectors to move)")
+    if args.precondition and remote:
+        parser.error("--precondition lays out local targets, not --hosts ones")
+    if args.precond_writers < 1 or args.precond_steady < 0:
+        parser.error("--precond-writers must be >= 1, --precond-steady >= 0")
+    if args.metrics_port and remote:
+        parser.error("--metrics-port serves local runs, not --hosts ones")
+    if args.repeat_max < 1 or args.repeat_min < 1:
+        parser.error("--repeat-min/--repeat-max must be >= 1")
+    if args.repeat_max > 1 and (remote or args.mode == "fanout"):
+        parser.error("--repeat-max runs in serial and parallel modes only")
+
+
+def _add_run_args(parser):
+    # options shared by every command that runs fio
+    parser.add_argument(
+        "-n",
+        "--setname",
+        required=True,
+        help="unique set name",
+    )
     parser.add_argument(
         "-f",
         "--filename",
@@ -85,9 +347,9 @@ def parse_args(argv=None):
     parser.add_argument(
         "-d",
         "--devices",
-        required=True,
+        default=None,
         type=_parse_devices,
-        help="block device(s) to monitor -d=sda,sdb"
+        help="block device(s) to monitor -d=sda,sdb (required unless --hosts)"
     )
     parser.add_argument(
         "-r",
@@ -95,4 +357,181 @@ def parse_args(argv=None):
         action="store_true",
         help="test directly on /dev/sdX"
     )
-    return parser.parse_args(argv)
+    parser.add_argument(
+        "-i",
+        "--interval",
+        type=_parse_interval,
+        default=1.0,
+        help="device/cpu sampling interval in seconds (>= 0.1)"
+    )
+    parser.add_argument(
+        "-m",
+        "--mode",
+        choices=("serial", "parallel", "fanout"),
+        default="serial",
+        help="serial: one job at a time, parallel: one job queue per device, "
+             "fanout: each job on every device at once"
+    )
+    parser.add_argument(
+        "--settle-max",
+        type=float,
+        default=10.0,
+        help="max seconds to wait for devices/dirty data to drain between jobs"
+    )
+    parser.add_argument(
+        "--settle-dirty",
+        type=int,
+        default=4096,
+        help="Dirty+Writeback kB under which the page cache counts as drained"
+    )
+    parser.add_argument(
+        "--steady",
+        action="store_true",
+        help="stop each job early once sampled iops/bw reach steady state"
+    )
+    parser.add_argument(
+        "--ss-window",
+        type=float,
+        default=10.0,
+        help="steady state sliding window in seconds"
+    )
+    parser.add_argument(
+        "--ss-cv",
+        type=float,
+        default=0.03,
+        help="steady state coefficient of variation target (0.03 = 3%%)"
+    )
+    parser.add_argument(
+        "--ss-metric",
+        choices=("iops", "bw"),
+        default="iops",
+        help="sampled metric watched for steady state"
+    )
+    parser.add_argument(
+        "--precondition",
+        action="store_true",
+        help="fill the test file / raw devices before measuring (resumes a partial fill, verified)"
+    )
+    parser.add_argument(
+        "--precond-writers",
+        type=int,
+        default=4,
+        help="parallel O_DIRECT writers, one region of the target each"
+    )
+    parser.add_argument(
+        "--precond-bs",
+        type=_parse_sector_size,
+        default="4M",
+        help="write size (and buffer) of each preconditioning writer"
+    )
+    parser.add_argument(
+        "--precond-steady",
+        type=int,
+        default=0,
+        help="after the fill, up to this many random write rounds until write iops reach steady state (SSD)"
+    )
+    parser.add_argument(
+        "--precond-round",
+        type=float,
+        default=60.0,
+        help="seconds per steady state round"
+    )
+    parser.add_argument(
+        "--precond-ss-bs",
+        type=_parse_sector_size,
+        default="4k",
+        help="block size of the steady state random writes"
+    )
+    parser.add_argument(
+        "--repeat-max",
+        type=int,
+        default=1,
+        help="rerun each job up to this many times until --ci-metrics are tight enough"
+    )
+    parser.add_argument(
+        "--repeat-min",
+        type=int,
+        default=3,
+        help="runs of each job before the confidence interval is looked at"
+    )
+    parser.add_argument(
+        "--ci-target",
+        type=float,
+        default=0.05,
+        help="stop repeating once the CI half width is under this fraction of the mean (0.05 = 5%%)"
+    )
+    parser.add_argument(
+        "--ci-level",
+        type=float,
+        default=0.95,
+        help="confidence level of the repeat CI"
+    )
+    parser.add_argument(
+        "--ci-metrics",
+        type=_parse_list,
+        default=["iops", "clat_p99_us"],
+        help="result columns the repeat CI is checked on"
+    )
+    parser.add_argument(
+        "-l",
+        "--logdir",
+        default=DEFAULT_LOGDIR,
+        help="harness logs and temp fio logs, keep it off the devices under test"
+    )
+    parser.add_argument(
+        "-p",
+        "--pools",
+        type=_parse_list,
+        default=None,
+        help="ZFS pools whose txgs are recorded per job -p=tank (default: all)"
+    )
+    parser.add_argument(
+        "--sysfs-root",
+        default="/sys/module/zfs/parameters",
+        help="ZFS tunables directory, snapshotted per job (and written by tune)"
+    )
+    parser.add_argument(
+        "--irq-match",
+        default=None,
+        help="regex on /proc/interrupts vector names counted per job, e.g. 'mpt3sas|nvme' (default: all)"
+    )
+    parser.add_argument(
+        "--numa",
+        choices=["off", "local", "remote", "ab"],
+        default="off",
+        help="pin fio to the device NUMA node, to a remote node, or run every job on both (ab)"
+    )
+    parser.add_argument(
+        "--irq-pin",
+        action="store_true",
+        help="spread the --irq-match vectors over the device node cores for the run, restored after"
+    )
+    parser.add_argument(
+        "--hosts",
+        type=_parse_hosts,
+        default=None,
+        help="run every job on these fio --server hosts at once --hosts=node1,node2:8766"
+    )
+    parser.add_argument(
+        "--local-servers",
+        type=int,
+        default=0,
+        help="start this many fio --server on localhost ports from 8765 and use them as hosts"
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=0,
+        help="serve live progress, device, cpu, irq and txg metrics (Prometheus text) on this port"
+    )
+    parser.add_argument(
+        "--metrics-addr",
+        default="127.0.0.1",
+        help="address the metrics endpoint listens on"
+    )
+    parser.add_argument(
+        "--db",
+        default=None,
+        help=f"result store (sqlite, default: <logdir>/{DB_NAME}), each job is "
+             "committed when it ends, '' to disable"
+    )
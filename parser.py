@@ -1,57 +1,31 @@
-import sys
-from runner import run_cmd
+# iostat -c -d -x text parser, kept for archived tester.sh / iotester logs.
+# Live runs use sampler.py instead of forking iostat.
 
-def run_jobs(cmd: list[str], argv: object):
+CPU_METRICS = ('%user', '%system', '%iowait', '%idle')
+DEV_METRICS = ('r/s', 'rkB/s', 'r_await', 'w/s', 'wkB/s', 'w_await',
+               'aqu-sz', '%util')
 
-    # background iostat monitoring
-    iostat_devs = " ".join(argv.devices)
 
-    iostat_cmd = f"iostat -c -d -x -y 1 {argv.runtime} {iostat_devs}"
-    rc, out, err = run_cmd(iostat_cmd, timeout=argv.runtime)
-
-    # parse iostat
-    cpu_metrics = {'%user': [], '%system': [], '%iowait': [], '%idle': []}
-
-    dev_metrics = {'r/s': [], 'rkB/s': [], 'r_await': [], 'w/s': [], 'wkB/s':
-                   [], 'w_await': [], 'aqu-sz': [], '%util': []}
-
-    lines = out.decode().splitlines()
+def parse_iostat(out: str):
+    cpu_metrics = {k: [] for k in CPU_METRICS}
+    dev_metrics = {k: [] for k in DEV_METRICS}
 
+    lines = out.splitlines()
     for idx, line in enumerate(lines):
         if line.startswith('avg-cpu'):
-            # parse header
-            header_parts = [p.strip() for p in line.split() if p.strip()]
-            # get values at next line
-            try:
-                val_line = lines[idx + 1]
-                val_parts = [v.strip().replace(',', '.') for v in val_line.split()]
-            # map values to headers
-                for col_idx, col in enumerate(header_parts):
-                    if col in cpu_metrics:
-                        val = float(val_parts[col_idx -1])
-                        cpu_metrics[col].append(val)
-                        #print(f"Matched {col} (index {col_idx}) to value {val}")
-            except (IndexError, ValueError) as e:
-                print(f"Error parsing at line {idx}: {e}")
-                continue
-        if line.startswith('Device'):
-            # parse header
-            header_parts = [p.strip() for p in line.split() if p.strip()]
-            # print(header_parts)
-            # get values at next line
-            try:
-                val_line = lines[idx + 1]
-                val_parts = [v.strip().replace(',', '.') for v in val_line.split()]
-                print(val_parts)
-            # map values to headers
-                for col_idx, col in enumerate(header_parts):
-                    if col in dev_metrics:
-                        val = float(val_parts[col_idx])
-                        dev_metrics[col].append(val)
-                        # print(f"Matched {col} (index {col_idx}) to value {val}")
-            except (IndexError, ValueError) as e:
-                print(f"Error parsing at line {idx}: {e}")
-                continue
-    #print("\nCpu results", cpu_metrics)
-    print("\nDevice results", dev_metrics)
-    sys.exit(1)
+            metrics, shift = cpu_metrics, 1
+        elif line.startswith('Device'):
+            metrics, shift = dev_metrics, 0
+        else:
+            continue
+        # header here, values at next line
+        header_parts = line.split()
+        try:
+            val_parts = lines[idx + 1].replace(',', '.').split()
+            for col_idx, col in enumerate(header_parts):
+                if col in metrics:
+                    metrics[col].append(float(val_parts[col_idx - shift]))
+        except (IndexError, ValueError) as e:
+            print(f"Error parsing at line {idx}: {e}")
+            continue
+    return cpu_metrics, dev_metrics
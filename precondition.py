@@ -0,0 +1,285 @@
+import errno
+import hashlib
+import json
+import logging
+import mmap
+import os
+import random
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from stats import mean
+
+# Test target layout before anything is measured (was tester.sh
+# preptestfile, head -c /dev/random): parallel O_DIRECT writers, each
+# with its own page aligned mmap buffer of random bytes written over and
+# over. Every 4k sector is stamped with its offset, so blocks neither
+# compress nor dedup and a read back proves the target was filled.
+# Progress is kept per writer region, an interrupted fill resumes.
+
+SECTOR = 4096
+# offset, MAGIC at the start of every sector
+STAMP = struct.Struct('<QQ')
+MAGIC = 0x696f746573746572
+STATE_DIR = ".precond"
+SIZE_SUFFIX = {'': 1, 'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30, 't': 1 << 40}
+# seconds between progress logs / state saves
+PROGRESS_S = 5.0
+# SNIA PTS steady state: window rounds, max excursion and slope vs mean
+SS_WINDOW = 5
+SS_RANGE = 0.20
+SS_SLOPE = 0.10
+# sampled chunks read back per writer region
+VERIFY_SAMPLES = 8
+
+
+def to_bytes(size: str):
+    # 1G, 512M, 4096
+    size = str(size).strip().lower()
+    unit = size[-1] if size[-1:] in SIZE_SUFFIX and not size[-1:].isdigit() else ''
+    return int(size[:len(size) - len(unit)]) * SIZE_SUFFIX[unit]
+
+
+def aligned_buffer(size: int):
+    # anonymous mmap is page aligned, what O_DIRECT wants
+    buf = mmap.mmap(-1, size)
+    buf[:] = os.urandom(size)
+    return buf
+
+
+def stamp(buf, offset: int, length: int):
+    for i in range(0, length, SECTOR):
+        STAMP.pack_into(buf, i, offset + i, MAGIC)
+
+
+def open_target(path: str, write: bool = True):
+    # (fd, direct), buffered with a warning where O_DIRECT is refused
+    flags = (os.O_RDWR | os.O_CREAT) if write else os.O_RDONLY
+    try:
+        return os.open(path, flags | os.O_DIRECT, 0o644), True
+    except OSError as e:
+        if e.errno != errno.EINVAL:
+            raise
+    logging.warning("%s: no O_DIRECT, preconditioning through the page cache", path)
+    return os.open(path, flags, 0o644), False
+
+
+def target_size(path: str, raw: bool, size: str | None):
+    # raw devices are filled whole, files to -s, both sector aligned
+    if raw:
+        total = current_size(path)
+        return total - total % SECTOR
+    total = to_bytes(size)
+    return -(-total // SECTOR) * SECTOR
+
+
+def regions(total: int, writers: int, chunk: int):
+    # [start, end) per writer, chunk aligned
+    per = -(-total // writers // chunk) * chunk
+    return [(s, min(s + per, total)) for s in range(0, total, per)]
+
+
+def _state_path(logdir: str, path: str):
+    key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16]
+    return os.path.join(logdir, STATE_DIR, f"{key}.json")
+
+
+def current_size(path: str):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return 0
+    try:
+        return os.lseek(fd, 0, os.SEEK_END)
+    finally:
+        os.close(fd)
+
+
+def load_state(logdir: str, path: str, total: int, spans: list):
+    # resume marks when the saved plan matches this one and the target
+    # still holds what they say (file not removed/truncated), else from 0
+    try:
+        with open(_state_path(logdir, path)) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    if state.get('size') != total or state.get('regions') != [list(s) for s in spans] \
+            or current_size(path) < max(state['done']):
+        return {'path': path, 'size': total, 'regions': [list(s) for s in spans],
+                'done': [s for s, _ in spans], 'filled': False}
+    return state
+
+
+def save_state(logdir: str, state: dict):
+    path = _state_path(logdir, state['path'])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def _fill_region(fd: int, buf, start: int, end: int, done: list, i: int,
+                 stop: threading.Event):
+    # sequential writes over one region, done[i] is the resume mark
+    view = memoryview(buf)
+    off = done[i]
+    while off < end and not stop.is_set():
+        n = min(len(buf), end - off)
+        stamp(buf, off, n)
+        os.pwritev(fd, [view[:n]], off)
+        off += n
+        done[i] = off
+
+
+def _random_writes(fd: int, buf, total: int, bs: int, seconds: float, seed: int):
+    # bytes written in random bs blocks for that long
+    view = memoryview(buf)[:bs]
+    rnd = random.Random(seed)
+    blocks = total // bs
+    written = 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        off = rnd.randrange(blocks) * bs
+        stamp(buf, off, bs)
+        os.pwritev(fd, [view], off)
+        written += bs
+    return written
+
+
+def fill(path: str, total: int, argv: object):
+    # parallel layout with resume, True once the whole target is written
+    chunk = to_bytes(argv.precond_bs)
+    spans = regions(total, argv.precond_writers, chunk)
+    state = load_state(argv.logdir, path, total, spans)
+    if state['filled']:
+        return True
+    done = state['done']
+    left = sum(e - d for d, (_, e) in zip(done, spans))
+    if left < total:
+        logging.info("Precondition %s: resuming, %s MB left", path, left >> 20)
+    fd, direct = open_target(path)
+    stop = threading.Event()
+    t0 = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=len(spans)) as pool:
+            futures = [pool.submit(_fill_region, fd, aligned_buffer(chunk), s, e, done, i, stop)
+                       for i, (s, e) in enumerate(spans)]
+            pending = futures
+            try:
+                while pending:
+                    _, pending = wait(pending, timeout=PROGRESS_S)
+                    save_state(argv.logdir, state)
+                    wrote = left - sum(e - d for d, (_, e) in zip(done, spans))
+                    el = time.monotonic() - t0
+                    rate = wrote / el if el else 0
+                    eta = (left - wrote) / rate if rate else 0
+                    logging.info("Precondition %s: %.1f%% at %.0f MB/s, eta %.0fs", path,
+                                 100 - (left - wrote) * 100 / total, rate / (1 << 20), eta)
+            finally:
+                # ^C: writers stop at their next chunk, marks are saved
+                stop.set()
+            for f in futures:
+                f.result()
+        if not direct:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+        save_state(argv.logdir, state)
+    state['filled'] = all(d >= e for d, (_, e) in zip(done, spans))
+    save_state(argv.logdir, state)
+    return state['filled']
+
+
+def ss_reached(rates: list):
+    # last SS_WINDOW rounds within SS_RANGE of their mean, fitted slope
+    # over the window within SS_SLOPE
+    if len(rates) < SS_WINDOW:
+        return False
+    win = rates[-SS_WINDOW:]
+    m = mean(win)
+    if not m:
+        return False
+    xm = (SS_WINDOW - 1) / 2
+    slope = sum((x - xm) * (y - m) for x, y in enumerate(win)) / \
+        sum((x - xm) ** 2 for x in range(SS_WINDOW))
+    return max(win) - min(win) <= SS_RANGE * m and abs(slope) * (SS_WINDOW - 1) <= SS_SLOPE * m
+
+
+def steady(path: str, total: int, argv: object):
+    # SSD steady state: random write rounds until write iops level out
+    bs = to_bytes(argv.precond_ss_bs)
+    fd, _ = open_target(path)
+    rates = []
+    try:
+        with ThreadPoolExecutor(max_workers=argv.precond_writers) as pool:
+            bufs = [aligned_buffer(bs) for _ in range(argv.precond_writers)]
+            for r in range(argv.precond_steady):
+                seeds = [r * argv.precond_writers + i for i in range(len(bufs))]
+                written = sum(pool.map(
+                    lambda b, s: _random_writes(fd, b, total, bs, argv.precond_round, s),
+                    bufs, seeds))
+                rates.append(written / bs / argv.precond_round)
+                logging.info("Precondition %s: steady round %s, %.0f write iops",
+                             path, r + 1, rates[-1])
+                if ss_reached(rates):
+                    return True, rates
+    finally:
+        os.close(fd)
+    logging.warning("Precondition %s: no steady state after %s rounds", path, len(rates))
+    return False, rates
+
+
+def verify(path: str, total: int, argv: object):
+    # read back sampled chunks of every region (and the last sector),
+    # every sector must carry its own stamp
+    chunk = to_bytes(argv.precond_bs)
+    spans = regions(total, argv.precond_writers, chunk)
+    rnd = random.Random(total)
+    picks = {total - SECTOR}
+    for s, e in spans:
+        picks.add(s)
+        picks.update(s + rnd.randrange((e - s) // SECTOR) * SECTOR for _ in range(VERIFY_SAMPLES))
+    buf = mmap.mmap(-1, chunk)
+    view = memoryview(buf)
+    bad = 0
+    if current_size(path) < total:
+        logging.error("Precondition %s: shorter than %s bytes", path, total)
+        return False
+    fd, _ = open_target(path, write=False)
+    try:
+        for off in sorted(picks):
+            n = min(chunk, total - off)
+            got = os.preadv(fd, [view[:n]], off)
+            for i in range(0, got, SECTOR):
+                if STAMP.unpack_from(buf, i) != (off + i, MAGIC):
+                    bad += 1
+    finally:
+        os.close(fd)
+    if bad:
+        logging.error("Precondition %s: %s sectors not filled", path, bad)
+    return not bad
+
+
+def precondition(argv: object):
+    # every target of the run, False when one can not be trusted
+    targets = argv.devices if argv.raw else [argv.filename]
+    ok = True
+    for path in targets:
+        total = target_size(path, argv.raw, argv.filesize)
+        t0 = time.monotonic()
+        if not fill(path, total, argv):
+            ok = False
+            continue
+        if argv.precond_steady:
+            steady(path, total, argv)
+        if not verify(path, total, argv):
+            # the next run lays it out again from 0
+            os.remove(_state_path(argv.logdir, path))
+            ok = False
+            continue
+        logging.info("Precondition %s: %s MB ready in %.1fs", path, total >> 20,
+                     time.monotonic() - t0)
+    return ok
@@ -1,171 +1,510 @@
+import asyncio
 import logging
 import shlex
-import subprocess
 import os
-from output import format_job
-import sys
+import resource
+import signal
+from output import format_job, fio_hists, thread_rows, split_fio_output, HIST_SKIP
+from hist import to_array
+from sampler import new_sampler, run_sampler, stop_sampler_task, sampler_averages, sampler_series, window_cv, clock, dev_name
+from settle import settle
+from store import save_result, save_params
+from timeline import fio_log_args, build_timeline, new_txg_watch, run_txg_watch, stop_txg_task
+from txg import txg_pools
+from zfs import snapshot, job_zfs, params_digest
+from irq import irq_snapshot, job_irq
+from cluster import run_hosts
+from engine import is_pyio, command as engine_command
+from metrics import new_live, job_started, job_done, start_metrics, stop_metrics
+from numa import placement, parse_cpulist, format_cpulist, pin_harness, irq_plan, apply_irq_plan, restore_irqs
+from stats import mean, ci_halfwidth
+import math
+import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 JOB_TIMEOUT = 120
+# after SIGINT on timeout fio gets this long to print its report
+KILL_GRACE = 10
 
-def start_iostat_capture(cmd: str):
-# cmd must not include '&' or '2>&1'
-    proc = subprocess.Popen(
-        cmd,
-        shell=True,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-        preexec_fn=os.setpgrp
+# parallel/fanout workers share the set log
+_log_lock = threading.Lock()
+# zfs tunables digests already written to the set log
+_logged_params = set()
+# live metrics of the run when --metrics-port is set
+_live = None
+# cpus the run started on, fio goes back to them when only the harness
+# is pinned (--irq-pin with --numa=off)
+_fio_cpus = None
+
+async def start_cmd(cmd: list | str):
+    # background process in its own process group, reaped by read_all()
+    args = shlex.split(cmd) if isinstance(cmd, str) else list(cmd)
+    return await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True
     )
-    return proc
 
-def read_all(proc: subprocess.Popen, timeout: int | None = None):
+
+async def _pump(stream: asyncio.StreamReader, chunks: list, log: bool = False):
+    # drain as it comes, stderr lines (fio errors/warnings) logged live
+    while True:
+        chunk = await (stream.readline() if log else stream.read(1 << 16))
+        if not chunk:
+            return
+        chunks.append(chunk)
+        if log:
+            logging.warning("stderr: %s", chunk.decode(errors="replace").rstrip())
+
+
+def _signal_group(proc: asyncio.subprocess.Process, sig: int):
     try:
-        out, err = proc.communicate(timeout=timeout)
-    except subprocess.TimeoutExprired:
-        proc.kill()
-        out, err = proc.communicate()
-    return proc.returncode, out or "", err or ""
-
-
-def run_cmd(cmd: list | str,
-            check: bool = False,
-            capture_output: bool = True,
-            text: bool = True,
-            timeout: int | None = JOB_TIMEOUT,
-            cwd: str | None = None,
-            env: dict | None = None,
-            log: bool = True
-            ):
-    # some debugging
-    info = cmd
-    if isinstance(cmd, str):
-        args = shlex.split(cmd)
-    else:
-        args = list(cmd)
-        info = shlex.join(cmd)
+        os.killpg(proc.pid, sig)
+    except ProcessLookupError:
+        pass
 
+
+async def read_all(proc: asyncio.subprocess.Process, timeout: float | None = None):
+    # stream stdout/stderr until exit; on timeout SIGINT the whole group
+    # (fio still reports), SIGKILL it after KILL_GRACE
+    out, err = [], []
+    done = asyncio.ensure_future(asyncio.gather(
+        _pump(proc.stdout, out), _pump(proc.stderr, err, True), proc.wait()))
     try:
-        completed = subprocess.run(
-                args,
-                check=check,
-                capture_output=capture_output,
-                text=text,
-                timeout=timeout,
-                cwd=cwd,
-                env=env
-        )
-    except subprocess.CalledProcessError as e:
-        return e.returncode, e.stdout or "", e.stderr or ""
-    except subprocess.TimeoutExpired as e:
-        return -1, e.stdout or "", e.stderr or f"Timeout after {timeout}s"
-    except Exception as e:
-        return -1, "", str(e)
+        await asyncio.wait_for(asyncio.shield(done), timeout)
+    except asyncio.TimeoutError:
+        err.append(f"Timeout after {timeout}s\n".encode())
+        _signal_group(proc, signal.SIGINT)
+        try:
+            await asyncio.wait_for(asyncio.shield(done), KILL_GRACE)
+        except asyncio.TimeoutError:
+            _signal_group(proc, signal.SIGKILL)
+            await done
+    return (proc.returncode, b"".join(out).decode(errors="replace"),
+            b"".join(err).decode(errors="replace"))
+
 
+async def run_cmd(cmd: list | str, timeout: float | None = JOB_TIMEOUT, log: bool = True):
+    info = cmd if isinstance(cmd, str) else shlex.join(cmd)
+    try:
+        proc = await start_cmd(cmd)
+    except OSError as e:
+        return -1, "", str(e)
+    rc, out, err = await read_all(proc, timeout)
     if log:
-        logging.info("Cmd: %s (rc %s) (timeout %s)", info, completed.returncode, timeout)
+        logging.info("Cmd: %s (rc %s) (timeout %s)", info, rc, timeout)
+    return rc, out, err
+
+
+async def wait_steady(proc: asyncio.subprocess.Process, sampler: dict, argv: object):
+    # stop fio (SIGINT, fio still reports) once the sampled iops/bw
+    # coefficient of variation over the window drops under --ss-cv
+    n = max(3, int(argv.ss_window / argv.interval))
+    while proc.returncode is None:
+        cv = window_cv(sampler, argv.ss_metric, n)
+        if cv is not None and cv <= argv.ss_cv:
+            t = round(sampler['t'][sampler['count'] - 1], 2)
+            logging.info("Steady state after %ss (cv %.3f), stopping fio", t, cv)
+            try:
+                proc.send_signal(signal.SIGINT)
+            except ProcessLookupError:
+                pass
+            return True, t
+        await asyncio.sleep(argv.interval)
+    return False, None
+
+
+def retarget(cmd: list, device: str):
+    # point a normalized fio argv at another device
+    return [f"--filename={device}" if a.startswith("--filename=") else a
+            for a in cmd]
+
+
+def harness_usage():
+    # cpu seconds (all harness threads, not fio) and storage bytes of this process
+    ru = resource.getrusage(resource.RUSAGE_SELF)
+    # /proc/self/io adds in reaped children (fio), their rusage blocks come
+    # from the same counters in 512 byte units
+    kids = resource.getrusage(resource.RUSAGE_CHILDREN)
+    io = {}
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                k, v = line.split(':')
+                io[k] = int(v)
+    except OSError:
+        pass
+    return (ru.ru_utime + ru.ru_stime,
+            max(0, io.get('read_bytes', 0) - kids.ru_inblock * 512),
+            max(0, io.get('write_bytes', 0) - kids.ru_oublock * 512))
+
+
+def check_logdir(argv: object):
+    # harness logs/db must not land on what we are measuring
+    os.makedirs(argv.logdir, exist_ok=True)
+    names = {dev_name(d) for d in argv.devices}
+    target = None
+    if not argv.raw:
+        target = os.path.dirname(os.path.abspath(argv.filename))
+        if not os.path.exists(target):
+            target = None
+    dirs = {'logdir': argv.logdir}
+    if argv.db:
+        dirs['db'] = os.path.dirname(os.path.abspath(argv.db))
+    for what, path in dirs.items():
+        if not os.path.isdir(path):
+            continue
+        st_dev = os.stat(path).st_dev
+        # /sys/dev/block/M:m resolves to .../block/sdb/sdb1 for partitions
+        chain = os.path.realpath(f"/sys/dev/block/{os.major(st_dev)}:{os.minor(st_dev)}")
+        on_test = bool(names & set(chain.split('/')))
+        on_test |= target is not None and os.stat(target).st_dev == st_dev
+        if on_test:
+            logging.warning("%s %s is on a device under test, harness writes "
+                            "will show up in the results (use --logdir/--db)", what, path)
+
+
+def cpus_arg(cmds: list, place: dict | None):
+    # fio --cpus_allowed: the placement's node, else every cpu the run
+    # started with when the harness is pinned (children inherit it)
+    if any(a.startswith("--cpus_allowed=") for a in cmds):
+        return []
+    if place:
+        return [f"--cpus_allowed={place['numa_cpus']}"]
+    if _fio_cpus:
+        return [f"--cpus_allowed={format_cpulist(_fio_cpus)}"]
+    return []
+
+
+def _placements(argv: object):
+    # numa ab: every job once on the device node, once on a remote one
+    return ['local', 'remote'] if argv.numa == 'ab' else [argv.numa]
+
+
+def ci_rel(rows: list, metric: str, conf: float):
+    # CI half width over the mean of a column across repeats
+    vals = [float(r.get(metric) or 0) for r in rows]
+    m = mean(vals)
+    return ci_halfwidth(vals, conf) / m if m else math.inf
+
+
+def repeat_row(rows: list, argv: object):
+    # numeric columns averaged over the repeats, CI of the watched ones
+    out = dict(rows[-1])
+    out.pop('repeat', None)
+    for k, v in rows[-1].items():
+        if k == 'repeat' or not isinstance(v, (int, float)) or isinstance(v, bool):
+            continue
+        vals = [float(r.get(k) or 0) for r in rows]
+        if len(set(vals)) > 1:
+            out[k] = round(mean(vals), 3)
+    rels = {}
+    for m in argv.ci_metrics:
+        rels[m] = ci_rel(rows, m, argv.ci_level)
+        out[f"{m}_ci_pct"] = round(rels[m] * 100, 2) if math.isfinite(rels[m]) else ""
+    out['repeats'] = len(rows)
+    out['ci_met'] = all(r <= argv.ci_target for r in rels.values())
+    for k in ('fio_cmd', 'fio_log'):
+        if k in out:
+            out[k] = out.pop(k)
+    return out
+
+
+async def _job(measure, argv: object, post: ThreadPoolExecutor):
+    # future of one job's row. Single runs are post-processed in the
+    # background; repeats wait for each row, the CI decides on the next run
+    loop = asyncio.get_running_loop()
+    if argv.repeat_max <= 1:
+        return loop.run_in_executor(post, process_job, await measure())
+    rows = []
+    for i in range(argv.repeat_max):
+        capture = await measure()
+        capture['repeat'] = i
+        fut = loop.run_in_executor(post, process_job, capture)
+        try:
+            rows.append(await fut)
+        except Exception:
+            # surfaces like any failed job
+            return fut
+        if len(rows) >= argv.repeat_min and \
+                all(ci_rel(rows, m, argv.ci_level) <= argv.ci_target for m in argv.ci_metrics):
+            break
+    row = repeat_row(rows, argv)
+    logging.info("Job %s: %s repeats, ci %s", row.get('jobname'), len(rows),
+                 "met" if row['ci_met'] else "not met")
+    done = loop.create_future()
+    done.set_result(row)
+    return done
+
+
+async def _run_queue(cmds: list, argv: object, device: str, post: ThreadPoolExecutor):
+    # one device worker: its own job queue, its own sampler
+    futures = []
+    for cmd in cmds:
+        for where in _placements(argv):
+            futures.append(await _job(
+                lambda: measure_job(retarget(cmd, device), argv, [device], drop=False,
+                                    numa=where), argv, post))
+    return futures
+
+
+async def _dispatch(cmds: list[str], argv: object, post: ThreadPoolExecutor):
+    # every device worker is a coroutine on one event loop, fio and the
+    # samplers are awaited, not waited on by a thread each
+    mode = getattr(argv, 'mode', 'serial')
+    devices = argv.devices
+    loop = asyncio.get_running_loop()
+    futures = []
+
+    # job N is parsed/logged/stored on the post worker while job N+1 settles
+    # and runs
+    if mode == 'serial':
+        for cmd in cmds:
+            for where in _placements(argv):
+                futures.append(await _job(lambda: measure_job(cmd, argv, numa=where),
+                                          argv, post))
+    elif mode == 'parallel':
+        # every device queue walks the whole plan
+        cmds = list(cmds)
+        # drop_caches is host wide, do it once before the queues start
+        await asyncio.to_thread(settle, devices, argv.settle_max, argv.settle_dirty)
+        queues = await asyncio.gather(*(_run_queue(cmds, argv, dev, post) for dev in devices))
+        for queue in queues:
+            futures.extend(queue)
+    elif mode == 'fanout':
+        # same job on every device at once, saturates the HBA/backplane
+        for cmd in cmds:
+            for where in _placements(argv):
+                settle_s = await asyncio.to_thread(settle, devices, argv.settle_max,
+                                                   argv.settle_dirty)
+                barrier = asyncio.Barrier(len(devices))
+                captures = await asyncio.gather(*(
+                    measure_job(retarget(cmd, dev), argv, [dev], False, barrier, settle_s, where)
+                    for dev in devices))
+                futures.extend(loop.run_in_executor(post, process_job, c) for c in captures)
+    return await asyncio.gather(*futures, return_exceptions=True)
 
-    return completed.returncode, completed.stdout or "", completed.stderr or ""
 
 def run_jobs(cmds: list[str], argv: object):
+    if argv.hosts or argv.local_servers:
+        # fio runs on the servers, nothing to sample or pin here
+        os.makedirs(argv.logdir, exist_ok=True)
+        return run_hosts(cmds, argv)
+    check_logdir(argv)
+    global _fio_cpus
+    saved_irqs = {}
+    if argv.numa != 'off' or argv.irq_pin:
+        local = placement(argv.devices, 'local')
+        if local:
+            cpus = parse_cpulist(local['numa_cpus'])
+            # samplers, txg watch and the post worker stay on the device
+            # node whatever fio gets, threads started from here inherit it
+            _fio_cpus = sorted(os.sched_getaffinity(0))
+            pin_harness(cpus)
+            if argv.irq_pin:
+                saved_irqs = apply_irq_plan(irq_plan(argv.irq_match, cpus))
+    global _live
+    server = None
+    if argv.metrics_port:
+        # progress needs the plan size
+        cmds = list(cmds)
+        planned = len(cmds) * len(_placements(argv))
+        planned *= len(argv.devices) if argv.mode != 'serial' else 1
+        planned *= argv.repeat_min if argv.repeat_max > 1 else 1
+        _live = new_live(argv.setname, planned, argv.irq_match)
+        server = start_metrics(_live, argv.metrics_addr, argv.metrics_port)
+    try:
+        with ThreadPoolExecutor(max_workers=1) as post:
+            results = asyncio.run(_dispatch(cmds, argv, post))
+    finally:
+        # rollback, even when a job blew up
+        restore_irqs(saved_irqs)
+        if _fio_cpus:
+            pin_harness(_fio_cpus)
+            _fio_cpus = None
+        if server:
+            stop_metrics(server)
+            _live = None
+
     out = []
-    for cmd in cmds:
-        out.append(run_job(cmd, argv))
+    for res in results:
+        if isinstance(res, Exception):
+            # rows before this one are already in the store
+            logging.error("Post-processing failed, job skipped: %s", res)
+        else:
+            out.append(res)
     return out
 
-def run_job(cmds: str, argv: object):
-    iostat_devs = " ".join(argv.devices)
+
+def run_job(cmds: str, argv: object, devices: list | None = None,
+            drop: bool = True, numa: str | None = None):
+    # one job, blocking (sweep, tune)
+    return process_job(asyncio.run(measure_job(cmds, argv, devices, drop, numa=numa)))
+
+
+async def measure_job(cmds: str, argv: object, devices: list | None = None,
+                      drop: bool = True, barrier: asyncio.Barrier | None = None,
+                      settle_s: float | None = None, numa: str | None = None):
+    # critical path only: settle, samplers, fio. process_job does the rest
     # argv have been normalized() at this point ...
-    # before each task flush cache
-    run_cmd("sync", timeout=10, log=False)
-    run_cmd('echo 3 > sudo tee /proc/sys/vm/drop_caches', timeout=10, log=False)
-    logging.info("Flushing caches (10s pause) ...")
-    time.sleep(10)
+    devices = devices or argv.devices
+    # before each task flush cache and wait for the devices to drain
+    if settle_s is None:
+        settle_s = await asyncio.to_thread(settle, devices, argv.settle_max,
+                                           argv.settle_dirty, drop)
 
-    # do NOT include '&' or '2>&1' when you want to capture output
-    iostat_cmd = f"iostat -c -d -x -y 1 {argv.runtime} {iostat_devs}"
-    iostat_proc = start_iostat_capture(iostat_cmd)
+    # in-process /proc/diskstats + /proc/stat sampling, replaces iostat
+    sampler = new_sampler(devices, argv.interval, argv.runtime)
+    sampler_task = asyncio.create_task(run_sampler(sampler))
+    pools = argv.pools if argv.pools is not None else txg_pools()
+    txg_state = new_txg_watch(pools) if pools else None
+    txg_task = asyncio.create_task(run_txg_watch(txg_state)) if pools else None
+    # fio per-interval logs, parsed into the timeline then dropped
+    tmpdir = tempfile.TemporaryDirectory(prefix="fiolog_", dir=argv.logdir)
+    prefix = os.path.join(tmpdir.name, "job")
+    fio_args = list(cmds) + fio_log_args(prefix, argv.interval)
+    # single runs (sweep, tune) take the local half of an ab
+    where = numa or argv.numa
+    place = placement(devices, 'local' if where == 'ab' else where)
+    fio_args += cpus_arg(cmds, place)
+    if _live:
+        name = next((a[7:] for a in cmds if a.startswith("--name=")), "")
+        job_started(_live, str(id(sampler)), name, sampler, txg_state)
+    if is_pyio(fio_args):
+        # built-in engine, same argv, same output
+        fio_args = engine_command(fio_args)
+    if barrier:
+        await barrier.wait()
 
     fio_timeout = argv.runtime
-    # +10 safety buffer to let fio finish
-    rc_fio, out_fio, err_fio = run_cmd(cmds, timeout=fio_timeout+10)
-
-    rc_iostat, out_iostat, err_iostat = read_all(iostat_proc, timeout=argv.runtime)
-    logging.info("Background iostat: %s (timeout %s)", iostat_cmd, argv.runtime)
-
-    # Now out_fio and out_iostat are strings (text=True)
-    # logging.debug("fio out head: %s", out_fio[:1000])
-    # logging.debug("iostat out head: %s", out_iostat[:1000])
-
-    # parse iostat using out_iostat below (same parsing code as you already have)
-    cpu_metrics = {'%user': [], '%system': [], '%iowait': [], '%idle': []}
-
-    dev_metrics = {'r/s': [], 'rkB/s': [], 'r_await': [], 'w/s': [], 'wkB/s':
-                   [], 'w_await': [], 'aqu-sz': [], '%util': []}
-    lines = out_iostat.splitlines()
-    # ... (parsing unchanged) ...
-    for idx, line in enumerate(lines):
-        if line.startswith('avg-cpu'):
-            # parse header
-            header_parts = [p.strip() for p in line.split() if p.strip()]
-            # get values at next line
-            try:
-                val_line = lines[idx + 1]
-                val_parts = [v.strip().replace(',', '.') for v in val_line.split()]
-            # map values to headers
-                for col_idx, col in enumerate(header_parts):
-                    if col in cpu_metrics:
-                        val = float(val_parts[col_idx -1])
-                        cpu_metrics[col].append(val)
-                        #print(f"Matched {col} (index {col_idx}) to value {val}")
-            except (IndexError, ValueError) as e:
-                print(f"Error parsing at line {idx}: {e}")
-                continue
-        if line.startswith('Device'):
-            # parse header
-            header_parts = [p.strip() for p in line.split() if p.strip()]
-            # get values at next line
+    ss_reached, ss_time = False, None
+    zfs0 = snapshot(argv.sysfs_root)
+    # host wide, in parallel/fanout modes it covers every device worker
+    irq0 = irq_snapshot()
+    fio_offset = clock() - sampler['t0']
+    usage0 = harness_usage()
+    wall0 = time.monotonic()
+    try:
+        if argv.steady:
             try:
-                val_line = lines[idx + 1]
-                val_parts = [v.strip().replace(',', '.') for v in val_line.split()]
-                # map values to headers
-                for col_idx, col in enumerate(header_parts):
-                    if col in dev_metrics:
-                        val = float(val_parts[col_idx])
-                        dev_metrics[col].append(val)
-                        # print(f"Matched {col} (index {col_idx}) to value {val}")
-            except (IndexError, ValueError) as e:
-                print(f"Error parsing at line {idx}: {e}")
-                continue
-    # logging.debug("\nCpu results: %s", cpu_metrics)
-    # logging.debug("\nDevice results: %s", dev_metrics)
-
-
-    averages = {}
-    for metric, vals in cpu_metrics.items():
-        key = "iostat_" + metric.replace('%', '')
-        avg = round(sum(vals) / len(vals), 2) if vals else 0.0
-        averages[key] = avg
-
-    for metric, vals in dev_metrics.items():
-        key = "iostat_" + metric.replace('%', '')
-        key = key.replace('/', '')
-        avg = round(sum(vals) / len(vals), 2) if vals else 0.0
-        averages[key] = avg
+                fio_proc = await start_cmd(fio_args)
+            except OSError as e:
+                # like run_cmd: no fio fails this job, not the whole queue
+                rc_fio, out_fio, err_fio = -1, "", str(e)
+                logging.error("Cmd: %s (%s)", shlex.join(cmds), e)
+            else:
+                steady = asyncio.create_task(wait_steady(fio_proc, sampler, argv))
+                rc_fio, out_fio, err_fio = await read_all(fio_proc, timeout=fio_timeout+10)
+                ss_reached, ss_time = await steady
+                logging.info("Cmd: %s (rc %s) (steady %s)", shlex.join(cmds), rc_fio, ss_reached)
+        else:
+            # +10 safety buffer to let fio finish
+            rc_fio, out_fio, err_fio = await run_cmd(fio_args, timeout=fio_timeout+10)
+        usage1 = harness_usage()
+        wall = time.monotonic() - wall0
+        irq1 = irq_snapshot()
+        zfs1 = snapshot(argv.sysfs_root)
+    finally:
+        # nothing left running behind a failed job
+        await stop_sampler_task(sampler, sampler_task)
+        if txg_task:
+            await stop_txg_task(txg_state, txg_task)
+        if _live:
+            job_done(_live, str(id(sampler)))
+    logging.info("Sampler: %s samples every %ss on %s", sampler['count'],
+                 argv.interval, ",".join(sampler['names']))
+
+    # harness cost while fio ran, in parallel/fanout modes it is the
+    # whole process shared by all device workers
+    harness = {
+        'harness_cpu_s': round(usage1[0] - usage0[0], 3),
+        'harness_cpu_pct': round((usage1[0] - usage0[0]) / wall * 100, 2) if wall else 0.0,
+        'harness_rkB': (usage1[1] - usage0[1]) // 1024,
+        'harness_wkB': (usage1[2] - usage0[2]) // 1024,
+    }
+    return {
+        'cmds': cmds, 'argv': argv, 'settle_s': settle_s, 'sampler': sampler,
+        'txg_state': txg_state, 'tmpdir': tmpdir, 'prefix': prefix,
+        'fio_offset': fio_offset, 'out_fio': out_fio, 'ss_reached': ss_reached,
+        'ss_time': ss_time, 'harness': harness, 'zfs': (zfs0, zfs1),
+        'irq': (irq0, irq1), 'placement': place,
+    }
+
+
+def process_job(capture: dict):
+    argv = capture['argv']
+    cmds = capture['cmds']
+    sampler = capture['sampler']
+    out_fio = capture['out_fio']
+
+    averages = sampler_averages(sampler)
+    t, cpu_metrics, dev_metrics = sampler_series(sampler)
+    timeline, ts_summary = build_timeline(capture['prefix'], capture['fio_offset'],
+                                          argv.interval, sampler, capture['txg_state'])
+    capture['tmpdir'].cleanup()
+
+    zfs0, zfs1 = capture['zfs']
+    irq_row, irq_series = job_irq(*capture['irq'], argv.irq_match, sampler['names'])
 
     # print exhaustive out in logs
-    logfile = f"logs/{argv.setname}.log"
-    with open(logfile, 'a') as f:
+    logfile = os.path.join(argv.logdir, f"{argv.setname}.log")
+    with _log_lock, open(logfile, 'a') as f:
         sep = "=" * 10
         f.write(f"{sep} fio out:\n {out_fio}\n")
-        f.write(f"{sep} iostat out:\n {out_iostat}\n")
-        f.write(f"{sep} Cpu metrics:\n {cpu_metrics}\n")
-        f.write(f"{sep} Dev metrics:\n {dev_metrics}\n")
+        # series go to the result store when there is one
+        if not argv.db:
+            f.write(f"{sep} Sample times:\n {t.tolist()}\n")
+            cpu = {k: v.tolist() for k, v in cpu_metrics.items()}
+            f.write(f"{sep} Cpu metrics:\n {cpu}\n")
+            for name, cols in dev_metrics.items():
+                dev = {k: v.tolist() for k, v in cols.items()}
+                f.write(f"{sep} Dev metrics {name}:\n {dev}\n")
+            irqs = {k: v.tolist() for k, v in irq_series['irq'].items()}
+            f.write(f"{sep} IRQ rates per core:\n {irqs}\n")
         f.write(f"{sep} Avg iostats:\n {averages}\n")
+        # tunables once per distinct set in this log
+        digest = params_digest(zfs0['params']) if zfs0['params'] else None
+        if digest and digest not in _logged_params:
+            _logged_params.add(digest)
+            f.write(f"{sep} ZFS tunables {digest}:\n {zfs0['params']}\n")
 
-    # prepare output
-    return format_job(out_fio, out_iostat, averages, cmds)
-    # return rc_fio, out_fio, err_fio, rc_iostat, out_iostat, err_iostat
-
+    # prepare output, tagged with the device(s) it ran against
+    fio_json, fio_log = split_fio_output(out_fio, HIST_SKIP)
+    res = format_job(fio_json, fio_log, averages, cmds)
+    # mergeable latency histograms, per direction over all fio jobs
+    hists = fio_hists(fio_json)
+    if argv.steady:
+        res['ss_reached'] = capture['ss_reached']
+        res['ss_time_s'] = capture['ss_time']
+    res = {'device': ",".join(sampler['names']), **capture['placement'],
+           'settle_s': capture['settle_s'], **res}
+    if 'repeat' in capture:
+        res = {'repeat': capture['repeat'], **res}
+    res.update(ts_summary)
+    res.update(capture['harness'])
+    res.update(job_zfs(zfs0, zfs1))
+    res.update(irq_row)
+    # logs stay the last columns
+    for k in ('fio_cmd', 'fio_log'):
+        res[k] = res.pop(k)
+    # one extra row per fio job when the output holds several
+    threads = [{'device': res['device'], 'jobname': res['jobname'], 'bs': res['bs'],
+                'qd': res['qd'], **row}
+               for row in thread_rows(fio_json)]
 
+    # commit the row now, a later crash keeps everything up to here
+    if argv.db:
+        series = {'time': {'t': t}, 'cpu': cpu_metrics, **dev_metrics, **timeline,
+                  **irq_series, 'hist': {k: to_array(h) for k, h in hists.items()}}
+        if 'zfs_params' in res:
+            save_params(argv.db, res['zfs_params'], zfs0['params'])
+        save_result(argv.db, argv.setname, res, series)
+        for row in threads:
+            save_result(argv.db, argv.setname, row)
+    elif threads:
+        with _log_lock, open(logfile, 'a') as f:
+            f.write(f"{'=' * 10} Per job rows:\n {threads}\n")
+    return res
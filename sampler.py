@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from array import array
+
+DISKSTATS = "/proc/diskstats"
+PROCSTAT = "/proc/stat"
+
+# same columns iostat -c -d -x used to give us
+CPU_METRICS = ('%user', '%system', '%iowait', '%idle')
+DEV_METRICS = ('r/s', 'rkB/s', 'r_await', 'w/s', 'wkB/s', 'w_await',
+               'aqu-sz', '%util')
+
+
+def clock():
+    # CLOCK_MONOTONIC_RAW, the clock SPL gethrtime() stamps txg births with
+    return time.clock_gettime(time.CLOCK_MONOTONIC_RAW)
+
+
+def dev_name(path: str):
+    # /dev/sdb, /dev/disk/by-id/... -> sdb as listed in /proc/diskstats
+    return os.path.basename(os.path.realpath(path))
+
+
+def read_diskstats(names, path: str = DISKSTATS):
+    # fields after major minor name:
+    # rd_ios rd_merges rd_sectors rd_ticks wr_ios wr_merges wr_sectors
+    # wr_ticks ios_in_progress io_ticks time_in_queue
+    res = {}
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) > 13 and parts[2] in names:
+                res[parts[2]] = [int(v) for v in parts[3:14]]
+    return res
+
+
+def read_cpu(path: str = PROCSTAT):
+    # user nice system idle iowait irq softirq steal
+    with open(path) as f:
+        parts = f.readline().split()
+    return [int(v) for v in parts[1:9]]
+
+
+def _zeros(size: int):
+    return array('d', bytes(8 * size))
+
+
+def _grow(state: dict):
+    extra = state['size']
+    state['t'].extend(_zeros(extra))
+    for col in state['cpu'].values():
+        col.extend(_zeros(extra))
+    for dev in state['dev'].values():
+        for col in dev.values():
+            col.extend(_zeros(extra))
+    state['size'] += extra
+
+
+def store_sample(state: dict, t: float, cpu0, cpu1, dev0, dev1, dt: float):
+    # one tick from two /proc/stat + diskstats snapshots dt seconds apart
+    i = state['count']
+    if i >= state['size']:
+        _grow(state)
+    state['t'][i] = t
+
+    d = [b - a for a, b in zip(cpu0, cpu1)]
+    total = sum(d) or 1
+    cpu = state['cpu']
+    cpu['%user'][i] = 100.0 * d[0] / total
+    cpu['%system'][i] = 100.0 * (d[2] + d[5] + d[6]) / total
+    cpu['%iowait'][i] = 100.0 * d[4] / total
+    cpu['%idle'][i] = 100.0 * d[3] / total
+
+    ms = dt * 1000
+    for name, cols in state['dev'].items():
+        if name not in dev0 or name not in dev1:
+            continue
+        d = [b - a for a, b in zip(dev0[name], dev1[name])]
+        cols['r/s'][i] = d[0] / dt
+        cols['rkB/s'][i] = d[2] / 2 / dt
+        cols['r_await'][i] = d[3] / d[0] if d[0] else 0.0
+        cols['w/s'][i] = d[4] / dt
+        cols['wkB/s'][i] = d[6] / 2 / dt
+        cols['w_await'][i] = d[7] / d[4] if d[4] else 0.0
+        cols['aqu-sz'][i] = d[10] / ms
+        cols['%util'][i] = min(100.0, 100.0 * d[9] / ms)
+    state['count'] = i + 1
+
+
+def _first(state: dict):
+    return read_diskstats(state['names']), read_cpu(), clock()
+
+
+def _tick(state: dict, prev: tuple):
+    dev0, cpu0, t0 = prev
+    dev1 = read_diskstats(state['names'])
+    cpu1 = read_cpu()
+    t1 = clock()
+    store_sample(state, t1 - state['t0'], cpu0, cpu1, dev0, dev1, t1 - t0)
+    return dev1, cpu1, t1
+
+
+async def run_sampler(state: dict):
+    # task on the runner event loop, cancelled to stop
+    prev = _first(state)
+    deadline = prev[2] + state['interval']
+    while not state['stop'].is_set():
+        await asyncio.sleep(max(0.0, deadline - clock()))
+        prev = _tick(state, prev)
+        deadline += state['interval']
+
+
+def new_sampler(devices: list, interval: float = 1.0,
+                duration: float | None = None):
+    names = [dev_name(d) for d in devices]
+    found = read_diskstats(names)
+    for name in names:
+        if name not in found:
+            logging.warning("Sampler: %s not found in %s", name, DISKSTATS)
+
+    # preallocate for the whole run, grows only if fio overruns
+    size = int(duration / interval) + 16 if duration else 1024
+    return {
+        'names': names,
+        'interval': interval,
+        'size': size,
+        'count': 0,
+        't0': clock(),
+        't': _zeros(size),
+        'cpu': {m: _zeros(size) for m in CPU_METRICS},
+        'dev': {n: {m: _zeros(size) for m in DEV_METRICS} for n in names},
+        'stop': threading.Event(),
+    }
+
+
+async def stop_sampler_task(state: dict, task: asyncio.Task):
+    state['stop'].set()
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    return state
+
+
+def sampler_series(state: dict):
+    # trimmed copies of the sampled columns
+    n = state['count']
+    cpu = {m: state['cpu'][m][:n] for m in CPU_METRICS}
+    dev = {name: {m: cols[m][:n] for m in DEV_METRICS}
+           for name, cols in state['dev'].items()}
+    return state['t'][:n], cpu, dev
+
+
+def window_cv(state: dict, metric: str = 'iops', n: int = 10):
+    # coefficient of variation of the last n samples summed over devices,
+    # None until n samples are in
+    count = state['count']
+    if count < n:
+        return None
+    cols = ('r/s', 'w/s') if metric == 'iops' else ('rkB/s', 'wkB/s')
+    vals = [0.0] * n
+    for dev in state['dev'].values():
+        for col in cols:
+            for j, v in enumerate(dev[col][count - n:count]):
+                vals[j] += v
+    mean = sum(vals) / n
+    if mean <= 0:
+        return None
+    var = sum((v - mean) ** 2 for v in vals) / n
+    return var ** 0.5 / mean
+
+
+def sampler_averages(state: dict):
+    # same keys as the old iostat text parser: iostat_user, iostat_rs ...
+    n = state['count']
+    averages = {}
+    for metric in CPU_METRICS:
+        key = "iostat_" + metric.replace('%', '')
+        col = state['cpu'][metric]
+        averages[key] = round(sum(col[:n]) / n, 2) if n else 0.0
+
+    devs = list(state['dev'].values())
+    for metric in DEV_METRICS:
+        key = "iostat_" + metric.replace('%', '').replace('/', '')
+        total = sum(sum(d[metric][:n]) for d in devs)
+        count = n * len(devs)
+        averages[key] = round(total / count, 2) if count else 0.0
+    return averages
@@ -0,0 +1,81 @@
+import glob
+import logging
+import os
+import time
+
+from sampler import dev_name, read_diskstats
+
+MEMINFO = "/proc/meminfo"
+DROP_CACHES = "/proc/sys/vm/drop_caches"
+TXGS_GLOB = "/proc/spl/kstat/zfs/*/txgs"
+
+# consecutive quiet polls before we call it settled
+QUIET_POLLS = 3
+
+
+def drop_caches():
+    os.sync()
+    try:
+        with open(DROP_CACHES, 'w') as f:
+            f.write("3\n")
+    except OSError as e:
+        logging.warning("drop_caches failed: %s", e)
+
+
+def read_dirty(path: str = MEMINFO):
+    # Dirty + Writeback in kB
+    kb = 0
+    with open(path) as f:
+        for line in f:
+            if line.startswith(('Dirty:', 'Writeback:')):
+                kb += int(line.split()[1])
+    return kb
+
+
+def txgs_busy(pattern: str = TXGS_GLOB):
+    # txg states: O open, Q quiescing, W wait for sync, S syncing, C committed
+    for path in glob.glob(pattern):
+        with open(path) as f:
+            lines = f.readlines()[1:]
+        for line in lines[-4:]:
+            parts = line.split()
+            if len(parts) > 2 and parts[2] not in ('O', 'C'):
+                return True
+    return False
+
+
+def _io_state(names):
+    # (ios in flight, ios completed) summed over devices
+    stats = read_diskstats(names)
+    inflight = sum(s[8] for s in stats.values())
+    done = sum(s[0] + s[4] for s in stats.values())
+    return inflight, done
+
+
+def settle(devices: list, max_wait: float = 10.0, dirty_kb: int = 4096,
+           drop: bool = True, interval: float = 0.1):
+    # returns seconds spent waiting for the devices to go idle
+    start = time.monotonic()
+    if drop:
+        drop_caches()
+    names = [dev_name(d) for d in devices]
+    _, last_done = _io_state(names)
+    quiet = 0
+    while True:
+        elapsed = time.monotonic() - start
+        if elapsed >= max_wait:
+            logging.warning("Settle: not idle after %.1fs, starting anyway", elapsed)
+            break
+        inflight, done = _io_state(names)
+        if (inflight == 0 and done == last_done
+                and read_dirty() <= dirty_kb and not txgs_busy()):
+            quiet += 1
+            if quiet >= QUIET_POLLS:
+                break
+        else:
+            quiet = 0
+        last_done = done
+        time.sleep(interval)
+    elapsed = round(time.monotonic() - start, 2)
+    logging.info("Settled in %ss", elapsed)
+    return elapsed
@@ -0,0 +1,112 @@
+import math
+
+PCTS = (50, 95, 99)
+
+
+def percentile(sorted_vals, p: float):
+    # linear interpolation between closest ranks, sorted input
+    n = len(sorted_vals)
+    if not n:
+        return 0.0
+    k = (n - 1) * p / 100
+    lo = math.floor(k)
+    hi = min(lo + 1, n - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def summarize(name: str, vals, scale: float = 1.0):
+    # name_min, name_max, name_p50, name_p95, name_p99
+    vals = sorted(v * scale for v in vals)
+    res = {f"{name}_min": round(vals[0], 2) if vals else 0.0,
+           f"{name}_max": round(vals[-1], 2) if vals else 0.0}
+    for p in PCTS:
+        res[f"{name}_p{p}"] = round(percentile(vals, p), 2)
+    return res
+
+
+def mean(vals):
+    return sum(vals) / len(vals) if vals else 0.0
+
+
+def stdev(vals):
+    # sample standard deviation
+    n = len(vals)
+    if n < 2:
+        return 0.0
+    m = mean(vals)
+    return math.sqrt(sum((v - m) ** 2 for v in vals) / (n - 1))
+
+
+def _betacf(a: float, b: float, x: float):
+    # continued fraction of the incomplete beta function (modified Lentz)
+    tiny = 1e-300
+    c, d = 1.0, 1 - (a + b) * x / (a + 1)
+    d = 1 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 300):
+        m2 = 2 * m
+        for aa in (m * (b - m) * x / ((a - 1 + m2) * (a + m2)),
+                   -(a + m) * (a + b + m) * x / ((a + m2) * (a + 1 + m2))):
+            d = 1 + aa * d
+            d = 1 / (d if abs(d) > tiny else tiny)
+            c = 1 + aa / c
+            c = c if abs(c) > tiny else tiny
+            h *= d * c
+        if abs(d * c - 1) < 3e-14:
+            break
+    return h
+
+
+def betainc(a: float, b: float, x: float):
+    # regularized incomplete beta I_x(a, b)
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    bt = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b)
+                  + a * math.log(x) + b * math.log(1 - x))
+    if x < (a + 1) / (a + b + 2):
+        return bt * _betacf(a, b, x) / a
+    return 1 - bt * _betacf(b, a, 1 - x) / b
+
+
+def t_pvalue(t: float, df: float):
+    # two-sided p-value of Student's t
+    return betainc(df / 2, 0.5, df / (df + t * t))
+
+
+def t_quantile(conf: float, df: float):
+    # t such that P(|T| <= t) = conf, by bisection on t_pvalue
+    lo, hi = 0.0, 1.0
+    while t_pvalue(hi, df) > 1 - conf:
+        hi *= 2
+    for _ in range(100):
+        mid = (lo + hi) / 2
+        if t_pvalue(mid, df) > 1 - conf:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+
+def ci_halfwidth(vals, conf: float = 0.95):
+    # half width of the confidence interval on the mean, inf under 2 samples
+    n = len(vals)
+    if n < 2:
+        return math.inf
+    return t_quantile(conf, n - 1) * stdev(vals) / math.sqrt(n)
+
+
+def welch(a, b):
+    # Welch's t-test, unequal variances: (t, df, two-sided p)
+    na, nb = len(a), len(b)
+    if na < 2 or nb < 2:
+        return None, None, None
+    va, vb = stdev(a) ** 2 / na, stdev(b) ** 2 / nb
+    diff = mean(b) - mean(a)
+    if va + vb == 0:
+        return (0.0, na + nb - 2, 1.0) if diff == 0 else (math.inf, na + nb - 2, 0.0)
+    t = diff / math.sqrt(va + vb)
+    # Welch-Satterthwaite
+    df = (va + vb) ** 2 / (va ** 2 / (na - 1) + vb ** 2 / (nb - 1))
+    return t, df, t_pvalue(abs(t), df)
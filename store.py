@@ -0,0 +1,120 @@
+import json
+import sqlite3
+import threading
+import time
+from array import array
+
+# Local result store: one row per finished job, committed right away,
+# plus the per-interval series as packed arrays.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    setname TEXT NOT NULL,
+    jobname TEXT,
+    bs TEXT,
+    qd TEXT,
+    device TEXT,
+    created REAL NOT NULL,
+    row TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_set_job ON results(setname, jobname);
+CREATE INDEX IF NOT EXISTS results_bs_qd ON results(bs, qd);
+CREATE TABLE IF NOT EXISTS zfs_params (
+    digest TEXT PRIMARY KEY,
+    params TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS series (
+    result_id INTEGER NOT NULL REFERENCES results(id),
+    source TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    typecode TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (result_id, source, metric)
+);
+"""
+
+_conns = {}
+_lock = threading.Lock()
+
+
+def open_store(path: str):
+    # one shared connection per db file, writes serialized by _lock
+    with _lock:
+        if path not in _conns:
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            conn.row_factory = sqlite3.Row
+            _conns[path] = conn
+        return _conns[path]
+
+
+def save_result(path: str, setname: str, row: dict, series: dict | None = None):
+    # series: {source: {metric: array}}, e.g. {'sdb': {'r/s': array('d')}}
+    conn = open_store(path)
+    with _lock, conn:
+        cur = conn.execute(
+            "INSERT INTO results (setname, jobname, bs, qd, device, created, row)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (setname, row.get('jobname'), str(row.get('bs')), str(row.get('qd')),
+             row.get('device'), time.time(), json.dumps(row)))
+        rid = cur.lastrowid
+        for source, metrics in (series or {}).items():
+            conn.executemany(
+                "INSERT INTO series (result_id, source, metric, typecode, data)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(rid, source, metric, arr.typecode, arr.tobytes())
+                 for metric, arr in metrics.items()])
+    return rid
+
+
+def delete_results(path: str, setname: str, field: str, value):
+    # rows of a set whose row[field] is value, with their series
+    conn = open_store(path)
+    match = "SELECT id FROM results WHERE setname = ? AND json_extract(row, ?) = ?"
+    args = (setname, f"$.{field}", value)
+    with _lock, conn:
+        conn.execute(f"DELETE FROM series WHERE result_id IN ({match})", args)
+        return conn.execute(f"DELETE FROM results WHERE id IN ({match})", args).rowcount
+
+
+def save_params(path: str, digest: str, params: dict):
+    # static tunables, once per distinct set
+    conn = open_store(path)
+    with _lock, conn:
+        conn.execute("INSERT OR IGNORE INTO zfs_params (digest, params) VALUES (?, ?)",
+                     (digest, json.dumps(params, sort_keys=True)))
+
+
+def query(path: str, setname: str | None = None, jobname: str | None = None,
+          bs: str | None = None, qd: str | None = None):
+    where, params = [], []
+    for col, val in (('setname', setname), ('jobname', jobname),
+                     ('bs', bs), ('qd', qd)):
+        if val is not None:
+            where.append(f"{col} = ?")
+            params.append(str(val))
+    sql = "SELECT id, row FROM results"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id"
+    conn = open_store(path)
+    with _lock:
+        rows = conn.execute(sql, params).fetchall()
+    return [(r['id'], json.loads(r['row'])) for r in rows]
+
+
+def load_series(path: str, result_id: int):
+    conn = open_store(path)
+    with _lock:
+        rows = conn.execute(
+            "SELECT source, metric, typecode, data FROM series WHERE result_id = ?",
+            (result_id,)).fetchall()
+    series = {}
+    for r in rows:
+        arr = array(r['typecode'])
+        arr.frombytes(r['data'])
+        series.setdefault(r['source'], {})[r['metric']] = arr
+    return series
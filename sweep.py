@@ -0,0 +1,69 @@
+import logging
+
+from input import normalizecmds
+from runner import run_job
+
+# Adaptive replacement for the f.sh / tester.sh bs x qd matrix:
+# double iodepth until iops flatten or clat p99 leaves the budget,
+# then bisect between the last two points for the knee.
+
+
+def build_cmd(argv: object, bs: str, qd: int):
+    cmd = (f"fio --name={argv.sweep_rw}_bs{bs}_qd{qd} --rw={argv.sweep_rw} "
+           f"--bs={bs} --iodepth={qd} {argv.fio_opts}")
+    return next(normalizecmds([cmd], argv))
+
+
+def _in_budget(row: dict, argv: object):
+    return argv.lat_budget is None or row['clat_p99_us'] <= argv.lat_budget
+
+
+def sweep_bs(argv: object, bs: str):
+    points = {}
+
+    def run(qd):
+        if qd not in points:
+            points[qd] = run_job(build_cmd(argv, bs, qd), argv)
+            logging.info("Sweep bs=%s qd=%s: %s iops, p99 %sus", bs, qd,
+                         points[qd]['iops'], points[qd]['clat_p99_us'])
+        return points[qd]
+
+    # geometric climb
+    qd, prev = 1, None
+    while qd <= argv.qd_max:
+        row = run(qd)
+        if not _in_budget(row, argv):
+            break
+        if prev and row['iops'] < points[prev]['iops'] * (1 + argv.gain):
+            break
+        prev, qd = qd, qd * 2
+
+    # knee: smallest in-budget qd within --gain of the best in-budget iops
+    good = [q for q in points if _in_budget(points[q], argv)]
+    if not good:
+        logging.warning("Sweep bs=%s: qd=1 already over the latency budget", bs)
+        return points, None
+    target = max(points[q]['iops'] for q in good) * (1 - argv.gain)
+    hi = min(q for q in good if points[q]['iops'] >= target)
+    lo = max((q for q in points if q < hi), default=hi)
+
+    # refine between the last two points around the bend
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        row = run(mid)
+        if _in_budget(row, argv) and row['iops'] >= target:
+            hi = mid
+        else:
+            lo = mid
+    logging.info("Sweep bs=%s: knee at qd=%s (%s iops, p99 %sus) after %s runs",
+                 bs, hi, points[hi]['iops'], points[hi]['clat_p99_us'], len(points))
+    return points, hi
+
+
+def run_sweep(argv: object):
+    out = []
+    for bs in argv.sweep_bs:
+        points, knee = sweep_bs(argv, bs)
+        for qd in sorted(points):
+            out.append({**points[qd], 'knee': qd == knee})
+    return out
@@ -0,0 +1,74 @@
+import os
+import socket
+import stat
+import sys
+
+import cluster
+from store import load_series, query
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+# fio stand-in: --server listens, --client prints client_stats, latency
+# bins only when asked for json+
+FIO = f"""#!{sys.executable}
+import json, socket, sys
+sys.path.insert(0, {REPO!r})
+from bench import fio_output
+opts = dict(a[2:].partition('=')[::2] for a in sys.argv[1:] if a.startswith('--'))
+if 'server' in opts:
+    s = socket.socket()
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    s.bind(('127.0.0.1', int(opts['server'].split(',')[1])))
+    s.listen()
+    while True:
+        s.accept()[0].close()
+host, port = opts['client'].split(',')
+with open(sys.argv[-1] + '.' + port, 'w') as f:
+    f.write(' '.join(sys.argv[1:]))
+bins = 10 if opts['output-format'] == 'json+' else 0
+doc = json.loads(fio_output(2, bins, int(port)).split('\\nbench_randrw_0:')[0])
+doc['client_stats'] = doc.pop('jobs')
+print(json.dumps(doc))
+"""
+
+
+def _free_port():
+    # two consecutive ports for the two servers
+    while True:
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        try:
+            with socket.socket() as s:
+                s.bind(('127.0.0.1', port + 1))
+            return port
+        except OSError:
+            continue
+
+
+def test_localhost_servers(tmp_path, monkeypatch):
+    fio = tmp_path / "bin" / "fio"
+    fio.parent.mkdir()
+    fio.write_text(FIO)
+    fio.chmod(fio.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv("PATH", f"{fio.parent}:{os.environ['PATH']}")
+    procs, hosts = cluster.start_servers(2, _free_port())
+
+    class Argv:
+        local_servers = 0
+        logdir = str(tmp_path)
+        runtime = 5
+        db = str(tmp_path / "r.db")
+        setname = "c"
+    Argv.hosts = hosts
+    try:
+        rows = cluster.run_hosts([["fio", "--name=t", "--rw=randrw", "--bs=4k"]], Argv)
+    finally:
+        cluster.stop_servers(procs)
+    assert [r['host'] for r in rows] == ["all", *(f"{h}:{p}" for h, p in hosts)]
+    assert rows[0]['hosts'] == 2 and rows[0]['fio_jobs'] == 4
+    for _, port in hosts:
+        argv = next(tmp_path.glob(f"*.fio.{port}")).read_text().split()
+        assert "--output-format=json+" in argv
+    # the aggregate histogram is merged from the hosts' json+ bins
+    rid, _ = query(Argv.db, "c")[0]
+    assert load_series(Argv.db, rid)['hist']['clat_read']
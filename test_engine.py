@@ -0,0 +1,34 @@
+import json
+
+import engine
+import timeline
+
+
+def test_interval_logs_use_fio_names(tmp_path, capsys):
+    target = tmp_path / "sparse.bin"
+    prefix = str(tmp_path / "job")
+    rc = engine.main(["--name=t", f"--filename={target}", "--rw=randread", "--bs=4k",
+                      "--size=1M", "--iodepth=2", "--runtime=0.3", "--time_based",
+                      *timeline.fio_log_args(prefix, 0.05)])
+    assert rc == 0
+    # laid out sparse, never written
+    assert target.stat().st_size == 1 << 20
+    assert target.stat().st_blocks == 0
+    doc = json.loads(capsys.readouterr().out.splitlines()[0])
+    assert doc['jobs'][0]['read']['total_ios'] > 0
+    names = sorted(p.name for p in tmp_path.glob("job_*.log"))
+    assert names == ["job_bw.1.log", "job_clat.1.log", "job_iops.1.log",
+                     "job_lat.1.log", "job_slat.1.log"]
+    # what the timeline reads for fio runs
+    t, v = timeline.read_fio_log(prefix, 'clat', 0.0, 0.05, True)
+    assert len(t) and all(x > 0 for x in v)
+
+
+def test_random_job_stops_after_size(tmp_path, capsys):
+    # no runtime, not time_based: done after size bytes like fio
+    rc = engine.main(["--name=t", f"--filename={tmp_path / 'f.bin'}", "--rw=randrw",
+                      "--bs=4k", "--size=1M", "--iodepth=4", "--numjobs=2"])
+    assert rc == 0
+    doc = json.loads(capsys.readouterr().out.splitlines()[0])
+    for job in doc['jobs']:
+        assert job['read']['total_ios'] + job['write']['total_ios'] == 256
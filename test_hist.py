@@ -0,0 +1,55 @@
+import csv
+
+import hist
+import iotester
+from store import save_result
+
+
+def test_bucket_matches_fio_indices():
+    # exact below 128 ns
+    for ns in (0, 1, 63, 64, 127):
+        assert hist.bucket(ns) == ns
+        assert hist.bucket_value(ns) == ns
+    # first log group: 2 ns wide from 128, 4 ns from 256
+    assert [hist.bucket(ns) for ns in (128, 129, 130, 255, 256, 259, 260)] == \
+        [128, 128, 129, 191, 192, 192, 193]
+    assert [hist.bucket_value(i) for i in (128, 129, 191, 192)] == [129, 131, 255, 258]
+    # past the last group everything lands in the top bucket
+    assert hist.bucket(1 << 62) == hist.PLAT_NR - 1
+
+
+def test_bucket_value_within_fio_error():
+    for ns in (1000, 12345, 10 ** 6, 987654321):
+        assert abs(hist.bucket_value(hist.bucket(ns)) - ns) / ns < 1 / hist.PLAT_VAL
+
+
+def test_merge_adds_counts():
+    a = hist.from_bins({"100": 3, "5000": 1}, 'us')
+    b = hist.from_bins({"100": 2, "200": 4, "5000": 0})
+    m = hist.merge(a, b)
+    assert sum(m.values()) == 10
+    assert m[hist.bucket(100 * 1000)] == 3 and m[hist.bucket(100)] == 2
+    assert hist.from_array(hist.to_array(m)) == m
+
+
+def _save(db, device, bins):
+    h = hist.from_bins(bins, 'us')
+    return save_result(db, "s", {'jobname': "s_a", 'device': device, **hist.summary({'read_clat': h})},
+                       {'hist': {'read_clat': hist.to_array(h)}})
+
+
+def test_export_merge_uses_combined_samples(tmp_path, capsys):
+    db = str(tmp_path / "r.db")
+    # sda has a 10 ms tail in 2 of 100, sdb none: averaging the p99s gives
+    # ~5 ms, the 200 combined samples have their p99 at 100 us
+    _save(db, "sda", {"100": 98, "10000": 2})
+    _save(db, "sdb", {"100": 100})
+    iotester.main(["export", "--merge", "--db", db, "-n", "s"])
+    lines = capsys.readouterr().out.splitlines()
+    rows = list(csv.DictReader(lines[1:-1]))
+    assert len(rows) == 1
+    row = rows[0]
+    assert row['runs'] == "2" and row['device'] == "sda,sdb" and row['read_clat_n'] == "200"
+    us = lambda v: str(round(hist.bucket_value(hist.bucket(v * 1000)) / 1000, 3))
+    assert row['read_clat_p99_us'] == us(100)
+    assert row['read_clat_p99_9_us'] == us(10000)
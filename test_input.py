@@ -0,0 +1,37 @@
+import pytest
+
+import input
+
+
+def test_trailing_comments_are_dropped():
+    text = "fio --name=a --bs=4k  # small blocks\n# whole line\nfio --name=b \\\n  --rw=read # seq\n"
+    assert input.parse_lines(text) == [["fio", "--name=a", "--bs=4k"],
+                                       ["fio", "--name=b", "--rw=read"]]
+
+
+def test_empty_matrix_is_an_error():
+    assert input._matrix_values("{1..8:x2}") == ["1", "2", "4", "8"]
+    for val in ("{8..1}", "{}", "{ , }"):
+        with pytest.raises(ValueError):
+            input._matrix_values(val)
+
+
+def test_getjobs_rejects_bad_matrix_up_front(tmp_path):
+    jobfile = tmp_path / "jobs.txt"
+    jobfile.write_text("fio --name=a\nfio --name=b --iodepth={128..1}\n")
+
+    class Argv:
+        pass
+    Argv.jobfile = str(jobfile)
+    assert list(input.getjobs(Argv)) == []
+
+
+def test_plan_cache_keyed_by_parser(tmp_path):
+    text = "[a]\nrw=read\n"
+    lines, ini = tmp_path / "jobs.txt", tmp_path / "jobs.fio"
+    lines.write_text(text)
+    ini.write_text(text)
+    assert input.load_plan(str(ini), str(tmp_path)) == [["fio", "--name=a", "--rw=read"]]
+    # same bytes, other parser: not the cached ini plan
+    assert input.load_plan(str(lines), str(tmp_path)) == [["[a]"], ["rw=read"]]
+    assert input.load_plan(str(ini), str(tmp_path)) == [["fio", "--name=a", "--rw=read"]]
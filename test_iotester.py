@@ -0,0 +1,9 @@
+import iotester
+
+
+def test_lower_better_columns():
+    for m in ('clat_p99_us', 'slat_avg_us', 'lat_avg_us', 'sync_p95_ms', 'clat_ratio',
+              'ts_fio_clat_us', 'ts_txg_sync_clat_ratio'):
+        assert iotester._lower_better(m), m
+    for m in ('iops', 'iops_mslat', 'arc_hit_pct', 'ts_fio_iops'):
+        assert not iotester._lower_better(m), m
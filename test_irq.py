@@ -0,0 +1,75 @@
+import irq
+
+INTERRUPTS = """           CPU0       CPU1       CPU2       CPU3
+ 24:        100          0          0          0  PCI-MSI 524288-edge      nvme0q0
+ 25:       {q1}          0          0          0  PCI-MSI 524289-edge      nvme0q1
+ 26:          0          0       {q2}          0  PCI-MSI 524290-edge      nvme0q2
+ 30:          5       {eth}         5          5  PCI-MSI 1-edge      eth0
+NMI:          1          1          1          1   Non-maskable interrupts
+ERR:          0
+"""
+SOFTIRQS = """                    CPU0       CPU1       CPU2       CPU3
+          HI:          0          0          0          0
+       BLOCK:       {b0}          0       {b2}          0
+"""
+# cpuN user nice system idle iowait irq softirq steal
+STAT = """cpu  0 0 0 0 0 0 0 0
+cpu0 100 0 100 {idle} 0 {irq} {soft} 0
+cpu1 100 0 100 {idle} 0 0 0 0
+cpu2 100 0 100 {idle} 0 {irq2} 0 0
+cpu3 100 0 100 {idle} 0 0 0 0
+intr 12345
+"""
+
+
+def _snapshot(tmp_path, tag, t, **v):
+    files = {}
+    for name, text in (("interrupts", INTERRUPTS), ("softirqs", SOFTIRQS), ("stat", STAT)):
+        files[name] = tmp_path / f"{name}.{tag}"
+        files[name].write_text(text.format(**v))
+    return {'t': t, 'irq': irq.read_counts(files["interrupts"]),
+            'soft': irq.read_counts(files["softirqs"]), 'stat': irq.read_cpu_irq(files["stat"])}
+
+
+def _before_after(tmp_path, monkeypatch):
+    # cores 0-1 on node 0, 2-3 on node 1, the device on node 0
+    monkeypatch.setattr(irq, "cpu_nodes", lambda: {0: 0, 1: 0, 2: 1, 3: 1})
+    monkeypatch.setattr(irq, "dev_node", lambda d: 0)
+    before = _snapshot(tmp_path, "0", 10.0, q1=1000, q2=500, eth=5, b0=100, b2=50,
+                       idle=800, irq=0, soft=0, irq2=0)
+    # 2 s later: nvme0q1 on cpu0, nvme0q2 on cpu2, cpu0 40% in irq + softirq
+    after = _snapshot(tmp_path, "1", 12.0, q1=3000, q2=1500, eth=25, b0=500, b2=250,
+                      idle=860, irq=30, soft=10, irq2=10)
+    return before, after
+
+
+def test_read_counts_pads_single_count_rows(tmp_path):
+    path = tmp_path / "interrupts"
+    path.write_text(INTERRUPTS.format(q1=1, q2=2, eth=3))
+    cpus, rows = irq.read_counts(path)
+    assert cpus == [0, 1, 2, 3]
+    assert rows['25'] == ([1, 0, 0, 0], "PCI-MSI 524289-edge nvme0q1")
+    assert rows['ERR'] == ([0, 0, 0, 0], "")
+
+
+def test_job_irq_rates_and_flags(tmp_path, monkeypatch, caplog):
+    before, after = _before_after(tmp_path, monkeypatch)
+    row, series = irq.job_irq(before, after, "nvme", ["/dev/nvme0n1"])
+    assert sorted(series['irq']) == ["25:nvme0q1", "26:nvme0q2"]
+    assert list(series['irq']["25:nvme0q1"]) == [1000.0, 0.0, 0.0, 0.0]
+    assert row['irq_rate'] == 1500.0 and row['irq_cores'] == 2
+    assert row['irq_imbalance'] == 1.33
+    assert row['irq_hot_cores'] == "0" and row['irq_max_core_pct'] == 40.0
+    # nvme0q2 is served on node 1
+    assert row['irq_cross_numa'] == 1 and "26:nvme0q2" in caplog.text
+    assert row['softirq_block_rate'] == 300.0
+
+
+def test_job_irq_without_match_takes_every_vector(tmp_path, monkeypatch):
+    before, after = _before_after(tmp_path, monkeypatch)
+    row, series = irq.job_irq(before, after)
+    assert sorted(series['irq']) == ["25:nvme0q1", "26:nvme0q2", "30:eth0"]
+    assert row['irq_cores'] == 3 and row['irq_rate'] == 1510.0
+    # no interval, no rates
+    row, series = irq.job_irq(before, before)
+    assert series['irq'] == {} and row['irq_rate'] == 0.0 and row['irq_imbalance'] == 0.0
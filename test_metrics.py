@@ -0,0 +1,49 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+import metrics
+from sampler import new_sampler, store_sample
+
+
+def _live():
+    live = metrics.new_live("s", planned=3)
+    sampler = new_sampler(["sdz"], 1.0, 10)
+    dev0 = {'sdz': [0] * 11}
+    # 100 reads, 50 writes of 8 sectors in one second, busy half of it
+    dev1 = {'sdz': [100, 0, 800, 200, 50, 0, 400, 100, 0, 500, 300]}
+    store_sample(sampler, 1.0, [0] * 8, [10, 0, 10, 80, 0, 0, 0, 0], dev0, dev1, 1.0)
+    metrics.job_started(live, "k", "s_read", sampler, None)
+    return live
+
+
+def test_scrape_over_http():
+    live = _live()
+    server = metrics.start_metrics(live, "127.0.0.1", 0)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(url + "/metrics", timeout=5) as r:
+            assert r.headers['Content-Type'] == metrics.CONTENT_TYPE
+            body = r.read().decode()
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(url + "/other", timeout=5)
+        assert e.value.code == 404
+    finally:
+        metrics.stop_metrics(server)
+    lines = body.splitlines()
+    assert 'iotester_jobs_planned{set="s"} 3' in lines
+    assert 'iotester_jobs_running{set="s"} 1' in lines
+    assert 'iotester_device_iops{set="s",device="sdz",job="s_read",dir="read"} 100.0' in lines
+    assert 'iotester_device_util_percent{set="s",device="sdz",job="s_read"} 50.0' in lines
+    assert "# TYPE iotester_device_iops gauge" in lines
+
+
+def test_progress_after_a_job():
+    live = _live()
+    metrics.job_done(live, "k")
+    text = metrics.render(live)
+    assert 'iotester_jobs_done{set="s"} 1' in text
+    assert 'iotester_jobs_running{set="s"} 0' in text
+    assert "iotester_eta_seconds" in text
+    assert "iotester_device_iops" not in text
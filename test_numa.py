@@ -0,0 +1,25 @@
+import numa
+
+
+def test_documented_command_line():
+    # python numa.py -d /dev/sdb mpt3sas --apply
+    args = numa.parse_args(["-d", "/dev/sdb", "mpt3sas", "--apply"])
+    assert args.devices == ["/dev/sdb"]
+    assert args.match == "mpt3sas" and args.apply
+    args = numa.parse_args(["-d", "/dev/sdb", "-d", "/dev/sdc", "nvme"])
+    assert args.devices == ["/dev/sdb", "/dev/sdc"] and args.match == "nvme"
+
+
+INTERRUPTS = """           CPU0       CPU1       CPU2       CPU3
+  24:        10          0          0          0  IR-PCI-MSI 1-edge      mpt3sas0-msix0
+  25:         0         20          0          0  IR-PCI-MSI 2-edge      mpt3sas0-msix1
+  26:         5          5          5          5  IR-PCI-MSI 3-edge      eth0
+  27:         0          0         30          0  IR-PCI-MSI 4-edge      mpt3sas0-msix2
+ NMI:         0          0          0          0   Non-maskable interrupts
+"""
+
+
+def test_irq_plan_round_robin(tmp_path):
+    path = tmp_path / "interrupts"
+    path.write_text(INTERRUPTS)
+    assert numa.irq_plan("mpt3sas", [2, 3], str(path)) == {'24': 2, '25': 3, '27': 2}
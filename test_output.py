@@ -0,0 +1,23 @@
+import bench
+import output
+
+
+def test_job_cpu_is_runtime_weighted():
+    jobs = [{'usr_cpu': 10.0, 'job_runtime': 3000}, {'usr_cpu': 50.0, 'job_runtime': 1000}]
+    # (10 x 3 + 50 x 1) / 4, not 60
+    assert output.job_cpu(jobs, 'usr_cpu') == 20.0
+    assert output.job_cpu([{'sys_cpu': 4.0}, {'sys_cpu': 2.0}], 'sys_cpu') == 3.0
+
+
+def test_split_drops_unread_sections():
+    out = bench.fio_output(2, 10)
+    fio_json, _ = output.split_fio_output(out)
+    job = fio_json['jobs'][0]
+    assert not output.FIO_SKIP & set(job)
+    assert 'bins' not in job['read']['clat_ns'] and job['read']['clat_ns']['percentile']
+    # the runner keeps the json+ bins for the histograms
+    fio_json, _ = output.split_fio_output(out, output.HIST_SKIP)
+    assert fio_json['jobs'][1]['write']['clat_ns']['bins']
+    assert 'iodepth_level' not in fio_json['jobs'][1]
+    # nothing dropped
+    assert 'latency_us' in output.split_fio_output(out, frozenset())[0]['jobs'][0]
@@ -0,0 +1,88 @@
+import os
+
+import precondition
+
+
+class Argv:
+    precond_bs = "64k"
+    precond_writers = 2
+    precond_steady = 0
+    raw = False
+    filesize = "1M"
+
+
+def _argv(tmp_path):
+    argv = Argv()
+    argv.logdir = str(tmp_path / "logs")
+    argv.filename = str(tmp_path / "target")
+    return argv
+
+
+def test_interrupted_fill_resumes(tmp_path, monkeypatch):
+    argv = _argv(tmp_path)
+    total = precondition.target_size(argv.filename, False, argv.filesize)
+    fill_region = precondition._fill_region
+
+    def half(fd, buf, start, end, done, i, stop):
+        # stopped halfway through every region
+        fill_region(fd, buf, start, start + (end - start) // 2, done, i, stop)
+    monkeypatch.setattr(precondition, "_fill_region", half)
+    assert not precondition.fill(argv.filename, total, argv)
+    state = precondition.load_state(argv.logdir, argv.filename, total,
+                                    precondition.regions(total, 2, 64 << 10))
+    assert state['done'] == [256 << 10, 768 << 10]
+
+    starts = []
+
+    def spy(fd, buf, start, end, done, i, stop):
+        starts.append(done[i])
+        fill_region(fd, buf, start, end, done, i, stop)
+    monkeypatch.setattr(precondition, "_fill_region", spy)
+    assert precondition.fill(argv.filename, total, argv)
+    # picked up at the saved marks, not from 0
+    assert sorted(starts) == [256 << 10, 768 << 10]
+    assert precondition.verify(argv.filename, total, argv)
+
+
+def test_failed_verify_starts_over(tmp_path):
+    argv = _argv(tmp_path)
+    assert precondition.precondition(argv)
+    state = precondition._state_path(argv.logdir, argv.filename)
+    assert os.path.exists(state)
+    # a region start the verify always reads, no longer stamped
+    with open(argv.filename, 'r+b') as f:
+        f.seek(512 << 10)
+        f.write(bytes(precondition.SECTOR))
+    assert not precondition.precondition(argv)
+    assert not os.path.exists(state)
+    # the next run lays the target out again
+    assert precondition.precondition(argv)
+
+
+def test_regions_cover_the_target_chunk_aligned():
+    spans = precondition.regions(1 << 20, 3, 64 << 10)
+    assert spans[0][0] == 0 and spans[-1][1] == 1 << 20
+    assert all(e == s2 for (_, e), (s2, _) in zip(spans, spans[1:]))
+    assert all(s % (64 << 10) == 0 for s, _ in spans)
+    # files rounded up to whole sectors
+    assert precondition.target_size("x", False, "5000") == 8192
+
+
+def test_steady_state_window():
+    assert not precondition.ss_reached([100] * (precondition.SS_WINDOW - 1))
+    assert precondition.ss_reached([500, 300, 100, 102, 99, 101, 100])
+    # still falling: inside the range but the slope is too steep
+    assert not precondition.ss_reached([110, 107, 104, 101, 98])
+    assert not precondition.ss_reached([100, 50, 100, 50, 100])
+
+
+def test_stale_state_is_ignored(tmp_path):
+    argv = _argv(tmp_path)
+    total = 1 << 20
+    spans = precondition.regions(total, 2, 64 << 10)
+    precondition.save_state(argv.logdir, {'path': argv.filename, 'size': total,
+                                          'regions': [list(s) for s in spans],
+                                          'done': [512 << 10, 1 << 20], 'filled': True})
+    # the target is gone, the marks mean nothing
+    state = precondition.load_state(argv.logdir, argv.filename, total, spans)
+    assert state['done'] == [0, 512 << 10] and not state['filled']
@@ -0,0 +1,166 @@
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from array import array
+from types import SimpleNamespace
+
+import pytest
+
+import params
+import runner
+from input import getjobs, normalizecmds
+from store import query
+
+
+def test_harness_usage_leaves_out_children(tmp_path):
+    # 8 MB written by a reaped child is fio's, not the harness'
+    target = tmp_path / "child.bin"
+    before = runner.harness_usage()
+    subprocess.run(["dd", "if=/dev/zero", f"of={target}", "bs=1M", "count=8",
+                    "oflag=direct", "status=none"], check=True)
+    after = runner.harness_usage()
+    assert after[2] - before[2] < 1 << 20
+
+
+def test_db_defaults_under_logdir(tmp_path, monkeypatch):
+    monkeypatch.setattr(params, "is_block_device", lambda p: True)
+    base = ["-j", "jobs.txt", "-n", "s", "-f", str(tmp_path / "tf"), "-s", "1G",
+            "-t", "10", "-d", "/dev/fake"]
+    args = params.parse_args(base + ["-l", str(tmp_path / "run")])
+    assert args.db == str(tmp_path / "run" / params.DB_NAME)
+    assert params.parse_args(base + ["--db", ""]).db == ""
+    assert params.parse_compare_args(["a", "b", "-l", "x"]).db == os.path.join("x", params.DB_NAME)
+
+
+def test_check_logdir_warns_on_db_next_to_target(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(params, "is_block_device", lambda p: True)
+    (tmp_path / "data").mkdir()
+    args = params.parse_args(["-j", "jobs.txt", "-n", "s", "-f", str(tmp_path / "data" / "tf"),
+                              "-s", "1G", "-t", "10", "-d", "/dev/fake",
+                              "-l", str(tmp_path / "run"),
+                              "--db", str(tmp_path / "data" / "results.db")])
+    runner.check_logdir(args)
+    # everything in tmp_path shares the target's filesystem
+    assert "db " in caplog.text and "logdir " in caplog.text
+
+
+def test_fio_gets_every_cpu_back_when_only_the_harness_is_pinned(monkeypatch):
+    place = {'numa_cpus': "2-3"}
+    assert runner.cpus_arg(["fio"], None) == []
+    assert runner.cpus_arg(["fio"], place) == ["--cpus_allowed=2-3"]
+    monkeypatch.setattr(runner, "_fio_cpus", [0, 1, 2, 3, 8])
+    # --numa=off: no placement, fio is not left on the harness cores
+    assert runner.cpus_arg(["fio"], None) == ["--cpus_allowed=0-3,8"]
+    assert runner.cpus_arg(["fio", "--cpus_allowed=5"], None) == []
+
+
+def test_run_jobs_on_stub_fio(tmp_path, stub_fio):
+    jobfile = tmp_path / "jobs.txt"
+    jobfile.write_text("fio --name=a --rw=read\nfio --name=b --rw=write\n")
+    for mode, extra in (("serial", []), ("parallel", ["--raw", "-m", "parallel"]),
+                        ("fanout", ["--raw", "-m", "fanout"])):
+        args = params.parse_args(["-j", str(jobfile), "-n", mode, "-f", str(tmp_path / "tf"),
+                                  "-s", "1G", "-t", "10", "-d", "/dev/stub0,/dev/stub1",
+                                  "-l", str(tmp_path / "logs"), "--db", "", *extra])
+        cmds = list(normalizecmds(getjobs(args), args))
+        rows = runner.run_jobs(cmds, args)
+        per_job = 1 if mode == "serial" else 2
+        assert sorted(r['jobname'] for r in rows) == sorted([f"{mode}_a", f"{mode}_b"] * per_job)
+        assert all(r['iops'] > 0 for r in rows)
+
+
+def test_timeout_kills_a_command_ignoring_sigint(monkeypatch):
+    monkeypatch.setattr(runner, "KILL_GRACE", 0.5)
+    cmd = [sys.executable, "-c", "import signal, time; "
+           "signal.signal(signal.SIGINT, signal.SIG_IGN); print('up', flush=True); time.sleep(60)"]
+    rc, out, err = asyncio.run(runner.run_cmd(cmd, timeout=0.5))
+    assert rc == -signal.SIGKILL
+    assert out == "up\n" and "Timeout after 0.5s" in err
+
+
+def _run_args(tmp_path, jobfile, *extra):
+    return params.parse_args(["-j", str(jobfile), "-n", "s", "-f", str(tmp_path / "tf"),
+                              "-s", "1G", "-t", "10", "-d", "/dev/stub0", "-i", "0.1",
+                              "-l", str(tmp_path / "logs"), *extra])
+
+
+def test_steady_state_stops_fio(tmp_path, stub_fio, monkeypatch):
+    # fio would run 30s, the window is flat from the third sample
+    monkeypatch.setenv("STUB_FIO_SLEEP", "30")
+    monkeypatch.setattr(runner, "window_cv",
+                        lambda s, metric, n: 0.01 if s['count'] >= 3 else None)
+    jobfile = tmp_path / "jobs.txt"
+    jobfile.write_text("fio --name=a --rw=read\n")
+    args = _run_args(tmp_path, jobfile, "--steady", "--db", "")
+    t0 = time.monotonic()
+    rows = runner.run_jobs(list(normalizecmds(getjobs(args), args)), args)
+    assert time.monotonic() - t0 < 10
+    assert rows[0]['ss_reached'] is True
+    assert 0.2 <= rows[0]['ss_time_s'] < 5
+    # SIGINT, fio still reported
+    assert rows[0]['iops'] > 0
+
+
+def test_steady_run_without_fio_fails_only_the_job(tmp_path, stub_fio, monkeypatch):
+    monkeypatch.setenv("PATH", str(tmp_path / "nowhere"))
+    jobfile = tmp_path / "jobs.txt"
+    jobfile.write_text("fio --name=a --rw=read\nfio --name=b --rw=write\n")
+    args = _run_args(tmp_path, jobfile, "--steady", "--db", "")
+    cmds = list(normalizecmds(getjobs(args), args))
+    capture = asyncio.run(runner.measure_job(cmds[0], args))
+    assert capture['out_fio'] == ""
+    # sampler stopped on the way out
+    assert capture['sampler']['stop'].is_set()
+    # both jobs tried, both skipped, the run itself goes on
+    assert runner.run_jobs(cmds, args) == []
+
+
+def test_repeat_until_ci(tmp_path, stub_fio):
+    # stub runs are 0%, 1%, 2% apart: a 5% target is met at the minimum
+    jobfile = tmp_path / "jobs.txt"
+    jobfile.write_text("fio --name=a --rw=read\n")
+    db = str(tmp_path / "r.db")
+    args = _run_args(tmp_path, jobfile, "--repeat-min", "3", "--repeat-max", "6",
+                     "--ci-target", "0.05", "--db", db)
+    rows = runner.run_jobs(list(normalizecmds(getjobs(args), args)), args)
+    assert len(rows) == 1
+    row = rows[0]
+    assert row['repeats'] == 3 and row['ci_met'] is True
+    stored = [r for _, r in query(db, "s") if 'repeat' in r]
+    assert [r['repeat'] for r in stored] == [0, 1, 2]
+    assert row['iops'] == pytest.approx(sum(r['iops'] for r in stored) / 3, abs=1e-3)
+    assert row['iops_ci_pct'] > 0
+    # unreachable target: every allowed repeat, flagged
+    args.ci_target = 1e-6
+    row = runner.run_jobs(list(normalizecmds(getjobs(args), args)), args)[0]
+    assert row['repeats'] == 6 and row['ci_met'] is False
+
+
+def test_wait_steady_waits_for_a_flat_window():
+    # r/s per sample: noisy first, flat from sample 4; window of 3 samples
+    series = [100, 300, 100, 300, 200, 200, 200, 200, 200, 200]
+    state = {'count': 0, 't': array('d', range(len(series))),
+             'dev': {'sda': {'r/s': array('d', series), 'w/s': array('d', bytes(8 * len(series)))}}}
+    argv = SimpleNamespace(ss_window=0.03, interval=0.01, ss_metric='iops', ss_cv=0.05)
+
+    async def scenario(cmd, samples):
+        proc = await asyncio.create_subprocess_exec(*cmd)
+
+        async def feed():
+            for _ in range(samples):
+                state['count'] += 1
+                await asyncio.sleep(0.01)
+        feeder = asyncio.create_task(feed())
+        res = await runner.wait_steady(proc, state, argv)
+        await feeder
+        return res, await proc.wait()
+
+    (reached, t), rc = asyncio.run(scenario(["sleep", "30"], len(series)))
+    assert reached is True and t >= 6
+    assert rc == -signal.SIGINT
+    # fio done before a full window: no steady state
+    state['count'] = 0
+    assert asyncio.run(scenario(["true"], 2))[0] == (False, None)
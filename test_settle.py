@@ -0,0 +1,66 @@
+import functools
+
+import sampler
+import settle
+
+MEMINFO = "MemTotal:       16000000 kB\nDirty:              1200 kB\nWriteback:           300 kB\n"
+TXGS = """txg      birth            state ndirty       nread        nwritten     reads    writes   otime        qtime        wtime        stime
+100      5000000000       C     1048576      0            1048576      0        8        100          10           10           2000
+101      5100000000       {s}     0            0            0            0        0        0            0            0            0
+"""
+
+
+def _diskstats(rd, wr, inflight):
+    # major minor name, then rd_ios .. time_in_queue and the discard/flush fields
+    return f"   8       0 sda {rd} 0 {rd * 8} 10 {wr} 0 {wr * 8} 5 {inflight} 20 15 0 0 0 0\n"
+
+
+def _fake_proc(tmp_path, monkeypatch, states):
+    # every _io_state poll reads the next diskstats line, the last one repeats
+    disk = tmp_path / "diskstats"
+    meminfo = tmp_path / "meminfo"
+    meminfo.write_text(MEMINFO)
+    polls = iter(states)
+
+    def read_diskstats(names):
+        disk.write_text(_diskstats(*next(polls, states[-1])))
+        return sampler.read_diskstats(names, str(disk))
+    monkeypatch.setattr(settle, "read_diskstats", read_diskstats)
+    monkeypatch.setattr(settle, "read_dirty", functools.partial(settle.read_dirty, str(meminfo)))
+    monkeypatch.setattr(settle, "txgs_busy",
+                        functools.partial(settle.txgs_busy, str(tmp_path / "*" / "txgs")))
+
+
+def test_read_dirty_and_txgs(tmp_path):
+    (tmp_path / "meminfo").write_text(MEMINFO)
+    assert settle.read_dirty(str(tmp_path / "meminfo")) == 1500
+    pool = tmp_path / "tank"
+    pool.mkdir()
+    (pool / "txgs").write_text(TXGS.format(s="O"))
+    assert not settle.txgs_busy(str(tmp_path / "*" / "txgs"))
+    (pool / "txgs").write_text(TXGS.format(s="S"))
+    assert settle.txgs_busy(str(tmp_path / "*" / "txgs"))
+
+
+def test_settles_once_the_device_goes_quiet(tmp_path, monkeypatch):
+    # baseline, two polls still completing ios, one with ios in flight, then idle
+    _fake_proc(tmp_path, monkeypatch, [(100, 50, 0), (110, 50, 0), (120, 55, 0),
+                                       (120, 55, 2), (120, 55, 0)])
+    polls = []
+    monkeypatch.setattr(settle.time, "sleep", lambda s: polls.append(s))
+    assert settle.settle(["/dev/sda"], drop=False, interval=0.01) < 1
+    # 3 busy polls, then QUIET_POLLS in a row, no sleep after the last
+    assert len(polls) == 3 + settle.QUIET_POLLS - 1
+
+
+def test_busy_device_gives_up_at_max_wait(tmp_path, monkeypatch, caplog):
+    _fake_proc(tmp_path, monkeypatch, [(100, 50, 4)])
+    waited = settle.settle(["/dev/sda"], max_wait=0.2, drop=False, interval=0.01)
+    assert 0.2 <= waited < 2
+    assert "not idle" in caplog.text
+
+
+def test_dirty_pages_keep_it_busy(tmp_path, monkeypatch):
+    _fake_proc(tmp_path, monkeypatch, [(100, 50, 0)])
+    assert settle.settle(["/dev/sda"], max_wait=0.2, dirty_kb=1000, drop=False,
+                         interval=0.01) >= 0.2
@@ -0,0 +1,38 @@
+import math
+
+import pytest
+
+import stats
+
+# Welch's t-test example (Wikipedia), reference t=2.46, df=24.99, p=0.021
+A1 = [27.5, 21.0, 19.0, 23.6, 17.0, 17.9, 16.9, 20.1, 21.9, 22.6, 23.1, 19.6, 19.0, 21.7, 21.4]
+A2 = [27.1, 22.0, 20.8, 23.4, 23.4, 23.5, 25.8, 22.0, 24.8, 20.2, 21.9, 22.1, 22.9, 20.5, 24.4]
+
+
+def test_betainc_closed_form():
+    # I_0.4(2, 3) = 6 x^2 (1-x)^2 + 4 x^3 (1-x) + x^4
+    assert stats.betainc(2, 3, 0.4) == pytest.approx(0.5248, abs=1e-9)
+    assert stats.betainc(2, 3, 0.0) == 0.0 and stats.betainc(2, 3, 1.0) == 1.0
+
+
+def test_t_table_values():
+    # two sided: t_quantile(0.95, df) is the 0.975 one sided quantile
+    assert stats.t_quantile(0.95, 10) == pytest.approx(2.228, abs=1e-3)
+    assert stats.t_quantile(0.99, 3) == pytest.approx(5.841, abs=1e-3)
+    assert stats.t_pvalue(2.228, 10) == pytest.approx(0.05, abs=1e-4)
+    assert stats.t_pvalue(0.0, 7) == pytest.approx(1.0)
+
+
+def test_ci_halfwidth():
+    # sd 1.581, se 0.707, x 2.776 (df 4)
+    assert stats.ci_halfwidth([1, 2, 3, 4, 5], 0.95) == pytest.approx(1.963, abs=1e-3)
+    assert stats.ci_halfwidth([5], 0.95) == math.inf
+
+
+def test_welch_reference():
+    t, df, p = stats.welch(A1, A2)
+    # new minus base
+    assert t == pytest.approx(2.46, abs=0.01)
+    assert df == pytest.approx(24.99, abs=0.01)
+    assert p == pytest.approx(0.021, abs=1e-3)
+    assert stats.welch([1.0], A2) == (None, None, None)
@@ -0,0 +1,51 @@
+import iotester
+import params
+import sweep
+
+
+def test_sweep_creates_a_new_logdir(tmp_path, stub_fio, capsys):
+    logdir = tmp_path / "new" / "logs"
+    rc = iotester.main(["sweep", "--bs", "4k", "--qd-max", "4", "-n", "sw",
+                        "-f", str(tmp_path / "tf"), "-s", "1G", "-t", "10",
+                        "-d", "/dev/stub0", "-l", str(logdir)])
+    assert rc is None
+    assert (logdir / "results.db").exists()
+    assert "sw_randread_bs4k_qd1" in capsys.readouterr().out
+
+
+def _curve(monkeypatch, iops, p99):
+    # run_job stand-in: a known device, qd from the job name
+    ran = []
+
+    def run_job(cmd, argv):
+        qd = int(next(a for a in cmd if a.startswith("--iodepth=")).split("=")[1])
+        ran.append(qd)
+        return {'iops': iops(qd), 'clat_p99_us': p99(qd)}
+    monkeypatch.setattr(sweep, "run_job", run_job)
+    return ran
+
+
+def _sweep_args(monkeypatch, tmp_path, *extra):
+    monkeypatch.setattr(params, "is_block_device", lambda p: True)
+    return params.parse_sweep_args(["-n", "sw", "-f", str(tmp_path / "tf"), "-s", "1G",
+                                    "-t", "10", "-d", "/dev/stub0", "--db", "", *extra])
+
+
+def test_knee_of_a_saturating_curve(tmp_path, monkeypatch):
+    # linear up to 24 outstanding ios, flat after
+    ran = _curve(monkeypatch, lambda qd: 1000 * min(qd, 24), lambda qd: 100 * qd)
+    points, knee = sweep.sweep_bs(_sweep_args(monkeypatch, tmp_path), "4k")
+    # climb stops at 64 (no 5% gain over 32), bisect 16..32 lands on the
+    # smallest qd within 5% of 24000
+    assert ran == [1, 2, 4, 8, 16, 32, 64, 24, 20, 22, 23]
+    assert knee == 23 and sorted(points) == sorted(ran)
+
+
+def test_knee_stays_in_the_latency_budget(tmp_path, monkeypatch):
+    _curve(monkeypatch, lambda qd: 1000 * min(qd, 24), lambda qd: 100 * qd)
+    args = _sweep_args(monkeypatch, tmp_path, "--lat-budget", "1000")
+    points, knee = sweep.sweep_bs(args, "4k")
+    assert max(points) == 16 and knee == 8
+    # qd=1 already too slow: no knee
+    _curve(monkeypatch, lambda qd: 1000 * qd, lambda qd: 5000)
+    assert sweep.sweep_bs(args, "4k")[1] is None
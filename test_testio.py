@@ -0,0 +1,58 @@
+import csv
+import json
+
+import testio
+from store import query
+
+
+def _result(path, jobs):
+    # fio json+ document, the tester.sh result file
+    blocks = {'io_bytes': 4096, 'io_kbytes': 4, 'bw_bytes': 4096, 'bw': 4, 'iops': 1.0,
+              'runtime': 1000, 'total_ios': 1,
+              'clat_ns': {'mean': 1000.0, 'percentile': {'99.000000': 2000}},
+              'slat_ns': {'mean': 0.0}, 'lat_ns': {'mean': 1000.0}}
+    empty = {**blocks, 'io_bytes': 0, 'io_kbytes': 0, 'bw_bytes': 0, 'bw': 0, 'iops': 0.0,
+             'total_ios': 0}
+    doc = {'jobs': [{'jobname': 'j', 'job options': {'bs': '4k', 'iodepth': '8'},
+                     'job_runtime': 1000, 'usr_cpu': 1.0, 'sys_cpu': 2.0,
+                     'read': blocks, 'write': blocks if mixed else empty, 'trim': empty}
+                    for mixed in jobs]}
+    path.write_text(json.dumps(doc) + "\n")
+
+
+def test_header_grows_with_new_columns(tmp_path):
+    _result(tmp_path / "a.json", [False])
+    testio.main(["--dir", str(tmp_path), "--workers", "1"])
+    # a mixed run brings read_*/write_* columns
+    _result(tmp_path / "b.json", [True])
+    testio.main(["--dir", str(tmp_path), "--workers", "1"])
+    with open(tmp_path / "fio_master_results.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [r['Filename'] for r in rows] == ["a.json", "b.json"]
+    assert rows[0]['write_iops'] == "" and rows[1]['write_iops'] != ""
+
+
+def test_store_rows_keep_bs_and_qd(tmp_path):
+    _result(tmp_path / "a.json", [False])
+    db = str(tmp_path / "r.db")
+    testio.main(["--dir", str(tmp_path), "--workers", "1", "--db", db])
+    rows = query(db, "archive", None, "4k", "8")
+    assert len(rows) == 1
+
+
+def test_changed_file_replaces_its_row(tmp_path):
+    db = str(tmp_path / "r.db")
+    run = ["--dir", str(tmp_path), "--workers", "1", "--db", db]
+    _result(tmp_path / "a.json", [False])
+    _result(tmp_path / "b.json", [False])
+    testio.main(run)
+    # a.json rewritten with another cpu figure, new size and hash
+    doc = json.loads((tmp_path / "a.json").read_text())
+    doc['jobs'][0]['usr_cpu'] = 12.5
+    (tmp_path / "a.json").write_text(json.dumps(doc, indent=1) + "\n")
+    testio.main(run)
+    with open(tmp_path / "fio_master_results.csv", newline="") as f:
+        rows = [(r['Filename'], r['fio_usr_cpu']) for r in csv.DictReader(f)]
+    assert rows == [("b.json", "1.0"), ("a.json", "12.5")]
+    stored = sorted((r['Filename'], r['fio_usr_cpu']) for _, r in query(db, "archive"))
+    assert stored == [("a.json", 12.5), ("b.json", 1.0)]
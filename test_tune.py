@@ -0,0 +1,68 @@
+import iotester
+import params
+import tune
+
+
+def _sysfs(tmp_path):
+    root = tmp_path / "parameters"
+    root.mkdir()
+    (root / "zfs_txg_timeout").write_text("5\n")
+    (root / "zfs_dirty_data_max").write_text("4294967296\n")
+    return root
+
+
+def test_every_config_runs_every_job(tmp_path, monkeypatch):
+    root = _sysfs(tmp_path)
+    jobfile = tmp_path / "jobs.txt"
+    jobfile.write_text("fio --name=a --rw=read\nfio --name=b --rw=write\n")
+    seen = []
+
+    def run_job(cmd, argv):
+        seen.append((cmd[1], (root / "zfs_txg_timeout").read_text().strip()))
+        return {'iops_mslat': 100.0, 'clat_p99_us': 10.0}
+
+    monkeypatch.setattr(tune, "run_job", run_job)
+    monkeypatch.setattr(params, "is_block_device", lambda p: True)
+    rc = iotester.tune(["-j", str(jobfile), "-n", "t", "-f", str(tmp_path / "tf"),
+                        "-s", "1G", "-t", "10", "-d", "/dev/fake", "--db", "",
+                        "-l", str(tmp_path),
+                        "--sysfs-root", str(root), "-g", "zfs_txg_timeout=1,10"])
+    assert rc is None
+    # 2 configs x 2 jobs, each config saw its own value
+    assert seen == [("--name=t_a", "1"), ("--name=t_b", "1"),
+                    ("--name=t_a", "10"), ("--name=t_b", "10")]
+    # put back afterwards
+    assert (root / "zfs_txg_timeout").read_text().strip() == "5"
+
+
+def test_empty_plan_is_an_error(tmp_path, monkeypatch):
+    root = _sysfs(tmp_path)
+    jobfile = tmp_path / "jobs.txt"
+    jobfile.write_text("fio --name=a --rw=read\n")
+    monkeypatch.setattr(params, "is_block_device", lambda p: True)
+    rc = iotester.tune(["-j", str(jobfile), "-n", "t", "-f", str(tmp_path / "tf"),
+                        "-s", "1G", "-t", "10", "-d", "/dev/fake", "--db", "",
+                        "-l", str(tmp_path),
+                        "--sysfs-root", str(root), "-g", "zfs_txg_timeout=1",
+                        "--only", "missing"])
+    assert rc == 1
+
+
+def test_score_and_ranking_order(tmp_path, monkeypatch):
+    root = _sysfs(tmp_path)
+    rows = iter([{'iops_mslat': 1.0, 'clat_p99_us': 5.0},
+                 {'iops_mslat': 3.0, 'clat_p99_us': 50.0},
+                 {'iops_mslat': 2.0, 'clat_p99_us': 5.0}])
+    monkeypatch.setattr(tune, "run_job", lambda cmd, argv: next(rows))
+
+    class Argv:
+        sysfs_root = str(root)
+        grid = {'zfs_txg_timeout': ['1', '2', '3']}
+        samples = None
+        metric = 'iops_mslat'
+        p99_max = 20.0
+    ranking = tune.run_tune([["fio", "--name=x"]], Argv)
+    # over the p99 bound ranks last whatever its metric
+    assert [r['tune'] for r in ranking] == ["zfs_txg_timeout=3", "zfs_txg_timeout=1",
+                                            "zfs_txg_timeout=2"]
+    assert ranking[-1]['iops_mslat'] is None
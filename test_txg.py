@@ -0,0 +1,49 @@
+import txg
+
+MiB = 1 << 20
+HEADER = "txg      birth            state ndirty       nread        nwritten     reads    writes   otime        qtime        wtime        stime\n"
+
+
+def _line(n, state='C'):
+    # one txg a second, 100 MiB written, dirty data growing 10 MiB a txg, 20 ms syncs
+    return (f"{n} {n * 10**9} {state} {n * 10 * MiB} 0 {100 * MiB} 0 800 "
+            f"1000000000 50000 20000 20000000\n")
+
+
+def _kstat(tmp_path, lines):
+    (tmp_path / "tank").mkdir(exist_ok=True)
+    (tmp_path / "tank" / "txgs").write_text(HEADER + "".join(lines))
+    return str(tmp_path / "{}" / "txgs")
+
+
+def test_read_txgs_keeps_new_committed_rows(tmp_path):
+    kstat = _kstat(tmp_path, [_line(n) for n in range(100, 104)]
+                   + [_line(104, 'S'), _line(105, 'O')])
+    rows = txg.read_txgs("tank", kstat=kstat)
+    assert [r[0] for r in rows] == [100, 101, 102, 103]
+    assert rows[0] == [100, 100 * 10**9, 1000 * MiB, 0, 100 * MiB, 0, 800,
+                       10**9, 50000, 20000, 20000000]
+    assert [r[0] for r in txg.read_txgs("tank", since=101, kstat=kstat)] == [102, 103]
+
+
+def test_ring_wraps_and_updates_incrementally(tmp_path):
+    ring = txg.ring_new(4)
+    kstat = _kstat(tmp_path, [_line(n) for n in range(100, 106)] + [_line(106, 'O')])
+    assert txg.ring_update(ring, "tank", kstat) == 6
+    assert list(txg.ring_col(ring, 'txg')) == [102, 103, 104, 105]
+    assert list(txg.ring_col(ring, 'txg', 2)) == [104, 105]
+    # 106 committed since, only it is read and pushed over the oldest
+    kstat = _kstat(tmp_path, [_line(n) for n in range(100, 107)] + [_line(107, 'S')])
+    assert txg.ring_update(ring, "tank", kstat) == 1
+    assert ring['last'] == 106 and ring['count'] == 4
+    assert list(txg.ring_col(ring, 'txg')) == [103, 104, 105, 106]
+    assert txg.ring_rows(ring, 1) == [[106, 106 * 10**9, 'C', 1060 * MiB, 0, 100 * MiB,
+                                        0, 800, 10**9, 50000, 20000, 20000000]]
+
+
+def test_ring_stats(tmp_path):
+    ring = txg.ring_new(8)
+    assert txg.ring_stats(ring)['write_MBs'] == 0.0
+    txg.ring_update(ring, "tank", _kstat(tmp_path, [_line(n) for n in range(100, 106)]))
+    assert txg.ring_stats(ring) == {'txgs': 6, 'write_MBs': 100.0, 'sync_p95_ms': 20.0,
+                                    'dirty_MB': 1050.0, 'dirty_trend_MBs': 10.0}
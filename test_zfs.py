@@ -0,0 +1,52 @@
+import zfs
+
+ARC = """13 1 0x01 123 33456 1234567890 9876543210
+name                            type data
+hits                            4    {hits}
+misses                          4    {misses}
+demand_data_hits                4    {hits}
+size                            4    {size}
+c_max                           4    8589934592
+"""
+
+
+def _snapshot(tmp_path, tag, params, hits, misses, size):
+    root = tmp_path / tag / "parameters"
+    root.mkdir(parents=True)
+    for name, value in params.items():
+        (root / name).write_text(f"{value}\n")
+    arcstats = tmp_path / tag / "arcstats"
+    arcstats.write_text(ARC.format(hits=hits, misses=misses, size=size))
+    return zfs.snapshot(str(root), str(arcstats))
+
+
+def test_read_arcstats_skips_the_header(tmp_path):
+    snap = _snapshot(tmp_path, "a", {}, 10, 5, 1 << 30)
+    assert snap['arc'] == {'hits': 10, 'misses': 5, 'demand_data_hits': 10,
+                           'size': 1 << 30, 'c_max': 8589934592}
+    assert zfs.read_arcstats(str(tmp_path / "missing")) == {}
+
+
+def test_job_zfs_deltas(tmp_path):
+    params = {'zfs_arc_max': 0, 'zfs_txg_timeout': 5}
+    before = _snapshot(tmp_path, "before", params, 1000, 500, 1 << 30)
+    after = _snapshot(tmp_path, "after", params, 1900, 600, 3 << 29)
+    row = zfs.job_zfs(before, after)
+    assert row['zfs_params'] == zfs.params_digest({'zfs_arc_max': "0", 'zfs_txg_timeout': "5"})
+    assert (row['arc_hits'], row['arc_misses'], row['arc_demand_data_hits']) == (900, 100, 900)
+    # counters missing from arcstats count as 0
+    assert row['arc_l2_hits'] == 0
+    assert row['arc_hit_pct'] == 90.0
+    assert row['arc_size_MB'] == 1536
+
+
+def test_job_zfs_without_zfs_and_changed_tunables(tmp_path, caplog):
+    empty = {'params': {}, 'arc': {}}
+    assert zfs.job_zfs(empty, empty) == {}
+    before = _snapshot(tmp_path, "before", {'zfs_txg_timeout': 5}, 10, 0, 0)
+    after = _snapshot(tmp_path, "after", {'zfs_txg_timeout': 1}, 10, 0, 0)
+    row = zfs.job_zfs(before, after)
+    # digest of the tunables the job started with
+    assert row['zfs_params'] == zfs.params_digest(before['params'])
+    assert row['arc_hit_pct'] == 0.0
+    assert "zfs_txg_timeout" in caplog.text
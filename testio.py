@@ -1,121 +1,266 @@
+import argparse
 import csv
+import hashlib
 import json
+import mmap
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+
+from output import DIRS, job_cpu, job_stats, split_fio_output
 
 
 def extract_json_from_log(raw_content):
-    match = re.search(r"\{.*\}", raw_content, re.DOTALL)
-    if match:
-        json_string = match.group(0)
-        try:
-            return json.loads(json_string)
-        except json.JSONDecodeError as e:
-            print(f"Regex found a match, but it's not valid JSON: {e}")
+    try:
+        return split_fio_output(raw_content)[0]
+    except ValueError as e:
+        # JSONDecodeError is a ValueError too
+        print(f"No valid fio JSON found: {e}")
     return None
 
 
-def parse_fio(file_path):
-    with open(file_path, "r") as f:
-        try:
-            raw_data = f.read()
-            d = extract_json_from_log(raw_data)
-            if not d:
-                return {
-                    "Filename": os.path.basename(file_path),
-                    "Error": "No JSON found",
-                }
-
-            job = d["jobs"][0]
-            rw = "write" if job["write"]["iops"] > 0 else "read"
-            stats = job[rw]
-
-            z = {
+def parse_fio(raw_data, file_path):
+    try:
+        d = extract_json_from_log(raw_data)
+        if not d:
+            return {
                 "Filename": os.path.basename(file_path),
-                "jobname": job.get("jobname"),
-                "BS": job["job options"].get("bs", "1"),
-                "QD": job["job options"].get("iodepth", "1"),
-                "IOPS": round(stats["iops"], 2),
-                "BW_MBs": round(stats["bw"] / 1024, 2),
-                "fio_sys_cpu": round(job.get("sys_cpu", 0), 2),
-                "fio_usr_cpu": round(job.get("usr_cpu", 0), 2),
+                "Error": "No JSON found",
             }
 
-            def get_p99(stat_block):
-                pcts = stat_block.get("percentile", {})
-                key = next((k for k in pcts if k.startswith("99.0")), None)
-                return pcts[key] if key else 0
+        jobs = d["jobs"]
+        job = jobs[0]
+        opts = {**d.get("global options", {}), **job.get("job options", {})}
+        # every job and direction, same extraction as the runner
+        stats = job_stats(jobs)
+
+        z = {
+            "Filename": os.path.basename(file_path),
+            "jobname": job.get("jobname"),
+            "BS": opts.get("bs", "1"),
+            "QD": opts.get("iodepth", "1"),
+            "Jobs": len(jobs),
+            "IOPS": stats["iops"],
+            "BW_MBs": stats["BW_MBs"],
+            "fio_sys_cpu": job_cpu(jobs, "sys_cpu"),
+            "fio_usr_cpu": job_cpu(jobs, "usr_cpu"),
+        }
+        for k in ("clat_avg_us", "clat_p99_us", "clat_ratio", "slat_avg_us", "lat_avg_us"):
+            z[k] = stats[k]
+        # mixed workloads: read_*/write_* columns
+        z.update((k, v) for k, v in stats.items() if k.split("_", 1)[0] in DIRS)
 
-            z["clat_avg_us"] = round(stats["clat_ns"]["mean"] / 1000, 2)
-            z["clat_p99_us"] = round(get_p99(stats["clat_ns"]) / 1000, 2)
-            z["clat_ratio"] = round(z["clat_p99_us"] / z["clat_avg_us"], 2)
-            z["slat_avg_us"] = round(stats["slat_ns"]["mean"] / 1000, 2)
-            z["lat_avg_us"] = round(stats["lat_ns"]["mean"] / 1000, 2)
+        return z
+    except Exception as e:
+        return {"Filename": os.path.basename(file_path), "Error": str(e)}
 
-            return z
-        except Exception as e:
-            return {"Filename": os.path.basename(file_path), "Error": str(e)}
 
+# mon.sh tables and the command line follow the fio json
+IOSTAT_RE = {
+    "iostat_cpu_usr": re.compile(r"%user[^\d]+([\d.]+)"),
+    "iostat_cpu_sys": re.compile(r"%system[^\d]+([\d.]+)"),
+    "iostat_cpu_iowait": re.compile(r"%iowait[^\d]+([\d.]+)"),
+    "iostat_dev_util": re.compile(r"%util[^\d]+([\d.]+)"),
+}
 
-def parse_iostat(data, file_path):
-    with open(file_path, "r") as f:
-        raw_data = f.read()
 
+def parse_iostat(data, raw_data):
     # Helper to find regex and avoid .group(1) crashes if no match is found
     def safe_search(pattern, text):
-        m = re.search(pattern, text)
+        m = pattern.search(text)
         return m.group(1) if m else "0.0"
 
-    data["iostat_cpu_usr"] = safe_search(r"%user[^\d]+([\d.]+)", raw_data)
-    data["iostat_cpu_sys"] = safe_search(r"%system[^\d]+([\d.]+)", raw_data)
-    data["iostat_cpu_iowait"] = safe_search(r"%iowait[^\d]+([\d.]+)", raw_data)
-    data["iostat_dev_util"] = safe_search(r"%util[^\d]+([\d.]+)", raw_data)
-    data["zz"] = re.search(r".*}(.*)", raw_data, re.DOTALL).group(1).strip()
+    for key, pattern in IOSTAT_RE.items():
+        data[key] = safe_search(pattern, raw_data)
+    idx = raw_data.rfind("}")
+    data["zz"] = raw_data[idx + 1:].strip()
     return data
 
 
-def main():
-    results_dir = "results/"
-    master_output = "results/fio_master_results.csv"
+def file_hash(buf):
+    return hashlib.sha1(buf).hexdigest()
+
+
+def ingest_file(job):
+    # worker: map the file once, hash it, parse fio + iostat from one decode
+    file_path, known_hash = job
+    with open(file_path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return file_path, None, {"Error": "empty file"}
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            digest = file_hash(mm)
+            if digest == known_hash:
+                return file_path, digest, None
+            raw_data = mm[:].decode(errors="replace")
+
+    data = parse_fio(raw_data, file_path)
+    if "Error" not in data:
+        # Only run iostat parse if FIO parse succeeded
+        data = parse_iostat(data, raw_data)
+    return file_path, digest, data
+
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+def open_csv(path, fieldnames, fresh):
+    # append handle under this header, fresh starts the file over. A file
+    # with a narrower header is rewritten first, its rows get empty cells
+    # in the new columns
+    if fresh:
+        f = open(path, "w", newline="")
+        csv.DictWriter(f, fieldnames=fieldnames).writeheader()
+        return f
+    with open(path, newline="") as f:
+        header = next(csv.reader(f), None)
+    if header != fieldnames:
+        tmp = path + ".tmp"
+        with open(path, newline="") as src, open(tmp, "w", newline="") as dst:
+            writer = csv.DictWriter(dst, fieldnames=fieldnames, restval="")
+            writer.writeheader()
+            writer.writerows(csv.DictReader(src))
+        os.replace(tmp, path)
+    return open(path, "a", newline="")
+
+
+def keep_last(path, filenames):
+    # one row per re-ingested file: its earlier rows go, the one appended
+    # by this run stays
+    last = {}
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        for i, row in enumerate(reader):
+            if row["Filename"] in filenames:
+                last[row["Filename"]] = i
+    tmp = path + ".tmp"
+    with open(path, newline="") as src, open(tmp, "w", newline="") as dst:
+        writer = csv.DictWriter(dst, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(row for i, row in enumerate(csv.DictReader(src))
+                         if row["Filename"] not in filenames or last[row["Filename"]] == i)
+    os.replace(tmp, path)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="bulk ingest tester.sh results")
+    parser.add_argument("--dir", default="results/", help="results directory")
+    parser.add_argument("--out", default=None,
+                        help="csv, appended to (default <dir>/fio_master_results.csv)")
+    parser.add_argument("--manifest", default=None,
+                        help="size/mtime/hash of ingested files (default <dir>/.ingested.json)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="parser processes")
+    parser.add_argument("--db", default=None, help="also store rows in this result store")
+    parser.add_argument("--setname", default="archive", help="store set name")
+    parser.add_argument("--full", action="store_true",
+                        help="ignore the manifest and rewrite the csv")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results_dir = args.dir
+    master_output = args.out or os.path.join(results_dir, "fio_master_results.csv")
+    manifest_path = args.manifest or os.path.join(results_dir, ".ingested.json")
 
     if not os.path.exists(results_dir):
         print(f"Error: Directory '{results_dir}' not found.")
         return
 
-    files = [f for f in os.listdir(results_dir) if f.endswith(".json")]
-    files.sort()
-
-    all_results = []
+    manifest = {} if args.full else load_manifest(manifest_path)
+    files = sorted(f for f in os.listdir(results_dir) if f.endswith(".json")
+                   and f != os.path.basename(manifest_path))
 
+    # size + mtime unchanged: skip without reading, else let the worker
+    # compare hashes (touched but identical files are skipped too)
+    todo = []
     for filename in files:
         file_path = os.path.join(results_dir, filename)
-        data = parse_fio(file_path)
-
-        if "Error" not in data:
-            # Only run iostat parse if FIO parse succeeded
-            data = parse_iostat(data, file_path)
-            all_results.append(data)
-        else:
-            print(f"Skipping {filename}: {data['Error']}")
+        st = os.stat(file_path)
+        seen = manifest.get(filename)
+        if seen and seen[0] == st.st_size and seen[1] == st.st_mtime_ns:
+            continue
+        todo.append((file_path, seen[2] if seen else None))
 
-    if not all_results:
-        print("No valid data found.")
+    if not todo:
+        print("Nothing new to ingest.")
         return
 
-    # DYNAMIC HEADERS: Use the keys from the first dictionary as headers
-    fieldnames = list(all_results[0].keys())
+    if args.db:
+        from store import delete_results, save_result
 
+    count = 0
+    csvfile = writer = None
+    fieldnames = None
+    if not args.full and os.path.exists(master_output):
+        with open(master_output, newline="") as existing:
+            fieldnames = next(csv.reader(existing), None)
+    fresh = not fieldnames
+    # ingested before and changed since, their old rows are replaced
+    replaced = set()
     try:
-        with open(master_output, mode="w", newline="") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(all_results)
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            # results stream in file order, nothing kept in memory
+            done = pool.map(ingest_file, todo, chunksize=8)
+            for n, (file_path, digest, data) in enumerate(done, 1):
+                filename = os.path.basename(file_path)
+                st = os.stat(file_path)
+                if data is not None and filename in manifest:
+                    replaced.add(filename)
+                # bad files are remembered too, retried only once they change
+                manifest[filename] = [st.st_size, st.st_mtime_ns, digest]
+                if data is not None and "Error" in data:
+                    print(f"Skipping {filename}: {data['Error']}")
+                elif data is not None:
+                    # DYNAMIC HEADERS: the union of every row's keys, the
+                    # file is rewritten when a row brings new ones
+                    new = [k for k in data if k not in (fieldnames or ())]
+                    if writer is None or new:
+                        fieldnames = (fieldnames or []) + new
+                        if csvfile:
+                            csvfile.close()
+                        csvfile = open_csv(master_output, fieldnames, fresh)
+                        fresh = False
+                        writer = csv.DictWriter(csvfile, fieldnames=fieldnames, restval="")
+                    writer.writerow(data)
+                    if args.db:
+                        delete_results(args.db, args.setname, "Filename", filename)
+                        # the store indexes bs/qd like runner rows
+                        save_result(args.db, args.setname,
+                                    {**data, 'bs': data['BS'], 'qd': data['QD']})
+                    count += 1
+                if n % 100 == 0:
+                    if csvfile:
+                        csvfile.flush()
+                    save_manifest(manifest_path, manifest)
 
+        if csvfile:
+            csvfile.close()
+            csvfile = None
+        if replaced:
+            keep_last(master_output, replaced)
+        save_manifest(manifest_path, manifest)
         print(f"\n--- SUCCESS ---")
-        print(f"Combined {len(all_results)} files into {master_output}")
+        print(f"Added {count} files to {master_output}")
 
     except PermissionError:
         print(f"Error: Could not write to {master_output}. Close the file in Excel.")
+    finally:
+        if csvfile:
+            csvfile.close()
 
 
 if __name__ == "__main__":
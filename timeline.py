@@ -0,0 +1,145 @@
+import asyncio
+import glob
+import logging
+from array import array
+
+from sampler import clock
+from stats import percentile, summarize
+from txg import TXG_COLS, read_txgs
+
+# Per-job timeline: fio interval logs, the device sampler and ZFS txgs
+# on one clock (sampler t0, CLOCK_MONOTONIC_RAW), stored together and
+# summarized as min/max/p50/p95/p99.
+
+# txgs only keeps zfs_txg_history rows, poll often enough not to lose any
+TXG_POLL = 2.0
+
+
+def fio_log_args(prefix: str, interval: float):
+    ms = max(1, int(interval * 1000))
+    return [f"--write_bw_log={prefix}", f"--write_iops_log={prefix}",
+            f"--write_lat_log={prefix}", f"--log_avg_msec={ms}"]
+
+
+def read_fio_log(prefix: str, kind: str, offset: float, interval: float,
+                 mean: bool = False):
+    # <prefix>_<kind>.<job>.log lines: msec, value, ddir, bs, offset
+    # jobs and directions land in the same interval bucket: summed for
+    # bw/iops, averaged for latencies
+    step = max(1, int(interval * 1000))
+    sums, counts = {}, {}
+    for path in glob.glob(f"{glob.escape(prefix)}_{kind}.*.log"):
+        with open(path) as f:
+            for line in f:
+                parts = line.split(',', 2)
+                if len(parts) < 2:
+                    continue
+                b = round(int(parts[0]) / step)
+                sums[b] = sums.get(b, 0) + int(parts[1])
+                counts[b] = counts.get(b, 0) + 1
+    keys = sorted(sums)
+    t = array('d', (offset + b * step / 1000 for b in keys))
+    if mean:
+        v = array('d', (sums[b] / counts[b] for b in keys))
+    else:
+        v = array('d', (sums[b] for b in keys))
+    return t, v
+
+
+def _txg_poll(state: dict):
+    for pool in state['pools']:
+        try:
+            rows = read_txgs(pool, state['last'].get(pool, 0))
+        except OSError as e:
+            logging.warning("txgs %s: %s", pool, e)
+            continue
+        if rows:
+            state['rows'][pool].extend(rows)
+            state['last'][pool] = rows[-1][0]
+
+
+def new_txg_watch(pools: list):
+    return {
+        'pools': pools,
+        'rows': {p: [] for p in pools},
+        'last': {},
+    }
+
+
+async def run_txg_watch(state: dict):
+    # task on the runner event loop, stop_txg_task() cancels it
+    while True:
+        _txg_poll(state)
+        await asyncio.sleep(TXG_POLL)
+
+
+async def stop_txg_task(state: dict, task: asyncio.Task):
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    # last read, txgs synced at the end of the job
+    _txg_poll(state)
+    return state
+
+
+def txg_series(state: dict, t0: float, end: float):
+    # txgs born inside [t0, end], birth moved onto the job clock
+    series = {}
+    for pool, rows in state['rows'].items():
+        rows = [r for r in rows if t0 <= r[1] / 1e9 <= end]
+        cols = {c: array('d', (r[i] for r in rows)) for i, c in enumerate(TXG_COLS)}
+        cols['t'] = array('d', (b / 1e9 - t0 for b in cols['birth']))
+        series[f"txg_{pool}"] = cols
+    return series
+
+
+def _sync_windows(txgs: dict):
+    # [start, end] of each txg sync on the job clock, ns durations
+    wins = []
+    for cols in txgs.values():
+        for i, t in enumerate(cols['t']):
+            start = t + (cols['otime'][i] + cols['qtime'][i] + cols['wtime'][i]) / 1e9
+            wins.append((start, start + cols['stime'][i] / 1e9))
+    return sorted(wins)
+
+
+def build_timeline(prefix: str, fio_offset: float, interval: float,
+                   sampler: dict, txg_state: dict | None):
+    series = {
+        'fio_bw': dict(zip(('t', 'v'), read_fio_log(prefix, 'bw', fio_offset, interval))),
+        'fio_iops': dict(zip(('t', 'v'), read_fio_log(prefix, 'iops', fio_offset, interval))),
+        'fio_clat': dict(zip(('t', 'v'), read_fio_log(prefix, 'clat', fio_offset, interval, True))),
+    }
+    end = clock()
+    if txg_state:
+        series.update(txg_series(txg_state, sampler['t0'], end))
+
+    n = sampler['count']
+    summary = {}
+    summary.update(summarize('ts_fio_iops', series['fio_iops']['v']))
+    summary.update(summarize('ts_fio_bw_MBs', series['fio_bw']['v'], 1 / 1024))
+    summary.update(summarize('ts_fio_clat_us', series['fio_clat']['v'], 1 / 1000))
+    devs = list(sampler['dev'].values())
+    summary.update(summarize('ts_dev_util', [v for d in devs for v in d['%util'][:n]]))
+    summary.update(summarize('ts_dev_aqu-sz', [v for d in devs for v in d['aqu-sz'][:n]]))
+
+    txgs = {k: v for k, v in series.items() if k.startswith('txg_')}
+    stime = [v for c in txgs.values() for v in c['stime']]
+    bw = [c['nwritten'][i] / c['stime'][i] * 1e9 / 2**20
+          for c in txgs.values() for i in range(len(c['stime'])) if c['stime'][i]]
+    summary.update(summarize('ts_txg_stime_ms', stime, 1 / 1e6))
+    summary.update(summarize('ts_txg_bw_MBs', bw))
+
+    # do clat spikes line up with txg syncs: p99 of the fio clat intervals
+    # overlapping a sync over p99 of the others
+    wins = _sync_windows(txgs)
+    inside, outside = [], []
+    for t, v in zip(series['fio_clat']['t'], series['fio_clat']['v']):
+        hit = any(t >= s and t - interval <= e for s, e in wins)
+        (inside if hit else outside).append(v)
+    p_in = percentile(sorted(inside), 99)
+    p_out = percentile(sorted(outside), 99)
+    summary['ts_txg_sync_clat_ratio'] = round(p_in / p_out, 2) if p_out else 0.0
+    return series, summary
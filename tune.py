@@ -0,0 +1,70 @@
+import itertools
+import logging
+import random
+
+from runner import run_job
+from zfs import read_params, write_param
+
+# ZFS tunables sweep: apply each combination under --sysfs-root, run the
+# job subset, put the original values back, rank by --metric.
+
+UNITS = {'K': 2**10, 'M': 2**20, 'G': 2**30, 'T': 2**40}
+
+
+def to_value(val: str):
+    # 4G -> 4294967296, anything else as given
+    if val[-1:].upper() in UNITS and val[:-1].isdigit():
+        return str(int(val[:-1]) * UNITS[val[-1].upper()])
+    return val
+
+
+def configs(grid: dict, samples: int | None = None, seed: int = 0):
+    names = list(grid)
+    combos = [dict(zip(names, vals)) for vals in itertools.product(*grid.values())]
+    if samples and samples < len(combos):
+        combos = random.Random(seed).sample(combos, samples)
+    return combos
+
+
+def apply(config: dict, root: str):
+    for name, val in config.items():
+        write_param(name, to_value(val), root)
+
+
+def score(rows: list, metric: str, p99_max: float | None):
+    # mean of the metric over the subset, None when a job breaks the p99 bound
+    if p99_max is not None and any(r['clat_p99_us'] > p99_max for r in rows):
+        return None
+    return round(sum(float(r[metric]) for r in rows) / len(rows), 2)
+
+
+def run_tune(cmds: list, argv: object):
+    root = argv.sysfs_root
+    original = read_params(root)
+    missing = [name for name in argv.grid if name not in original]
+    if missing:
+        raise SystemExit(f"unknown tunables under {root}: {', '.join(missing)}")
+
+    ranking = []
+    try:
+        for config in configs(argv.grid, argv.samples):
+            label = " ".join(f"{k}={v}" for k, v in config.items())
+            logging.info("Tune: %s", label)
+            apply(config, root)
+            # each row is stored with the zfs_params digest of this config
+            rows = [run_job(cmd, argv) for cmd in cmds]
+            ranking.append({
+                'tune': label,
+                argv.metric: score(rows, argv.metric, argv.p99_max),
+                'clat_p99_us_max': max(r['clat_p99_us'] for r in rows),
+                'jobs': len(rows),
+            })
+    finally:
+        # only what we touched goes back
+        for name in argv.grid:
+            write_param(name, original[name], root)
+        logging.info("Tune: restored %s", ", ".join(argv.grid))
+
+    # best first, configs over the p99 bound last
+    ranking.sort(key=lambda r: (r[argv.metric] is None, -(r[argv.metric] or 0)))
+    return [{'rank': rank, **row} for rank, row in enumerate(ranking, 1)]
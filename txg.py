@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 
 import sys
-import re
 import time
 import argparse
-import os
+import glob
+import io
+from array import array
+
+from stats import percentile
 
 # func
 def _parse_int(val: str):
@@ -12,8 +15,16 @@ def _parse_int(val: str):
         return int(val)
     except (ValueError, TypeError):
         raise argparse.ArgumentTypeError(f"invalid int value: {val!r}")
-    val = int(val)
-    return val
+
+def _parse_float(val: str):
+    try:
+        v = float(val)
+    except (ValueError, TypeError):
+        raise argparse.ArgumentTypeError(f"invalid float value: {val!r}")
+    if v < 0.1:
+        raise argparse.ArgumentTypeError("refresh delay must be >= 0.1")
+    return v
+
 def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="human readable txgs")
     parser.add_argument(
@@ -25,23 +36,121 @@ def parse_args(argv=None):
     parser.add_argument(
         "-t",
         required=True,
+        type=_parse_float,
+        help="refresh delay in seconds (>= 0.1)",
+    )
+    parser.add_argument(
+        "-p",
+        "--pools",
+        default=None,
+        help="pools to watch -p=tank,backup (default: all)",
+    )
+    parser.add_argument(
+        "-w",
+        "--window",
         type=_parse_int,
-        help="refresh delay in seconds",
+        default=256,
+        help="txgs kept per pool for the rolling stats",
     )
     return parser.parse_args(argv)
 
-def get_txg(view:int):
-    file = '/proc/spl/kstat/zfs/tank/txgs'
-    with open(file, 'r') as f:
-        res = f.readlines()
-    lines = []
-    for line in res:
-        lines.append(re.split(r'\s+', line.strip()))
-    return lines[-view:] 
+KSTAT = "/proc/spl/kstat/zfs/{}/txgs"
+# numeric txgs columns, state dropped (read_txgs only keeps committed rows)
+TXG_COLS = ('txg', 'birth', 'ndirty', 'nread', 'nwritten', 'reads', 'writes',
+            'otime', 'qtime', 'wtime', 'stime')
+HEADER = ['txg','birth','state','ndirty','nread','nwritten','reads','writes','otime','qtime','wtime','stime','BW']
+
+
+def txg_pools():
+    return sorted(p.split('/')[-2] for p in glob.glob(KSTAT.format('*')))
+
+
+def read_txgs(pool: str, since: int = 0, kstat: str = KSTAT):
+    # committed txgs newer than since, as int lists in TXG_COLS order;
+    # walks the file from the end and stops at the first already seen txg
+    with open(kstat.format(pool)) as f:
+        lines = f.read().splitlines()
+    rows = []
+    for line in reversed(lines[1:]):
+        p = line.split()
+        if len(p) < 12:
+            continue
+        txg = int(p[0])
+        if txg <= since:
+            break
+        if p[2] == 'C':
+            rows.append([txg, int(p[1])] + [int(v) for v in p[3:12]])
+    rows.reverse()
+    return rows
+
+
+# fixed size ring of numeric txg columns, one per pool
+def ring_new(size: int):
+    return {'size': size, 'head': 0, 'count': 0, 'last': 0,
+            'cols': {c: array('d', bytes(8 * size)) for c in TXG_COLS}}
+
+def ring_push(ring: dict, row: list):
+    i = ring['head']
+    for c, v in zip(TXG_COLS, row):
+        ring['cols'][c][i] = v
+    ring['head'] = (i + 1) % ring['size']
+    ring['count'] = min(ring['count'] + 1, ring['size'])
+    ring['last'] = row[0]
+
+def ring_col(ring: dict, col: str, n: int | None = None):
+    # oldest to newest, last n values
+    n = min(n or ring['count'], ring['count'])
+    start = (ring['head'] - n) % ring['size']
+    col = ring['cols'][col]
+    if start + n <= ring['size']:
+        return col[start:start + n]
+    return col[start:] + col[:(start + n) % ring['size']]
+
+def ring_update(ring: dict, pool: str, kstat: str = KSTAT):
+    rows = read_txgs(pool, ring['last'], kstat)
+    for row in rows:
+        ring_push(ring, row)
+    return len(rows)
+
+def ring_stats(ring: dict):
+    # rolling write bandwidth over the births span, sync time p95 and
+    # dirty data trend (least squares slope of ndirty over birth time)
+    birth = ring_col(ring, 'birth')
+    nwritten = ring_col(ring, 'nwritten')
+    ndirty = ring_col(ring, 'ndirty')
+    stime = sorted(ring_col(ring, 'stime'))
+    n = len(birth)
+    res = {'txgs': n, 'write_MBs': 0.0, 'sync_p95_ms': 0.0, 'dirty_MB': 0.0,
+           'dirty_trend_MBs': 0.0}
+    if n < 2:
+        return res
+    span = (birth[-1] - birth[0]) / 1e9
+    if span > 0:
+        res['write_MBs'] = round(sum(nwritten[1:]) / span / 2**20, 1)
+    res['sync_p95_ms'] = round(percentile(stime, 95) / 1e6, 1)
+    res['dirty_MB'] = round(ndirty[-1] / 2**20, 1)
+    t = [(b - birth[0]) / 1e9 for b in birth]
+    tm = sum(t) / n
+    dm = sum(ndirty) / n
+    var = sum((x - tm) ** 2 for x in t)
+    if var:
+        slope = sum((x - tm) * (y - dm) for x, y in zip(t, ndirty)) / var
+        res['dirty_trend_MBs'] = round(slope / 2**20, 2)
+    return res
+
+
+def ring_rows(ring: dict, view: int):
+    # last view txgs as kstat-like rows for format_rows
+    cols = [ring_col(ring, c, view) for c in TXG_COLS]
+    rows = []
+    for vals in zip(*cols):
+        row = [int(v) for v in vals]
+        rows.append(row[:2] + ['C'] + row[2:])
+    return rows
 
 def format_rows(out: list):
 
-    header = ['txg','birth','state','ndirty','nread','nwritten','reads','writes','otime','qtime','wtime','stime','BW']
+    header = HEADER
     idx = {name: header.index(name) for name in header}
     for line, row in enumerate(out):
         if float(out[line][idx['stime']]) > 0:
@@ -64,31 +173,48 @@ def format_rows(out: list):
     return out
 
 # ez
-def print_txg(out):
-    header = ['txg','birth','state','ndirty','nread','nwritten','reads','writes','otime','qtime','wtime','stime','BW']
+def print_txg(out, file=sys.stdout):
+    header = HEADER
     # ensure all rows are strings
     rows = [[str(c) for c in r] for r in out]
     # compute widths per column
     cols = list(zip(*( [header] + rows )))
     widths = [max(len(str(cell)) for cell in col) for col in cols]
     # format header
-    print("\t".join(h.ljust(w) for h, w in zip(header, widths)))
-    print("")
+    print("\t".join(h.ljust(w) for h, w in zip(header, widths)), file=file)
+    print("", file=file)
     # format rows
     for r in rows:
         print("\t".join(cell.rjust(w) if cell.replace(',','').isdigit() else cell.ljust(w)
-                        for cell, w in zip(r, widths)))
+                        for cell, w in zip(r, widths)), file=file)
+
+# ANSI: cursor home + clear screen, no fork of clear(1) per refresh
+CLEAR = "\x1b[H\x1b[2J"
 
 def main(argv=None):
     args = parse_args(argv)
-    # out = format_rows(get_txg(args.n))
-    # print_txg(out)
+    pools = [p for p in args.pools.split(',') if p] if args.pools else txg_pools()
+    if not pools:
+        print("No ZFS pools found", file=sys.stderr)
+        return 1
+    rings = {pool: ring_new(max(args.window, args.n)) for pool in pools}
     try:
         while True:
-            os.system('clear')
-            out = format_rows(get_txg(args.n))
-            print_txg(out)
-            # print("\n\nPress Ctrl + c to interrupt")
+            for pool, ring in rings.items():
+                ring_update(ring, pool)
+            # build the frame first, one write per refresh
+            frame = [CLEAR]
+            for pool, ring in rings.items():
+                s = ring_stats(ring)
+                frame.append(f"{pool}: write {s['write_MBs']} MB/s  sync p95 "
+                             f"{s['sync_p95_ms']} ms  dirty {s['dirty_MB']} MB "
+                             f"({s['dirty_trend_MBs']:+} MB/s) over {s['txgs']} txgs\n\n")
+                out = format_rows(ring_rows(ring, args.n))
+                buf = io.StringIO()
+                print_txg(out, buf)
+                frame.append(buf.getvalue() + "\n")
+            sys.stdout.write("".join(frame))
+            sys.stdout.flush()
             time.sleep(args.t)
     except KeyboardInterrupt:
         print("Interrupted by user")
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import logging
+import os
+
+# ZFS tunables and ARC counters around each job, what scheduler.sh used
+# to cat by hand.
+
+PARAMS_DIR = "/sys/module/zfs/parameters"
+ARCSTATS = "/proc/spl/kstat/zfs/arcstats"
+
+# arcstats counters reported as per-job deltas
+ARC_COUNTERS = ('hits', 'misses', 'demand_data_hits', 'demand_data_misses',
+                'prefetch_data_hits', 'prefetch_data_misses', 'l2_hits',
+                'l2_misses')
+
+
+def read_params(root: str = PARAMS_DIR):
+    params = {}
+    try:
+        names = sorted(os.listdir(root))
+    except OSError:
+        return params
+    for name in names:
+        try:
+            with open(os.path.join(root, name)) as f:
+                params[name] = f.read().strip()
+        except OSError:
+            # write-only or vanished tunable
+            continue
+    return params
+
+
+def write_param(name: str, value: str, root: str = PARAMS_DIR):
+    with open(os.path.join(root, name), 'w') as f:
+        f.write(f"{value}\n")
+
+
+def read_arcstats(path: str = ARCSTATS):
+    # 2 header lines then: name type data
+    stats = {}
+    try:
+        with open(path) as f:
+            lines = f.read().splitlines()[2:]
+    except OSError:
+        return stats
+    for line in lines:
+        parts = line.split()
+        if len(parts) == 3:
+            try:
+                stats[parts[0]] = int(parts[2])
+            except ValueError:
+                continue
+    return stats
+
+
+def params_digest(params: dict):
+    blob = json.dumps(params, sort_keys=True).encode()
+    return hashlib.sha1(blob).hexdigest()[:12]
+
+
+def snapshot(root: str = PARAMS_DIR, arcstats: str = ARCSTATS):
+    return {'params': read_params(root), 'arc': read_arcstats(arcstats)}
+
+
+def job_zfs(before: dict, after: dict):
+    # row columns: ARC counter deltas + the tunables digest
+    # (the full tunables set is stored once per digest)
+    row = {}
+    if not before['params'] and not before['arc']:
+        return row
+    if before['params'] != after['params']:
+        changed = [k for k in after['params'] if before['params'].get(k) != after['params'][k]]
+        logging.warning("ZFS tunables changed during the job: %s", ", ".join(changed))
+    row['zfs_params'] = params_digest(before['params'])
+    arc0, arc1 = before['arc'], after['arc']
+    for k in ARC_COUNTERS:
+        row[f"arc_{k}"] = arc1.get(k, 0) - arc0.get(k, 0)
+    total = row['arc_hits'] + row['arc_misses']
+    row['arc_hit_pct'] = round(row['arc_hits'] / total * 100, 2) if total else 0.0
+    row['arc_size_MB'] = arc1.get('size', 0) // 2**20
+    return row